@@ -0,0 +1,36 @@
+"""OCR artifacts table for full OCR output moved out of invoices.extra_data
+
+Revision ID: 002_ocr_artifacts
+Revises: 001_initial_schema
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002_ocr_artifacts'
+down_revision = '001_initial_schema'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('ocr_artifacts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('invoice_id', sa.Integer(), nullable=False),
+        sa.Column('encoding', sa.String(), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.Column('size_bytes', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['invoice_id'], ['invoices.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ocr_artifacts_id'), 'ocr_artifacts', ['id'], unique=False)
+    op.create_index(op.f('ix_ocr_artifacts_invoice_id'), 'ocr_artifacts', ['invoice_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_ocr_artifacts_invoice_id'), table_name='ocr_artifacts')
+    op.drop_index(op.f('ix_ocr_artifacts_id'), table_name='ocr_artifacts')
+    op.drop_table('ocr_artifacts')
@@ -15,6 +15,13 @@ class Settings(BaseSettings):
 
     celery_broker_url: str = Field(default="redis://localhost:6379/0", alias="CELERY_BROKER_URL")
     celery_result_backend: str = Field(default="redis://localhost:6379/0", alias="CELERY_RESULT_BACKEND")
+    # Per-queue worker profiles, applied to workers started with -Q <queue>; 0 keeps the worker's own value
+    celery_ocr_interactive_concurrency: int = Field(default=0, alias="CELERY_OCR_INTERACTIVE_CONCURRENCY")  # 0 = one per CPU core
+    celery_ocr_interactive_prefetch: int = Field(default=1, alias="CELERY_OCR_INTERACTIVE_PREFETCH")
+    celery_ocr_bulk_concurrency: int = Field(default=0, alias="CELERY_OCR_BULK_CONCURRENCY")
+    celery_ocr_bulk_prefetch: int = Field(default=1, alias="CELERY_OCR_BULK_PREFETCH")
+    celery_analytics_concurrency: int = Field(default=0, alias="CELERY_ANALYTICS_CONCURRENCY")
+    celery_analytics_prefetch: int = Field(default=0, alias="CELERY_ANALYTICS_PREFETCH")
 
     gstn_api_key: str | None = Field(default=None, alias="GSTN_API_KEY")
 
@@ -25,6 +32,46 @@ class Settings(BaseSettings):
     gemini_model: str | None = Field(default="gemini-1.5-flash", alias="GEMINI_MODEL")
     enable_ai_advisor: bool = Field(default=False, alias="ENABLE_AI_ADVISOR")
 
+    # Uploads
+    upload_max_bytes: int = Field(default=10 * 1024 * 1024, alias="UPLOAD_MAX_BYTES")
+    upload_chunk_bytes: int = Field(default=1024 * 1024, alias="UPLOAD_CHUNK_BYTES")  # streamed to disk this much at a time
+    upload_bulk_concurrency: int = Field(default=4, alias="UPLOAD_BULK_CONCURRENCY")  # files of a bulk upload received at once
+
+    # OCR pipeline
+    ocr_parallel_variants: bool = Field(default=False, alias="OCR_PARALLEL_VARIANTS")
+    ocr_max_workers: int = Field(default=0, alias="OCR_MAX_WORKERS")  # 0 = one per CPU core
+    ocr_pool_kind: str = Field(default="process", alias="OCR_POOL_KIND")  # "process" | "thread"
+    ocr_backend: str = Field(default="pytesseract", alias="OCR_BACKEND")  # "pytesseract" | "tesserocr"
+    ocr_enable_easyocr: bool = Field(default=True, alias="OCR_ENABLE_EASYOCR")
+    ocr_easyocr_warmup: str = Field(default="off", alias="OCR_EASYOCR_WARMUP")  # "off" | "child" | "parent"
+    ocr_pdf_dpi: int = Field(default=144, alias="OCR_PDF_DPI")
+    ocr_pdf_max_pages: int = Field(default=100, alias="OCR_PDF_MAX_PAGES")
+    ocr_pdf_prefetch_pages: int = Field(default=1, alias="OCR_PDF_PREFETCH_PAGES")
+    ocr_pdf_text_layer: bool = Field(default=True, alias="OCR_PDF_TEXT_LAYER")
+    ocr_pdf_text_min_chars: int = Field(default=20, alias="OCR_PDF_TEXT_MIN_CHARS")  # shorter text layers are rasterized
+    ocr_pdf_image_max_coverage: float = Field(default=0.15, alias="OCR_PDF_IMAGE_MAX_COVERAGE")  # pages with less image area than this are text-only
+    ocr_pdf_text_min_coverage: float = Field(default=0.02, alias="OCR_PDF_TEXT_MIN_COVERAGE")  # on image pages the text layer must cover this share of the page
+    ocr_fanout_min_pages: int = Field(default=4, alias="OCR_FANOUT_MIN_PAGES")  # scanned PDF pages before Celery OCRs each page as its own task; 0 = never
+    ocr_preview_dpi: int = Field(default=150, alias="OCR_PREVIEW_DPI")
+    ocr_preview_top_fraction: float = Field(default=0.35, alias="OCR_PREVIEW_TOP_FRACTION")
+    ocr_mode: str = Field(default="all", alias="OCR_MODE")  # "all" | "cascade"
+    ocr_cascade_order: str = Field(default="blur_otsu,adaptive,deskew,clahe_otsu,morph_adaptive,easyocr", alias="OCR_CASCADE_ORDER")
+    ocr_cascade_min_confidence: float = Field(default=0.85, alias="OCR_CASCADE_MIN_CONFIDENCE")
+    ocr_cascade_min_words: int = Field(default=15, alias="OCR_CASCADE_MIN_WORDS")
+    ocr_target_text_height: int = Field(default=24, alias="OCR_TARGET_TEXT_HEIGHT")  # median glyph height (px) pages are resampled to; 0 = off
+    ocr_max_pixels_per_page: int = Field(default=9_000_000, alias="OCR_MAX_PIXELS_PER_PAGE")  # larger pages are downscaled; 0 = no limit
+    ocr_deskew: bool = Field(default=True, alias="OCR_DESKEW")  # straighten each page once before building variants
+    ocr_deskew_min_angle: float = Field(default=0.5, alias="OCR_DESKEW_MIN_ANGLE")  # degrees; smaller skew is left alone
+    ocr_text_regions: bool = Field(default=False, alias="OCR_TEXT_REGIONS")  # OCR detected text blocks only (in the pool when parallel)
+    ocr_adaptive_variants: bool = Field(default=False, alias="OCR_ADAPTIVE_VARIANTS")  # build only the variants the image-quality check recommends
+    ocr_local_workers: int = Field(default=2, alias="OCR_LOCAL_WORKERS")  # API-side executor for previews / no-Celery fallback
+    ocr_cache_enabled: bool = Field(default=True, alias="OCR_CACHE_ENABLED")
+    ocr_cache_dir: str = Field(default="uploads/ocr_cache", alias="OCR_CACHE_DIR")
+    ocr_cache_max_bytes: int = Field(default=512 * 1024 * 1024, alias="OCR_CACHE_MAX_BYTES")
+    ocr_reextract_batch_size: int = Field(default=500, alias="OCR_REEXTRACT_BATCH_SIZE")  # invoices per re-extraction batch
+    ocr_profile_dir: str | None = Field(default=None, alias="OCR_PROFILE_DIR")  # write a cProfile dump per OCR job here when set
+    ocr_metrics_dir: str | None = Field(default=None, alias="OCR_METRICS_DIR")  # shared dir where each process publishes its OCR metrics for /metrics
+
     class Config:
         env_file = ".env"
         case_sensitive = False
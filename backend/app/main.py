@@ -1,11 +1,13 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 import logging
 
 from .config import settings
 from .startup import setup_logging, initialize_services, init_db
 from .routers import auth, upload, analyze, forecast, advice, transactions, expenses, dashboard
+from .services.ocr_metrics import render_metrics
 
 # Setup logging
 setup_logging()
@@ -78,6 +80,14 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "finvoice-api"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """OCR stage and job histograms in the Prometheus text format.
+
+    Covers OCR run in this process, plus Celery workers when they share OCR_METRICS_DIR.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/features")
 async def get_features():
     """Get available API features"""
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Text, JSON, Boolean, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Text, JSON, Boolean, Enum, LargeBinary
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 from .db import Base
 import enum
@@ -84,6 +84,7 @@ class Invoice(Base):
     vendor = relationship("Vendor", back_populates="invoices")
     payments = relationship("Payment", back_populates="invoice")
     line_items = relationship("InvoiceLineItem", back_populates="invoice")
+    ocr_artifacts = relationship("OCRArtifact", back_populates="invoice", cascade="all, delete-orphan")
 
     # Backward-compat property: map `metadata` to `extra_data`
     @property
@@ -94,6 +95,22 @@ class Invoice(Base):
     def invoice_metadata(self, value):
         self.extra_data = value
 
+class OCRArtifact(Base):
+    """Full OCR engine output for an invoice (text, word boxes, every variant), gzip-compressed JSON.
+
+    Only a compact summary stays in Invoice.extra_data; this row is read on demand.
+    """
+    __tablename__ = "ocr_artifacts"
+    id = Column(Integer, primary_key=True, index=True)
+    invoice_id = Column(Integer, ForeignKey("invoices.id"), nullable=False, index=True)
+    encoding = Column(String, nullable=False, default="json+gzip")
+    payload = deferred(Column(LargeBinary, nullable=False))  # Not loaded until accessed
+    size_bytes = Column(Integer)  # Uncompressed JSON size
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    invoice = relationship("Invoice", back_populates="ocr_artifacts")
+
 class InvoiceLineItem(Base):
     __tablename__ = "invoice_line_items"
     id = Column(Integer, primary_key=True, index=True)
@@ -1,6 +1,12 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, BackgroundTasks, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import asyncio
+import hashlib
 import uuid
 import os
 import shutil
@@ -8,12 +14,14 @@ from pathlib import Path
 import tempfile
 import logging
 
-from ..db import get_db
+from ..config import settings
+from ..db import get_db, SessionLocal
 from ..schemas import UploadResponse, Invoice, InvoiceCreate, User
 from ..models import Invoice as InvoiceModel, User as UserModel, InvoiceStatus
 from ..security import get_current_user
-from ..tasks import process_invoice_ocr
+from ..tasks import process_invoice_ocr, invoice_ocr_progress, OCR_BULK_QUEUE
 from ..services.ocr_service import AdvancedOCRService
+from ..services.ocr_artifacts import save_ocr_artifact, ocr_extra_data, load_ocr_artifact
 
 logger = logging.getLogger(__name__)
 
@@ -23,10 +31,145 @@ router = APIRouter()
 UPLOAD_DIR = Path("uploads/invoices")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Local OCR executor for previews and for full processing when Celery is unavailable,
+# so OCR never runs on the event loop
+_local_ocr_executor = ThreadPoolExecutor(max_workers=settings.ocr_local_workers, thread_name_prefix="ocr-local")
+# One OCR service for the API process; it keeps no per-call state, so executor threads share it
+_ocr_service: Optional[AdvancedOCRService] = None
+
+
+def _get_ocr_service() -> AdvancedOCRService:
+    global _ocr_service
+    if _ocr_service is None:
+        _ocr_service = AdvancedOCRService()
+    return _ocr_service
+
+ALLOWED_EXTENSIONS = {'.pdf', '.png', '.jpg', '.jpeg', '.tiff', '.bmp'}
+
+
+def _max_upload_mb() -> int:
+    return settings.upload_max_bytes // (1024 * 1024)
+
+
+def _write_chunk(buffer: Any, digest: Any, chunk: bytes) -> None:
+    digest.update(chunk)
+    buffer.write(chunk)
+
+
+async def _save_upload(file: UploadFile, file_path: Path) -> Tuple[int, str]:
+    """Stream an upload to disk in fixed-size chunks, hashing on the way; returns (size, sha256 hex).
+
+    Raises a 400 as soon as the size limit is passed, before the rest is read; the partial file is removed.
+    """
+    too_large = HTTPException(status_code=400, detail=f"File too large. Maximum size: {_max_upload_mb()}MB")
+    # The multipart parser already knows the size of most parts
+    if file.size is not None and file.size > settings.upload_max_bytes:
+        raise too_large
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(file_path, "wb") as buffer:
+            while True:
+                chunk = await file.read(settings.upload_chunk_bytes)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.upload_max_bytes:
+                    raise too_large
+                # Hashing and disk writes stay off the event loop
+                await run_in_threadpool(_write_chunk, buffer, digest, chunk)
+    except BaseException:
+        file_path.unlink(missing_ok=True)
+        raise
+    return size, digest.hexdigest()
+
+
+
+def _preview_snippet(text: Optional[str]) -> Optional[str]:
+    if text is None:
+        return None
+    return text[:200] + "..." if len(text) > 200 else text
+
+
+def _ocr_progress(job_id: str) -> Optional[Dict[str, Any]]:
+    """Celery progress of an in-flight OCR job (pages done for split PDFs), or None if the backend cannot tell"""
+    try:
+        return invoice_ocr_progress(job_id)
+    except Exception as e:
+        logger.warning(f"Could not read OCR progress for {job_id}: {e}")
+        return None
+
+
+def _generate_preview(invoice_id: int, source: Any, content_digest: Optional[str] = None) -> Dict[str, Any]:
+    """Build a quick low-resolution preview and store it on the invoice unless full processing already finished"""
+    ocr_service = _get_ocr_service()
+    # Re-uploads of an already processed file reuse the stored OCR result
+    cached = ocr_service.cached_result(source, content_digest=content_digest)
+    if cached:
+        ocr_results = {
+            'best_text': cached.get('ocr_results', {}).get('text', ''),
+            'best_confidence': cached.get('ocr_results', {}).get('confidence', 0.0)
+        }
+    else:
+        # Cheap single-variant pass; process_invoice_ocr does the full-quality OCR
+        ocr_results = ocr_service.extract_preview_text(source)
+
+    db = SessionLocal()
+    try:
+        invoice = db.query(InvoiceModel).filter(InvoiceModel.id == invoice_id).first()
+        if invoice and invoice.status not in (InvoiceStatus.PROCESSED, InvoiceStatus.FAILED):
+            invoice.ocr_text = ocr_results.get('best_text', '')
+            invoice.ocr_confidence = ocr_results.get('best_confidence', 0.0)
+            db.commit()
+    finally:
+        db.close()
+    return ocr_results
+
+
+def _process_invoice_locally(invoice_id: int, source: Any, content_digest: Optional[str] = None) -> Dict[str, Any]:
+    """Full OCR processing on the local executor, used when Celery is unavailable"""
+    result = _get_ocr_service().process_invoice(source, content_digest=content_digest)
+
+    db = SessionLocal()
+    try:
+        invoice = db.query(InvoiceModel).filter(InvoiceModel.id == invoice_id).first()
+        if invoice:
+            invoice.status = InvoiceStatus.PROCESSED if result.get('processing_status') == 'success' else InvoiceStatus.FAILED
+            # Full OCR output goes to its own compressed artifact; extra_data keeps a compact summary
+            invoice.extra_data = ocr_extra_data(result, save_ocr_artifact(db, invoice, result))
+            # Also mirror critical fields
+            invoice.ocr_text = result.get('ocr_results', {}).get('text') or invoice.ocr_text
+            invoice.ocr_confidence = result.get('overall_confidence') or invoice.ocr_confidence
+            invoice.processed_at = datetime.utcnow()
+            db.commit()
+    except Exception as e:
+        logger.error(f"Local OCR processing failed for invoice {invoice_id}: {e}")
+    finally:
+        db.close()
+    return result
+
+
+def _dispatch_invoice_ocr(invoice_id: int, file_path: str, content_digest: Optional[str] = None,
+                          job_id: Optional[str] = None) -> None:
+    """Queue full OCR on Celery (or the local executor) and build the preview; runs after the response"""
+    try:
+        process_invoice_ocr.apply_async((invoice_id, file_path, content_digest), task_id=job_id)
+    except Exception as e:
+        logger.warning(f"Celery not available, processing invoice {invoice_id} on local executor: {e}")
+        # Full processing stores the OCR text too, so no separate preview pass is needed
+        _local_ocr_executor.submit(_process_invoice_locally, invoice_id, file_path, content_digest)
+        return
+    try:
+        _generate_preview(invoice_id, file_path, content_digest)
+    except Exception as e:
+        logger.warning(f"Preview generation failed for invoice {invoice_id}: {e}")
+
 @router.post("/upload", response_model=UploadResponse)
 async def upload_invoice(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    async_processing: bool = Query(False, alias="async", description="Return 202 immediately and build the preview in the background"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -36,30 +179,23 @@ async def upload_invoice(
         raise HTTPException(status_code=400, detail="No file provided")
     
     # Validate file type
-    allowed_extensions = {'.pdf', '.png', '.jpg', '.jpeg', '.tiff', '.bmp'}
     file_ext = Path(file.filename).suffix.lower()
     
-    if file_ext not in allowed_extensions:
+    if file_ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400, 
-            detail=f"File type {file_ext} not supported. Allowed: {', '.join(allowed_extensions)}"
+            detail=f"File type {file_ext} not supported. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
         )
     
-    # Validate file size (max 10MB)
-    content = await file.read()
-    if len(content) > 10 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large. Maximum size: 10MB")
+    # Generate unique filename
+    file_id = str(uuid.uuid4())
+    filename = f"{file_id}{file_ext}"
+    file_path = UPLOAD_DIR / filename
+    
+    # Save file; the size limit is enforced while streaming
+    _size, content_digest = await _save_upload(file, file_path)
     
     try:
-        # Generate unique filename
-        file_id = str(uuid.uuid4())
-        filename = f"{file_id}{file_ext}"
-        file_path = UPLOAD_DIR / filename
-        
-        # Save file
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
-        
         # Create invoice record in database
         invoice = InvoiceModel(
             user_id=current_user.id,
@@ -72,57 +208,66 @@ async def upload_invoice(
         db.commit()
         db.refresh(invoice)
         
-    # Queue OCR processing if Celery available; otherwise run inline
         job_id = f"ocr_{invoice.id}_{file_id}"
+
+        if async_processing:
+            # Queueing and the preview both happen after the response is sent
+            background_tasks.add_task(_dispatch_invoice_ocr, invoice.id, str(file_path), content_digest, job_id)
+            response = UploadResponse(
+                job_id=job_id,
+                message="Invoice accepted. Poll the status endpoint for the preview and results.",
+                invoice_id=invoice.id,
+                status=InvoiceStatus.UPLOADED.value
+            )
+            return JSONResponse(
+                status_code=202,
+                content=response.model_dump(),
+                headers={"Location": f"{settings.api_prefix}/upload/status/{job_id}"}
+            )
+
+        # Queue OCR processing if Celery available; otherwise use the local executor
         try:
-            # Enqueue Celery task immediately if broker is configured
-            process_invoice_ocr.delay(invoice.id, str(file_path))
+            # Enqueue Celery task off the event loop; a dead broker can block while retrying.
+            # The job id doubles as the task id, so the status endpoint can report OCR progress
+            await run_in_threadpool(process_invoice_ocr.apply_async, (invoice.id, str(file_path), content_digest), task_id=job_id)
             celery_started = True
         except Exception as e:
-            logger.warning(f"Celery not available, running OCR inline: {e}")
+            logger.warning(f"Celery not available, processing on local executor: {e}")
             celery_started = False
 
         # Quick preview for immediate response
         preview_text = None
+        confidence = 0.0
+        loop = asyncio.get_running_loop()
         try:
-            ocr_service = AdvancedOCRService()
-            ocr_results = ocr_service.extract_text_multi_engine(str(file_path))
-            preview_text = ocr_results['best_text'][:200] + "..." if len(ocr_results['best_text']) > 200 else ocr_results['best_text']
-            confidence = ocr_results['best_confidence']
-            # Persist quick preview confidence/text even if background task will handle full processing
-            invoice.ocr_text = ocr_results.get('best_text', '')
-            invoice.ocr_confidence = ocr_results.get('best_confidence', 0.0)
-            db.commit()
-            # If Celery isn't available, do full processing inline
-            if not celery_started:
-                result = await ocr_service.process_invoice_advanced(str(file_path))
-                invoice.status = InvoiceStatus.PROCESSED if result.get('processing_status') == 'success' else InvoiceStatus.FAILED
-                # Store full OCR result in extra_data
-                invoice.extra_data = {
-                    'ocr_results': result,
-                    'confidence': result.get('overall_confidence'),
-                    'processing_engine': result.get('ocr_results', {}).get('engine_used'),
-                    'extraction_summary': result.get('invoice_data', {}).get('extraction_summary'),
-                }
-                # Also mirror critical fields
-                invoice.ocr_text = result.get('ocr_results', {}).get('text') or invoice.ocr_text
-                invoice.ocr_confidence = result.get('overall_confidence') or invoice.ocr_confidence
-                db.commit()
+            if celery_started:
+                ocr_results = await loop.run_in_executor(
+                    _local_ocr_executor, _generate_preview, invoice.id, str(file_path), content_digest
+                )
+                preview_text = _preview_snippet(ocr_results['best_text'])
+                confidence = ocr_results['best_confidence']
+            else:
+                # Full processing also yields the preview, so OCR runs once
+                result = await loop.run_in_executor(
+                    _local_ocr_executor, _process_invoice_locally, invoice.id, str(file_path), content_digest
+                )
+                preview_text = _preview_snippet(result.get('ocr_results', {}).get('text', ''))
+                confidence = result.get('ocr_results', {}).get('confidence', 0.0)
         except Exception as e:
             logger.warning(f"Preview generation failed: {e}")
-            confidence = 0.0
         
         return UploadResponse(
             job_id=job_id,
             message="Invoice uploaded successfully. Processing in background.",
             preview_text=preview_text,
-            confidence=confidence
+            confidence=confidence,
+            invoice_id=invoice.id
         )
         
     except Exception as e:
         logger.error(f"Upload failed: {e}")
         # Clean up file if it was created
-        if 'file_path' in locals() and file_path.exists():
+        if file_path.exists():
             file_path.unlink()
         
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
@@ -141,71 +286,70 @@ async def upload_bulk_invoices(
     
     results = []
     failed_files = []
+    semaphore = asyncio.Semaphore(max(1, settings.upload_bulk_concurrency))
+    
+    async def receive(file: UploadFile) -> Dict[str, Any]:
+        """Validate and stream one file to disk; the database is only touched afterwards"""
+        if not file.filename:
+            return {"filename": "unknown", "error": "No filename"}
+        
+        # Validate file type
+        file_ext = Path(file.filename).suffix.lower()
+        if file_ext not in ALLOWED_EXTENSIONS:
+            return {"filename": file.filename, "error": f"Unsupported file type: {file_ext}"}
+        
+        # Generate unique filename and save
+        file_id = str(uuid.uuid4())
+        file_path = UPLOAD_DIR / f"{file_id}{file_ext}"
+        async with semaphore:
+            try:
+                _size, content_digest = await _save_upload(file, file_path)
+            except HTTPException:
+                return {"filename": file.filename, "error": f"File too large (max {_max_upload_mb()}MB)"}
+            except Exception as e:
+                logger.error(f"Failed to save file {file.filename}: {e}")
+                return {"filename": file.filename, "error": str(e)}
+        return {"filename": file.filename, "file_id": file_id, "file_path": file_path, "content_digest": content_digest}
+    
+    received = await asyncio.gather(*(receive(file) for file in files))
     
-    for file in files:
+    # One session, so invoice rows are created one after another
+    for item in received:
+        if "error" in item:
+            failed_files.append(item)
+            continue
         try:
-            if not file.filename:
-                failed_files.append({"filename": "unknown", "error": "No filename"})
-                continue
-            
-            # Validate file type
-            allowed_extensions = {'.pdf', '.png', '.jpg', '.jpeg', '.tiff', '.bmp'}
-            file_ext = Path(file.filename).suffix.lower()
-            
-            if file_ext not in allowed_extensions:
-                failed_files.append({
-                    "filename": file.filename, 
-                    "error": f"Unsupported file type: {file_ext}"
-                })
-                continue
-            
-            # Read and validate file size
-            content = await file.read()
-            if len(content) > 10 * 1024 * 1024:
-                failed_files.append({
-                    "filename": file.filename, 
-                    "error": "File too large (max 10MB)"
-                })
-                continue
-            
-            # Generate unique filename and save
-            file_id = str(uuid.uuid4())
-            filename = f"{file_id}{file_ext}"
-            file_path = UPLOAD_DIR / filename
-            
-            with open(file_path, "wb") as buffer:
-                buffer.write(content)
-            
             # Create invoice record
             invoice = InvoiceModel(
                 user_id=current_user.id,
                 total_amount=0.0,
                 status=InvoiceStatus.UPLOADED,
-                file_path=str(file_path)
+                file_path=str(item["file_path"])
             )
             
             db.add(invoice)
             db.flush()  # Get ID without committing
             
             # Queue processing
-            job_id = f"ocr_{invoice.id}_{file_id}"
+            job_id = f"ocr_{invoice.id}_{item['file_id']}"
             background_tasks.add_task(
-                process_invoice_ocr.delay,
-                invoice.id,
-                str(file_path)
+                process_invoice_ocr.apply_async,
+                (invoice.id, str(item["file_path"]), item["content_digest"]),
+                queue=OCR_BULK_QUEUE,
+                task_id=job_id
             )
             
             results.append({
-                "filename": file.filename,
+                "filename": item["filename"],
                 "invoice_id": invoice.id,
                 "job_id": job_id,
                 "status": "queued"
             })
             
         except Exception as e:
-            logger.error(f"Failed to process file {file.filename}: {e}")
+            logger.error(f"Failed to process file {item['filename']}: {e}")
             failed_files.append({
-                "filename": file.filename,
+                "filename": item["filename"],
                 "error": str(e)
             })
     
@@ -214,6 +358,10 @@ async def upload_bulk_invoices(
         db.commit()
     except Exception as e:
         db.rollback()
+        # Nothing was queued, so the streamed files have no invoice rows
+        for item in received:
+            if "file_path" in item:
+                item["file_path"].unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     
     return {
@@ -257,6 +405,10 @@ async def get_upload_status(
                     conf = meta.get('confidence')
                 if conf is None:
                     conf = getattr(invoice, 'ocr_confidence', None)
+                # Page-level progress while OCR is still running; the invoice row has everything after
+                progress = None
+                if invoice.status in (InvoiceStatus.UPLOADED, InvoiceStatus.PROCESSING):
+                    progress = await run_in_threadpool(_ocr_progress, job_id)
                 return {
                     "job_id": job_id,
                     "invoice_id": invoice.id,
@@ -264,8 +416,11 @@ async def get_upload_status(
                     "confidence": conf,
                     "extracted_data": meta.get('extraction_summary') or meta,
                     "ocr_results": ocr_results,
+                    "ocr_artifact_id": meta.get('ocr_artifact_id') if isinstance(meta, dict) else None,
                     "invoice_data": (ocr_results or {}).get('invoice_data') if isinstance(ocr_results, dict) else None,
                     "overall_confidence": (ocr_results or {}).get('overall_confidence') if isinstance(ocr_results, dict) else (meta.get('confidence') if isinstance(meta, dict) else conf),
+                    "preview_text": _preview_snippet(invoice.ocr_text),
+                    "progress": progress,
                     "processed_at": invoice.processed_at.isoformat() if invoice.processed_at else None
                 }
         
@@ -315,6 +470,28 @@ async def get_invoice(
     
     return invoice
 
+@router.get("/invoices/{invoice_id}/ocr")
+async def get_invoice_ocr_artifact(
+    invoice_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Full OCR output of an invoice (text, word boxes, every engine variant), loaded on demand"""
+    
+    invoice = db.query(InvoiceModel).filter(
+        InvoiceModel.id == invoice_id,
+        InvoiceModel.user_id == current_user.id
+    ).first()
+    
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    
+    artifact = await run_in_threadpool(load_ocr_artifact, db, invoice)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="No OCR output stored for this invoice")
+    
+    return {"invoice_id": invoice.id, **artifact}
+
 @router.delete("/invoices/{invoice_id}")
 async def delete_invoice(
     invoice_id: int,
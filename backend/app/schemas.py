@@ -232,6 +232,8 @@ class UploadResponse(BaseModel):
     message: str
     preview_text: Optional[str] = None
     confidence: Optional[float] = None
+    invoice_id: Optional[int] = None
+    status: Optional[str] = None
 
 class OCRResult(BaseModel):
     text: str
@@ -0,0 +1,118 @@
+import gzip
+import json
+import logging
+from typing import Dict, Any, Optional, List, Iterable
+
+from sqlalchemy.orm import Session
+
+from ..models import Invoice, OCRArtifact
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_ENCODING = 'json+gzip'
+# Bulky parts of result['ocr_results'] that move to the artifact; the rest stays on the invoice row
+ARTIFACT_KEYS = ('text', 'words', 'all_results', 'pages')
+
+
+def _decode(data: bytes) -> Dict[str, Any]:
+    return json.loads(gzip.decompress(data).decode('utf-8'))
+
+
+def compact_ocr_result(result: Dict[str, Any], artifact_id: Optional[int] = None) -> Dict[str, Any]:
+    """Copy of a process_invoice result without the OCR text, word boxes, per-variant and per-page output"""
+    compact = dict(result)
+    ocr_results = {k: v for k, v in (result.get('ocr_results') or {}).items() if k not in ARTIFACT_KEYS}
+    if artifact_id is not None:
+        ocr_results['artifact_id'] = artifact_id
+    compact['ocr_results'] = ocr_results
+    return compact
+
+
+def save_ocr_artifact(db: Session, invoice: Invoice, result: Dict[str, Any]) -> Optional[int]:
+    """Store result['ocr_results'] as the invoice's OCR artifact, replacing an older one; returns its id.
+
+    Flushes but does not commit, so the artifact lands in the caller's transaction.
+    """
+    payload = result.get('ocr_results')
+    if not payload or result.get('processing_status') != 'success':
+        return None
+    raw = json.dumps(payload, default=str).encode('utf-8')
+    db.query(OCRArtifact).filter(OCRArtifact.invoice_id == invoice.id).delete(synchronize_session=False)
+    artifact = OCRArtifact(
+        invoice_id=invoice.id,
+        encoding=ARTIFACT_ENCODING,
+        payload=gzip.compress(raw, compresslevel=6),
+        size_bytes=len(raw)
+    )
+    db.add(artifact)
+    db.flush()
+    return artifact.id
+
+
+def ocr_extra_data(result: Dict[str, Any], artifact_id: Optional[int]) -> Dict[str, Any]:
+    """Invoice.extra_data for a successful OCR result: compact summary plus the artifact reference"""
+    invoice_data = result.get('invoice_data') or {}
+    extra_data = {
+        'ocr_results': compact_ocr_result(result, artifact_id),
+        'ocr_artifact_id': artifact_id,
+        'confidence': result.get('overall_confidence'),
+        'processing_engine': (result.get('ocr_results') or {}).get('engine_used'),
+        'extraction_summary': invoice_data.get('extraction_summary', {}),
+        'validation_results': invoice_data.get('validation_results', {}),
+        'extractor_version': result.get('extractor_version'),
+        'processing_timestamp': result.get('timestamp')
+    }
+    if result.get('gst_details'):
+        extra_data['gst_details'] = result['gst_details']
+    return extra_data
+
+
+def _legacy_ocr_output(extra_data: Any) -> Optional[Dict[str, Any]]:
+    """Full OCR output of rows written before artifacts existed (kept inside extra_data)"""
+    if not isinstance(extra_data, dict):
+        return None
+    stored = (extra_data.get('ocr_results') or {}).get('ocr_results')
+    if isinstance(stored, dict) and any(key in stored for key in ARTIFACT_KEYS):
+        return stored
+    return None
+
+
+def load_ocr_artifact(db: Session, invoice: Invoice) -> Optional[Dict[str, Any]]:
+    """The invoice's full OCR output with artifact metadata, or None if nothing was stored"""
+    artifact = (
+        db.query(OCRArtifact)
+        .filter(OCRArtifact.invoice_id == invoice.id)
+        .order_by(OCRArtifact.id.desc())
+        .first()
+    )
+    if artifact is not None:
+        return {
+            'artifact_id': artifact.id,
+            'created_at': artifact.created_at.isoformat() if artifact.created_at else None,
+            'size_bytes': artifact.size_bytes,
+            'ocr_results': _decode(artifact.payload)
+        }
+    legacy = _legacy_ocr_output(invoice.extra_data)
+    if legacy is not None:
+        return {'artifact_id': None, 'created_at': None, 'size_bytes': None, 'ocr_results': legacy}
+    return None
+
+
+def load_ocr_outputs(db: Session, invoice_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """Full OCR output per invoice id for a batch of invoices (latest artifact wins)"""
+    ids: List[int] = list(invoice_ids)
+    if not ids:
+        return {}
+    rows = (
+        db.query(OCRArtifact.invoice_id, OCRArtifact.payload)
+        .filter(OCRArtifact.invoice_id.in_(ids))
+        .order_by(OCRArtifact.id)
+        .all()
+    )
+    outputs = {}
+    for invoice_id, payload in rows:
+        try:
+            outputs[invoice_id] = _decode(payload)
+        except Exception as e:
+            logger.warning(f"Unreadable OCR artifact for invoice {invoice_id}: {e}")
+    return outputs
@@ -0,0 +1,149 @@
+import os
+import gzip
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Dict, Any, Optional
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OCRResultCache:
+    """Content-addressed on-disk cache of process_invoice results with size-based LRU eviction"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir or settings.ocr_cache_dir
+        self.max_bytes = max_bytes if max_bytes is not None else settings.ocr_cache_max_bytes
+        self._lock = threading.Lock()
+        # Running estimate of the cache size; a full directory scan only happens near the budget
+        self._approx_bytes: Optional[int] = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        """SHA-256 hex digest of file contents"""
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def digest_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+        """SHA-256 hex digest of a file, read in chunks"""
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def make_key(content_digest: str, config_version: str) -> str:
+        """Cache key for a file digest under a given OCR configuration"""
+        return hashlib.sha256(f"{content_digest}:{config_version}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for a key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                result = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable OCR cache entry {key}: {e}")
+            self._remove(path)
+            return None
+
+        # Touch the entry so eviction treats it as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return result
+
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        """Store a result atomically, then evict least recently used entries if over budget"""
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                    f.write(json.dumps(result, default=str).encode('utf-8'))
+                os.replace(tmp_path, path)
+            except Exception:
+                self._remove(tmp_path)
+                raise
+            size = os.path.getsize(path)
+        except Exception as e:
+            logger.warning(f"Failed to write OCR cache entry {key}: {e}")
+            return
+
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan_size()
+            else:
+                self._approx_bytes += size
+            if self.max_bytes and self._approx_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json.gz'):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, st.st_size, st.st_mtime
+
+    def _scan_size(self) -> int:
+        return sum(size for _path, size, _mtime in self._entries())
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until the cache is at 90% of its budget"""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _path, size, _mtime in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for path, size, _mtime in entries:
+            if total <= target:
+                break
+            if self._remove(path):
+                total -= size
+                removed += 1
+        self._approx_bytes = total
+        if removed:
+            logger.info(f"OCR cache evicted {removed} entries; size now {total} bytes")
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+_cache: Optional[OCRResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache() -> Optional[OCRResultCache]:
+    """Process-wide OCR result cache, or None when caching is disabled"""
+    global _cache
+    if not settings.ocr_cache_enabled:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = OCRResultCache()
+            except Exception as e:
+                logger.warning(f"OCR cache unavailable: {e}")
+                return None
+        return _cache
@@ -0,0 +1,308 @@
+import os
+import json
+import atexit
+import socket
+import logging
+import tempfile
+import threading
+import contextvars
+import cProfile
+import itertools
+from time import perf_counter
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds (small receipts through long scanned PDFs)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# name -> (type, help, label name); every metric carries a single label
+METRICS = {
+    'ocr_job_seconds': ('histogram', 'End-to-end time of an OCR job', 'kind'),
+    'ocr_stage_seconds': ('histogram', 'Time per OCR pipeline stage call; tesseract:<variant> is one variant', 'stage'),
+    'ocr_jobs_total': ('counter', 'OCR jobs finished, by outcome', 'status'),
+    'ocr_events_total': ('counter', 'OCR pipeline counters such as pages, OCR calls and cache hits', 'event'),
+}
+
+
+class StageTimings:
+    """Wall-clock seconds and call counts per pipeline stage, plus event counters, for one OCR job"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, list] = {}
+        self.counters: Dict[str, int] = {}
+        # Outcome reported to ocr_jobs_total; the pipeline marks jobs that returned a failed result
+        self.status = 'success'
+        self.started = perf_counter()
+
+    def add(self, stage: str, seconds: float, calls: int = 1) -> None:
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += calls
+
+    def count(self, event: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[event] = self.counters.get(event, 0) + n
+
+    def merge(self, report: Optional[Dict[str, Any]]) -> None:
+        """Add another job's as_dict() report, e.g. a page OCR'd by a separate task (its total becomes stage 'page')"""
+        if not report:
+            return
+        for stage, entry in report.get('stages', {}).items():
+            self.add(stage, entry.get('ms', 0.0) / 1000.0, entry.get('calls', 0))
+        for event, n in report.get('counters', {}).items():
+            self.count(event, n)
+        if report.get('total_ms') is not None:
+            self.add('page', report['total_ms'] / 1000.0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'stages': {stage: {'ms': round(seconds * 1000.0, 1), 'calls': calls}
+                           for stage, (seconds, calls) in self.stages.items()},
+                'counters': dict(self.counters),
+                'total_ms': round((perf_counter() - self.started) * 1000.0, 1)
+            }
+
+
+class MetricsRegistry:
+    """Process-local histograms and counters, renderable in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # histogram: name -> label -> [bucket counts..., sum, count]; counter: name -> label -> value
+        self._values: Dict[str, Dict[str, Any]] = {name: {} for name in METRICS}
+
+    def observe(self, name: str, label: str, seconds: float) -> None:
+        with self._lock:
+            series = self._values[name].setdefault(label, [0] * len(SECONDS_BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(SECONDS_BUCKETS):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def inc(self, name: str, label: str, n: int = 1) -> None:
+        with self._lock:
+            self._values[name][label] = self._values[name].get(label, 0) + n
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return json.loads(json.dumps(self._values))
+
+
+REGISTRY = MetricsRegistry()
+
+_current: contextvars.ContextVar[Optional[StageTimings]] = contextvars.ContextVar('ocr_stage_timings', default=None)
+_profile_seq = itertools.count(1)
+_snapshot_cleanup_registered = False
+
+
+def current_timings() -> Optional[StageTimings]:
+    """Timings of the OCR job running in this context, if any"""
+    return _current.get()
+
+
+def add_stage(stage: str, seconds: float, calls: int = 1) -> None:
+    """Record a stage timed elsewhere (for example inside a pool worker)"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(stage, seconds, calls)
+    REGISTRY.observe('ocr_stage_seconds', stage, seconds)
+
+
+def count(event: str, n: int = 1) -> None:
+    """Bump a job counter (pages, OCR calls, cache hits, ...)"""
+    timings = _current.get()
+    if timings is not None:
+        timings.count(event, n)
+    REGISTRY.inc('ocr_events_total', event, n)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage into the current job and the stage histogram"""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        add_stage(name, perf_counter() - start)
+
+
+@contextmanager
+def track_job(kind: str) -> Iterator[StageTimings]:
+    """Collect stage timings for one OCR job; nested calls join the job already running.
+
+    The outermost job is observed in the job histogram and, when OCR_PROFILE_DIR is set,
+    profiled with cProfile (calling thread only; pool workers are not included).
+    """
+    outer = _current.get()
+    if outer is not None:
+        yield outer
+        return
+
+    timings = StageTimings()
+    token = _current.set(timings)
+    profiler = _start_profiler()
+    start = perf_counter()
+    status = 'error'
+    try:
+        yield timings
+        status = timings.status
+    finally:
+        elapsed = perf_counter() - start
+        _current.reset(token)
+        REGISTRY.observe('ocr_job_seconds', kind, elapsed)
+        REGISTRY.inc('ocr_jobs_total', status)
+        if profiler is not None:
+            _dump_profile(profiler, kind)
+        if settings.ocr_metrics_dir:
+            _write_snapshot()
+
+
+def _start_profiler() -> Optional[cProfile.Profile]:
+    if not settings.ocr_profile_dir:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Another profiler is already active on this thread
+        logger.warning(f"OCR profiling skipped: {e}")
+        return None
+    return profiler
+
+
+def _dump_profile(profiler: cProfile.Profile, kind: str) -> None:
+    profiler.disable()
+    name = f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_profile_seq)}.prof"
+    try:
+        os.makedirs(settings.ocr_profile_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(settings.ocr_profile_dir, name))
+    except OSError as e:
+        logger.warning(f"Could not write OCR profile {name}: {e}")
+
+
+def _snapshot_name() -> str:
+    # Host name as well as pid: containers sharing the directory reuse the same pids
+    return f"{socket.gethostname()}-{os.getpid()}.json"
+
+
+def _write_snapshot() -> None:
+    """Publish this process's registry so /metrics in another process can include it"""
+    global _snapshot_cleanup_registered
+    try:
+        os.makedirs(settings.ocr_metrics_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=settings.ocr_metrics_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(REGISTRY.snapshot(), f)
+        os.replace(tmp_path, os.path.join(settings.ocr_metrics_dir, _snapshot_name()))
+    except OSError as e:
+        logger.warning(f"Could not write OCR metrics snapshot: {e}")
+    if not _snapshot_cleanup_registered:
+        # Forked children inherit this handler, and it removes the exiting process's own file
+        atexit.register(remove_snapshot)
+        _snapshot_cleanup_registered = True
+
+
+def remove_snapshot() -> None:
+    """Withdraw this process's snapshot when it exits, so /metrics stops counting a dead process.
+
+    Runs at interpreter exit; Celery pool processes leave via os._exit, so the worker calls it
+    from worker_process_shutdown.
+    """
+    if not settings.ocr_metrics_dir:
+        return
+    try:
+        os.remove(os.path.join(settings.ocr_metrics_dir, _snapshot_name()))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not remove OCR metrics snapshot: {e}")
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        # Signal 0 is CTRL_C_EVENT on Windows; assume alive
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists but belongs to another user
+        return True
+    return True
+
+
+def _is_dead_snapshot(name: str) -> bool:
+    """A snapshot left by a process on this host that died without removing it (killed, OOM)"""
+    host, _, pid = name[:-len('.json')].rpartition('-')
+    return host == socket.gethostname() and pid.isdigit() and not _pid_alive(int(pid))
+
+
+def _collect() -> Dict[str, Dict[str, Any]]:
+    """This process's metrics plus the snapshots of the other live processes in OCR_METRICS_DIR.
+
+    Exiting processes remove their snapshot; one left by a process on this host that was killed is
+    skipped and deleted. Other hosts' processes can only be dropped by their own exit handlers.
+    """
+    merged = REGISTRY.snapshot()
+    directory = settings.ocr_metrics_dir
+    if not directory or not os.path.isdir(directory):
+        return merged
+    own = _snapshot_name()
+    for name in os.listdir(directory):
+        if not name.endswith('.json') or name == own:
+            continue
+        if _is_dead_snapshot(name):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                other = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for metric, series in other.items():
+            if metric not in merged:
+                continue
+            for label, value in series.items():
+                if isinstance(value, list):
+                    current = merged[metric].setdefault(label, [0] * len(value))
+                    merged[metric][label] = [a + b for a, b in zip(current, value)]
+                else:
+                    merged[metric][label] = merged[metric].get(label, 0) + value
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_metrics() -> str:
+    """All OCR metrics in the Prometheus text exposition format"""
+    values = _collect()
+    lines = []
+    for name, (kind, help_text, label_name) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for label, value in sorted(values.get(name, {}).items()):
+            label_pair = f'{label_name}="{_escape(label)}"'
+            if kind == 'counter':
+                lines.append(f"{name}{{{label_pair}}} {value}")
+                continue
+            for bound, bucket in zip(SECONDS_BUCKETS, value):
+                lines.append(f'{name}_bucket{{{label_pair},le="{bound}"}} {bucket}')
+            lines.append(f'{name}_bucket{{{label_pair},le="+Inf"}} {value[-1]}')
+            lines.append(f"{name}_sum{{{label_pair}}} {value[-2]:.6f}")
+            lines.append(f"{name}_count{{{label_pair}}} {value[-1]}")
+    return '\n'.join(lines) + '\n'
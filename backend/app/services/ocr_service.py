@@ -1,16 +1,28 @@
 import os
+import queue
+import asyncio
+import threading
+import contextvars
+import multiprocessing
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
 import pytesseract
 import cv2
 import numpy as np
 from PIL import Image
 import re
-from typing import Dict, Any, Optional, Tuple, List
+from functools import lru_cache
+from time import perf_counter
+from typing import Dict, Any, Optional, Tuple, List, Union
 import json
 import logging
 try:
     import easyocr  # Optional; depends on torch
 except Exception:
     easyocr = None
+try:
+    import tesserocr  # Optional; in-process Tesseract API (no subprocess or temp files)
+except Exception:
+    tesserocr = None
 try:
     import fitz  # type: ignore  # PyMuPDF for PDF rasterization (optional)
 except Exception:
@@ -20,162 +32,743 @@ import requests
 from io import BytesIO
 import base64
 
+from ..config import settings
+from .ocr_cache import OCRResultCache, get_ocr_cache
+from . import ocr_metrics
+
 logger = logging.getLogger(__name__)
 
+# Tesseract configuration optimized for invoices
+TESSERACT_CHAR_WHITELIST = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz.,/-:₹@%#'
+TESSERACT_CONFIG_TEMPLATE = r'--oem 3 --psm {psm} -c tessedit_char_whitelist=' + TESSERACT_CHAR_WHITELIST
+TESSERACT_INVOICE_CONFIG = TESSERACT_CONFIG_TEMPLATE.format(psm=6)
+
+OCR_BACKENDS = ('pytesseract', 'tesserocr')
+# best_engine values of degraded results that must not be cached
+UNCACHEABLE_ENGINES = ('none', 'tesseract_fallback')
+
+# Bump when a code change alters OCR/extraction output so cached results are not reused
+OCR_PIPELINE_VERSION = '3'
+
+# Bump when the field or line-item extraction logic changes; stored invoices stamped with an older
+# version are picked up by the re-extraction job (pattern edits change the stamp automatically)
+EXTRACTOR_VERSION = '1'
+
+# Anything the OCR pipeline accepts: a file path, raw file bytes, or a decoded image array
+OCRSource = Union[str, bytes, np.ndarray]
+
+# Preprocessing variants in canonical order; Tesseract results are named tesseract_v<position + 1>
+PREPROCESSING_VARIANTS = ('adaptive', 'clahe_otsu', 'blur_otsu', 'morph_adaptive', 'deskew')
+
+# Invoice field extraction patterns for Indian invoices
+GSTIN_PATTERN = r'\b\d{2}[A-Z]{5}\d{4}[A-Z]\d[Z]\d\b'
+PAN_PATTERN = r'\b[A-Z]{5}\d{4}[A-Z]\b'
+INVOICE_FIELD_PATTERNS = {
+    'invoice_number': r'(?:invoice|bill|receipt|voucher)\s*(?:no|number|#)?\s*:?\s*([A-Z0-9\-/]+)',
+    'purchase_order': r'(?:po|purchase\s*order)\s*(?:no|number|#)?\s*:?\s*([A-Z0-9\-/]+)',
+    'date': r'(?:date|dated|dt)\s*:?\s*(\d{1,2}[\/\-\.]\d{1,2}[\/\-\.]\d{2,4})',
+    'due_date': r'(?:due\s*date|payment\s*due)\s*:?\s*(\d{1,2}[\/\-\.]\d{1,2}[\/\-\.]\d{2,4})',
+    'vendor_name': r'^([A-Z][A-Z\s&\.Ltd]+)(?:\n|$)',
+    'vendor_address': r'([A-Z][A-Za-z\s,\-\.0-9]+(?:Road|Street|Lane|Avenue|Nagar|Colony|Area|City))',
+    'phone': r'(\+?91[\s\-]?\d{10}|\d{10})',
+    'email': r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})',
+    'website': r'(www\.[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}|https?://[a-zA-Z0-9.-]+)',
+    'subtotal': r'(?:sub\s*total|subtotal)\s*:?\s*(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
+    'tax_amount': r'(?:gst|tax|vat)\s*(?:amount)?\s*:?\s*(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
+    'total_amount': r'(?:total|grand\s*total|amount|final\s*amount)\s*:?\s*(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
+    'igst': r'(?:igst)\s*(?:@)?\s*(\d+(?:\.\d+)?%?).*?(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
+    'cgst': r'(?:cgst)\s*(?:@)?\s*(\d+(?:\.\d+)?%?).*?(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
+    'sgst': r'(?:sgst)\s*(?:@)?\s*(\d+(?:\.\d+)?%?).*?(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
+    'tcs': r'(?:tcs)\s*(?:@)?\s*(\d+(?:\.\d+)?%?).*?(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
+    'tds': r'(?:tds)\s*(?:@)?\s*(\d+(?:\.\d+)?%?).*?(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)'
+}
+LINE_ITEM_PATTERNS = {
+    'hsn_code': r'\b\d{4,8}\b',
+    'quantity': r'(?:qty|quantity)\s*:?\s*(\d+(?:\.\d+)?)',
+    'rate': r'(?:rate|price|unit\s*price)\s*:?\s*(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
+    'discount': r'(?:discount|disc)\s*:?\s*(\d+(?:\.\d+)?%?)',
+    'unit': r'(?:unit|uom|nos|pcs|kg|gm|ltr|mtr)'
+}
+TAX_FIELDS = ('igst', 'cgst', 'sgst', 'tcs', 'tds')
+
+# Keyword anchors for the field prefilter: a field whose keywords are all absent cannot match and is
+# skipped. For positional anchors every match starts at a keyword, so the search starts at the first one.
+# No keyword may be a prefix of another field's keyword (the anchor scan reports one keyword per position).
+FIELD_ANCHORS: Dict[str, Tuple[Tuple[str, ...], bool]] = {
+    'invoice_number': (('invoice', 'bill', 'receipt', 'voucher'), True),
+    'purchase_order': (('po', 'purchase'), True),
+    'date': (('date', 'dt'), True),
+    'due_date': (('due', 'payment'), True),
+    'vendor_address': (('road', 'street', 'lane', 'avenue', 'nagar', 'colony', 'area', 'city'), False),
+    'email': (('@',), False),
+    'website': (('www.', 'http'), True),
+    'subtotal': (('sub',), True),
+    'tax_amount': (('gst', 'tax', 'vat'), True),
+    'total_amount': (('total', 'grand', 'amount', 'final'), True),
+    'igst': (('igst',), True),
+    'cgst': (('cgst',), True),
+    'sgst': (('sgst',), True),
+    'tcs': (('tcs',), True),
+    'tds': (('tds',), True),
+}
+
+# Common OCR misreads, fixed in one alternation pass (longest first so CG5T wins over G5T)
+OCR_TEXT_FIXES = {
+    'G5T': 'GST',
+    'lGST': 'IGST',
+    'lG5T': 'IGST',
+    'CG5T': 'CGST',
+    'SG5T': 'SGST',
+    'AMT': 'AMOUNT',
+    'QTY': 'QUANTITY',
+    'TOTL': 'TOTAL',
+    '₹ ': '₹',
+    'Rs ': '₹'
+}
+_WHITESPACE_RE = re.compile(r'\s+')
+_OCR_FIX_RE = re.compile('|'.join(re.escape(k) for k in sorted(OCR_TEXT_FIXES, key=len, reverse=True)))
+# Currency prefixes, thousands separators and spaces; the decimal point is kept
+_AMOUNT_STRIP_RE = re.compile(r'₹|rs\.?|,|\s', re.IGNORECASE)
+
+# Line items: at most this many are kept, and a description line takes details from this many following lines
+MAX_LINE_ITEMS = 15
+LINE_ITEM_LOOKAHEAD = 3
+_ITEM_DESCRIPTION_RE = re.compile(r'[A-Za-z][A-Za-z\s]+')
+_ITEM_SUMMARY_RE = re.compile(r'(?:sub\s*total|grand\s*total|total|[cis]?gst|tax|vat|tcs|tds|round\s*off|balance)\b', re.IGNORECASE)
+# Inside an item table a row is a summary only when its whole text part is a label like "CGST @ 9%:" or "Grand Total Rs."
+_SUMMARY_LABEL_RE = re.compile(
+    r'(?:sub\s*total|grand\s*total|total|[cis]?gst|tax|vat|tcs|tds|round\s*off|balance)(?:\s+(?:amount|due|payable|value))?'
+    r'\s*(?:@\s*)?(?:\d+(?:\.\d+)?\s*%)?\s*[:\-]?\s*(?:rs\.?|₹|inr)?\s*[:\-]?(?:\s*[-+]\s*\d[\d,]*(?:\.\d+)?)?',
+    re.IGNORECASE
+)
+_TRAILING_AMOUNT_RE = re.compile(r'(\d+(?:,\d{3})*(?:\.\d{2})?)\s*$')
+_MONEY_RE = re.compile(r'\d{1,3}(?:,\d{2,3})+(?:\.\d{1,2})?|\d+\.\d{2}')  # grouped or with paise, unlike pin codes and phone numbers
+_NUMBER_TOKEN_RE = re.compile(r'₹?\d+(?:,\d{2,3})*(?:\.\d+)?%?')
+_SERIAL_NUMBER_RE = re.compile(r'^\d{1,3}[.)]?\s+')
+_TABLE_HEADER_RE = re.compile(
+    r'\b(?:(?P<description>description|particulars|items?|products?|goods|services)|(?P<hsn_code>hsn|sac)'
+    r'|(?P<quantity>qty|quantity)|(?P<rate>rate|price)|(?P<discount>disc|discount)|(?P<tax>[cis]?gst|tax)'
+    r'|(?P<amount>amount|total|value))\b',
+    re.IGNORECASE
+)
+_QTY_IN_DESCRIPTION_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:nos|pcs|qty|units?)', re.IGNORECASE)
+
+# Keys of extract_invoice_data_advanced output that describe the extraction rather than the invoice
+_META_KEYS = frozenset(('extraction_summary', 'validation_results', 'field_spans'))
+
+# Image-quality classifier (OCR_ADAPTIVE_VARIANTS): statistics come from a thumbnail this wide/tall
+QUALITY_THUMB_SIDE = 512
+QUALITY_BINARY_FRACTION = 0.97  # pixels near pure black/white -> page is already binarized
+QUALITY_LOW_CONTRAST = 120  # 5th-95th percentile grey-level spread below this -> add CLAHE
+QUALITY_NOISE_LEVEL = 4.0  # median absolute median-filter residual above this -> add denoised adaptive
+QUALITY_UNEVEN_LIGHTING = 30.0  # background brightness spread above this -> add adaptive thresholds
+
+# Deskew: the angle is searched on a copy at most this wide/tall, using up to this many ink pixels
+SKEW_SAMPLE_SIDE = 1024
+SKEW_MAX_POINTS = 50000
+SKEW_MAX_DEGREES = 15.0  # search range either side of horizontal
+
+# Text-region detection (OCR_TEXT_REGIONS): blocks are found on a copy at most this wide/tall
+REGION_SAMPLE_SIDE = 1024
+REGION_MAX_COUNT = 60  # more blocks than this -> per-crop overhead outweighs the savings, OCR the full page
+REGION_MAX_COVERAGE = 0.6  # blocks covering more of the page than this -> OCR the full page
+
+# Resolution normalization: glyph heights are measured on a copy at most this wide/tall
+TEXT_HEIGHT_SAMPLE_SIDE = 2048
+TEXT_HEIGHT_MIN_GLYPHS = 20  # fewer glyph-like blobs than this -> no estimate, only the pixel budget applies
+
+# Worker-level executors shared by every AdvancedOCRService in this process,
+# keyed by (kind, max_workers). Recreated after a fork (e.g. Celery prefork).
+_ocr_executors: Dict[Tuple[str, int], Executor] = {}
+_ocr_executors_pid: Optional[int] = None
+_ocr_executors_lock = threading.Lock()
+
+# Warm tesserocr engines, one set per thread (and therefore per pool process)
+_tesserocr_local = threading.local()
+
+# Process-wide EasyOCR readers keyed by language tuple; None records a failed initialization
+EASYOCR_LANGUAGES = ('en', 'hi')
+_easyocr_readers: Dict[Tuple[str, ...], Any] = {}
+_easyocr_lock = threading.Lock()
+
+
+def _configure_tesseract_cmd() -> None:
+    """Point pytesseract at the standard Windows install location if present"""
+    try:
+        possible_paths = [
+            r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe",
+            r"C:\\Program Files (x86)\\Tesseract-OCR\\tesseract.exe"
+        ]
+        for p in possible_paths:
+            if os.path.exists(p):
+                pytesseract.pytesseract.tesseract_cmd = p
+                break
+    except Exception:
+        pass
+
+
+def _ocr_worker_init() -> None:
+    """Initializer for OCR pool processes"""
+    # Variants already run side by side; keep each tesseract single-threaded
+    # so N workers do not oversubscribe the cores with OpenMP threads.
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+    _configure_tesseract_cmd()
+
+
+def _can_fork_children() -> bool:
+    """Daemonic processes (e.g. Celery prefork children) cannot start a process pool"""
+    if multiprocessing.current_process().daemon:
+        return False
+    try:
+        from billiard.process import current_process as billiard_current_process
+        if billiard_current_process().daemon:
+            return False
+    except Exception:
+        pass
+    return True
+
+
+def get_ocr_executor(max_workers: Optional[int] = None, kind: Optional[str] = None) -> Executor:
+    """Return the worker-level executor used to OCR preprocessing variants concurrently"""
+    global _ocr_executors_pid
+    workers = max_workers or settings.ocr_max_workers or os.cpu_count() or 1
+    kind = (kind or settings.ocr_pool_kind or 'process').lower()
+    if kind == 'process' and not _can_fork_children():
+        # Tesseract runs out-of-process anyway, so threads still use all cores here
+        kind = 'thread'
+
+    with _ocr_executors_lock:
+        if _ocr_executors_pid != os.getpid():
+            # Pools inherited from a parent process are unusable after fork
+            _ocr_executors.clear()
+            _ocr_executors_pid = os.getpid()
+        key = (kind, workers)
+        executor = _ocr_executors.get(key)
+        if executor is None:
+            if kind == 'process':
+                executor = ProcessPoolExecutor(max_workers=workers, initializer=_ocr_worker_init)
+            else:
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr')
+            _ocr_executors[key] = executor
+        return executor
+
+
+def get_easyocr_reader(languages: Tuple[str, ...] = EASYOCR_LANGUAGES) -> Optional[Any]:
+    """Return the shared EasyOCR reader for this process, loading the torch models on first use"""
+    if easyocr is None or not settings.ocr_enable_easyocr:
+        return None
+    key = tuple(languages)
+    if key in _easyocr_readers:
+        return _easyocr_readers[key]
+    with _easyocr_lock:
+        if key not in _easyocr_readers:
+            try:
+                _easyocr_readers[key] = easyocr.Reader(list(key), gpu=False)
+                logger.info(f"EasyOCR reader loaded for {key} in process {os.getpid()}")
+            except Exception as e:
+                logger.warning(f"EasyOCR initialization failed (will use Tesseract only): {e}")
+                _easyocr_readers[key] = None
+        return _easyocr_readers[key]
+
+
+def warm_up_easyocr(run_inference: bool = True) -> bool:
+    """Load the shared EasyOCR reader ahead of the first job.
+
+    With run_inference=False only the weights are loaded. Use that in a parent process
+    before it forks, so children share the model pages copy-on-write without inheriting
+    torch's thread pools. Children can then warm up with a tiny inference.
+    """
+    reader = get_easyocr_reader()
+    if reader is None:
+        return False
+    if run_inference:
+        try:
+            reader.readtext(np.full((32, 96), 255, dtype=np.uint8))
+        except Exception as e:
+            logger.warning(f"EasyOCR warm-up inference failed: {e}")
+    return True
+
+
+def _words_from_tesseract_data(data: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Convert pytesseract image_to_data output into a word list with confidences and boxes"""
+    words = []
+    for i, raw in enumerate(data.get('text', [])):
+        word = (raw or '').strip()
+        if not word:
+            continue
+        try:
+            conf = float(data['conf'][i])
+        except (TypeError, ValueError):
+            conf = -1.0
+        words.append({
+            'text': word,
+            'confidence': max(conf, 0.0) / 100,
+            'left': int(data['left'][i]),
+            'top': int(data['top'][i]),
+            'width': int(data['width'][i]),
+            'height': int(data['height'][i]),
+            'block': int(data['block_num'][i]),
+            'par': int(data['par_num'][i]),
+            'line': int(data['line_num'][i])
+        })
+    return words
+
+
+def _text_from_words(words: List[Dict[str, Any]]) -> str:
+    """Rebuild plain text from a word list, one line per Tesseract line and a blank line between blocks"""
+    lines: List[str] = []
+    current_line = None
+    current_block = None
+    for word in words:
+        line_key = (word.get('block'), word.get('par'), word.get('line'))
+        if line_key != current_line:
+            if current_block is not None and word.get('block') != current_block:
+                lines.append('')
+            lines.append(word['text'])
+            current_line = line_key
+            current_block = word.get('block')
+        else:
+            lines[-1] += ' ' + word['text']
+    return '\n'.join(lines)
+
+
+def _words_from_easyocr(results: List[Any]) -> List[Dict[str, Any]]:
+    """Convert EasyOCR readtext output (box, text, confidence) into the shared word layout"""
+    words = []
+    for i, (box, text, conf) in enumerate(results):
+        xs = [int(p[0]) for p in box]
+        ys = [int(p[1]) for p in box]
+        words.append({
+            'text': text,
+            'confidence': float(conf),
+            'left': min(xs),
+            'top': min(ys),
+            'width': max(xs) - min(xs),
+            'height': max(ys) - min(ys),
+            'block': 1,
+            'par': 1,
+            'line': i + 1
+        })
+    return words
+
+
+def _get_tesserocr_api(lang: str = 'eng', psm: int = 6) -> Any:
+    """Return this thread's warm tesserocr engine, loading the traineddata on first use only"""
+    if getattr(_tesserocr_local, 'pid', None) != os.getpid():
+        # Engines inherited through fork share native state with the parent; start fresh
+        _tesserocr_local.apis = {}
+        _tesserocr_local.pid = os.getpid()
+    key = (lang, psm)
+    api = _tesserocr_local.apis.get(key)
+    if api is None:
+        api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm, oem=tesserocr.OEM.DEFAULT)
+        api.SetVariable('tessedit_char_whitelist', TESSERACT_CHAR_WHITELIST)
+        _tesserocr_local.apis[key] = api
+    return api
+
+
+def _tesserocr_words(img: np.ndarray, psm: int = 6) -> List[Dict[str, Any]]:
+    """Recognise a grayscale array with the thread's warm engine and return the shared word layout"""
+    api = _get_tesserocr_api(psm=psm)
+    buf = np.ascontiguousarray(img, dtype=np.uint8)
+    if buf.ndim == 3:
+        buf = cv2.cvtColor(buf, cv2.COLOR_BGR2GRAY)
+    height, width = buf.shape[:2]
+    # Hand the pixel buffer straight to Tesseract: no PIL round-trip, no temp files
+    api.SetImageBytes(buf.tobytes(), width, height, 1, buf.strides[0])
+    api.Recognize()
+
+    words = []
+    block = par = line = 0
+    level = tesserocr.RIL.WORD
+    iterator = api.GetIterator()
+    if iterator is None:
+        return words
+    for word in tesserocr.iterate_level(iterator, level):
+        # Number blocks/paragraphs/lines the way image_to_data does
+        if word.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+            block, par, line = block + 1, 0, 0
+        if word.IsAtBeginningOf(tesserocr.RIL.PARA):
+            par, line = par + 1, 0
+        if word.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+            line += 1
+        text = (word.GetUTF8Text(level) or '').strip()
+        box = word.BoundingBox(level)
+        if not text or box is None:
+            continue
+        x1, y1, x2, y2 = box
+        words.append({
+            'text': text,
+            'confidence': max(float(word.Confidence(level)), 0.0) / 100,
+            'left': x1,
+            'top': y1,
+            'width': x2 - x1,
+            'height': y2 - y1,
+            'block': block,
+            'par': par,
+            'line': line
+        })
+    return words
+
+
+def _recognize_words(img: np.ndarray, backend: str = 'pytesseract', psm: int = 6) -> List[Dict[str, Any]]:
+    """Recognise one image (a page variant or a cropped region) and return its words (module-level for the process pool)"""
+    if backend == 'tesserocr':
+        return _tesserocr_words(img, psm=psm)
+    # A single recognition pass gives text, per-word confidences and bounding boxes
+    config = TESSERACT_INVOICE_CONFIG if psm == 6 else TESSERACT_CONFIG_TEMPLATE.format(psm=psm)
+    data = pytesseract.image_to_data(img, config=config, output_type=pytesseract.Output.DICT)
+    return _words_from_tesseract_data(data)
+
+
+def _variant_result(index: int, words: List[Dict[str, Any]], backend: str) -> Dict[str, Any]:
+    """Summarise the words recognised for one preprocessing variant"""
+    # Calculate confidence over recognised words only
+    confidences = [w['confidence'] for w in words if w['confidence'] > 0]
+    avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+
+    text = _text_from_words(words)
+
+    return {
+        'engine': f'tesseract_v{index+1}',
+        'backend': backend,
+        'text': text.strip(),
+        'confidence': avg_confidence,
+        'word_count': len(text.split()),
+        'char_count': len(text),
+        'words': words
+    }
+
+
+def _ocr_variant(index: int, img: np.ndarray, backend: str = 'pytesseract') -> Dict[str, Any]:
+    """OCR one preprocessed variant with Tesseract (module-level so it can run in a process pool)"""
+    return _variant_result(index, _recognize_words(img, backend), backend)
+
+
+def _timed_call(fn: Any, args: tuple) -> Tuple[Any, float]:
+    """Run one OCR call and return (result, seconds), timed where it runs so pool work is attributed correctly"""
+    start = perf_counter()
+    result = fn(*args)
+    return result, perf_counter() - start
+
+
+def _stitch_region_words(regions: List[Dict[str, int]], region_words: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Move each region's words into page coordinates and renumber blocks so the regions read in order"""
+    words = []
+    block = 0
+    for region_no, (region, found) in enumerate(zip(regions, region_words), 1):
+        current = None
+        for w in found:
+            if w.get('block') != current:
+                block += 1
+                current = w.get('block')
+            words.append(dict(
+                w,
+                left=w['left'] + region['left'],
+                top=w['top'] + region['top'],
+                block=block,
+                region=region_no
+            ))
+    return words
+
+
+@lru_cache(maxsize=None)
+def _compile_extraction_patterns(field_patterns: Tuple[Tuple[str, str], ...], gst_pattern: str,
+                                 pan_pattern: str, line_item_patterns: Tuple[Tuple[str, str], ...]) -> Dict[str, Any]:
+    """Compile the invoice field patterns, the keyword-anchor scanner and the line tokenizer (cached, so once per process)"""
+    anchors = {}
+    keyword_fields: Dict[str, List[str]] = {}
+    for field, pattern in field_patterns:
+        # Anchors only describe the stock patterns; a customised pattern is always searched in full
+        if field in FIELD_ANCHORS and INVOICE_FIELD_PATTERNS.get(field) == pattern:
+            anchors[field] = FIELD_ANCHORS[field][1]
+            for keyword in FIELD_ANCHORS[field][0]:
+                keyword_fields.setdefault(keyword, []).append(field)
+    keywords = sorted(keyword_fields, key=len, reverse=True)
+
+    # One alternation for the per-line tokens; each value is the token's first capture (or the whole token)
+    item_patterns = dict(line_item_patterns)
+    token_names = [name for name in ('quantity', 'rate', 'discount', 'hsn_code') if name in item_patterns]
+    line_tokens = re.compile('|'.join(f'(?P<{name}>{item_patterns[name]})' for name in token_names), re.IGNORECASE) if token_names else None
+    token_groups = {}
+    if line_tokens is not None:
+        for name in token_names:
+            index = line_tokens.groupindex[name]
+            token_groups[name] = index + 1 if re.compile(item_patterns[name]).groups else index
+
+    return {
+        'fields': {field: re.compile(pattern, re.IGNORECASE | re.MULTILINE) for field, pattern in field_patterns},
+        'gstin': re.compile(gst_pattern),
+        'pan': re.compile(pan_pattern),
+        'anchors': anchors,
+        'keyword_fields': keyword_fields,
+        # Zero-width lookahead so overlapping keywords (e.g. "gst" inside "igst") are all seen
+        'anchor_scan': re.compile('(?=(' + '|'.join(re.escape(k) for k in keywords) + '))', re.IGNORECASE) if keywords else None,
+        'line_tokens': line_tokens,
+        'token_groups': token_groups
+    }
+
+
 class AdvancedOCRService:
     """Advanced OCR service for invoice processing with multiple engines and AI enhancement"""
     
-    def __init__(self):
+    def __init__(self, parallel_variants: Optional[bool] = None, max_workers: Optional[int] = None,
+                 ocr_mode: Optional[str] = None, ocr_backend: Optional[str] = None):
         # Configure Tesseract on Windows if installed in standard path
-        try:
-            possible_paths = [
-                r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe",
-                r"C:\\Program Files (x86)\\Tesseract-OCR\\tesseract.exe"
-            ]
-            for p in possible_paths:
-                if os.path.exists(p):
-                    pytesseract.pytesseract.tesseract_cmd = p
-                    break
-        except Exception:
-            pass
+        _configure_tesseract_cmd()
 
-        # Initialize EasyOCR reader for better accuracy (if available)
-        self.easyocr_reader = None
-        if easyocr is not None:
-            try:
-                self.easyocr_reader = easyocr.Reader(['en', 'hi'], gpu=False)
-            except Exception as e:
-                logger.warning(f"EasyOCR initialization failed (will use Tesseract only): {e}")
-                self.easyocr_reader = None
+        # OCR all preprocessing variants at once in the worker-level pool
+        self.parallel_variants = settings.ocr_parallel_variants if parallel_variants is None else parallel_variants
+        self.max_workers = max_workers or settings.ocr_max_workers or None
+
+        # Tesseract backend: pytesseract (subprocess per call) or tesserocr (warm in-process engines)
+        self.ocr_backend = (ocr_backend or settings.ocr_backend or 'pytesseract').lower()
+        if self.ocr_backend not in OCR_BACKENDS:
+            logger.warning(f"Unknown OCR backend '{self.ocr_backend}', using pytesseract")
+            self.ocr_backend = 'pytesseract'
+        elif self.ocr_backend == 'tesserocr' and tesserocr is None:
+            logger.warning("tesserocr is not installed, using pytesseract")
+            self.ocr_backend = 'pytesseract'
+
+        # Multi-page PDFs: render resolution, page cap and how many pages may be rendered ahead
+        self.pdf_dpi = settings.ocr_pdf_dpi
+        self.pdf_max_pages = settings.ocr_pdf_max_pages
+        self.pdf_prefetch_pages = settings.ocr_pdf_prefetch_pages
+        self.pdf_text_min_chars = settings.ocr_pdf_text_min_chars
+        # Pages with a scanned image need a text layer that covers the page, not just a footer or stamp
+        self.pdf_image_max_coverage = settings.ocr_pdf_image_max_coverage
+        self.pdf_text_min_coverage = settings.ocr_pdf_text_min_coverage
+        # Born-digital PDFs: read the embedded text layer instead of OCR-ing the page
+        self.pdf_text_layer = settings.ocr_pdf_text_layer
+
+        # Quick preview: one variant over the top of page 1 at low resolution
+        self.preview_dpi = settings.ocr_preview_dpi
+        self.preview_top_fraction = settings.ocr_preview_top_fraction
+
+        # "all" runs every variant; "cascade" stops at the first stage that clears the thresholds
+        self.ocr_mode = (ocr_mode or settings.ocr_mode or 'all').lower()
+        self.cascade_order = [s.strip() for s in settings.ocr_cascade_order.split(',') if s.strip()]
+        self.cascade_min_confidence = settings.ocr_cascade_min_confidence
+        self.cascade_min_words = settings.ocr_cascade_min_words
+        # Resolution normalization: target glyph height and pixel budget per page (0 disables either)
+        self.target_text_height = settings.ocr_target_text_height
+        self.max_pixels_per_page = settings.ocr_max_pixels_per_page
+        # Deskew: rotate each page once (when skewed by at least the minimum angle) before any variant is built
+        self.deskew_pages = settings.ocr_deskew
+        self.deskew_min_angle = settings.ocr_deskew_min_angle
+        # OCR only detected text blocks (in reading order) instead of the whole page
+        self.text_regions = settings.ocr_text_regions
+        # Build only the variants an image-quality check recommends instead of all five
+        self.adaptive_variants = settings.ocr_adaptive_variants
         
-        # Enhanced regex patterns for Indian invoices
-        self.gst_pattern = r'\b\d{2}[A-Z]{5}\d{4}[A-Z]\d[Z]\d\b'
-        self.pan_pattern = r'\b[A-Z]{5}\d{4}[A-Z]\b'
+        # Enhanced regex patterns for Indian invoices (compiled once per process, see _extraction_patterns)
+        self.gst_pattern = GSTIN_PATTERN
+        self.pan_pattern = PAN_PATTERN
         
         # Comprehensive invoice patterns
-        self.invoice_patterns = {
-            'invoice_number': r'(?:invoice|bill|receipt|voucher)\s*(?:no|number|#)?\s*:?\s*([A-Z0-9\-/]+)',
-            'purchase_order': r'(?:po|purchase\s*order)\s*(?:no|number|#)?\s*:?\s*([A-Z0-9\-/]+)',
-            'date': r'(?:date|dated|dt)\s*:?\s*(\d{1,2}[\/\-\.]\d{1,2}[\/\-\.]\d{2,4})',
-            'due_date': r'(?:due\s*date|payment\s*due)\s*:?\s*(\d{1,2}[\/\-\.]\d{1,2}[\/\-\.]\d{2,4})',
-            'vendor_name': r'^([A-Z][A-Z\s&\.Ltd]+)(?:\n|$)',
-            'vendor_address': r'([A-Z][A-Za-z\s,\-\.0-9]+(?:Road|Street|Lane|Avenue|Nagar|Colony|Area|City))',
-            'phone': r'(\+?91[\s\-]?\d{10}|\d{10})',
-            'email': r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})',
-            'website': r'(www\.[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}|https?://[a-zA-Z0-9.-]+)',
-            'subtotal': r'(?:sub\s*total|subtotal)\s*:?\s*(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            'tax_amount': r'(?:gst|tax|vat)\s*(?:amount)?\s*:?\s*(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            'total_amount': r'(?:total|grand\s*total|amount|final\s*amount)\s*:?\s*(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            'igst': r'(?:igst)\s*(?:@)?\s*(\d+(?:\.\d+)?%?).*?(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            'cgst': r'(?:cgst)\s*(?:@)?\s*(\d+(?:\.\d+)?%?).*?(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            'sgst': r'(?:sgst)\s*(?:@)?\s*(\d+(?:\.\d+)?%?).*?(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            'tcs': r'(?:tcs)\s*(?:@)?\s*(\d+(?:\.\d+)?%?).*?(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            'tds': r'(?:tds)\s*(?:@)?\s*(\d+(?:\.\d+)?%?).*?(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)'
-        }
+        self.invoice_patterns = dict(INVOICE_FIELD_PATTERNS)
         
         # Enhanced line item patterns
-        self.line_item_patterns = {
-            'hsn_code': r'\b\d{4,8}\b',
-            'quantity': r'(?:qty|quantity)\s*:?\s*(\d+(?:\.\d+)?)',
-            'rate': r'(?:rate|price|unit\s*price)\s*:?\s*(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            'discount': r'(?:discount|disc)\s*:?\s*(\d+(?:\.\d+)?%?)',
-            'unit': r'(?:unit|uom|nos|pcs|kg|gm|ltr|mtr)'
-        }
+        self.line_item_patterns = dict(LINE_ITEM_PATTERNS)
 
-    def _ensure_raster_image(self, file_path: str) -> Tuple[str, Optional[str]]:
-        """Ensure we have a raster image path. If input is PDF, rasterize first page.
-        Returns (image_path, temp_path_to_cleanup_or_None).
-        """
-        try:
-            if file_path.lower().endswith('.pdf'):
-                if fitz is None:
-                    raise RuntimeError('PDF provided but PyMuPDF is not installed')
-                doc = fitz.open(file_path)
-                if doc.page_count == 0:
-                    raise RuntimeError('Empty PDF')
-                page = doc.load_page(0)
-                zoom = 2.0
-                mat = fitz.Matrix(zoom, zoom)
-                pix = page.get_pixmap(matrix=mat, alpha=False)
-                import tempfile
-                temp_path = tempfile.mkstemp(suffix='.png')[1]
-                pix.save(temp_path)
-                doc.close()
-                return temp_path, temp_path
-            return file_path, None
-        except Exception as e:
-            logger.warning(f"Failed to rasterize PDF, falling back: {e}")
-            return file_path, None
-    
-    def preprocess_image_advanced(self, image_path: str) -> List[np.ndarray]:
-        """Advanced image preprocessing with multiple techniques"""
-        try:
-            # Read image
-            img = cv2.imread(image_path)
-            if img is None:
-                raise ValueError(f"Could not read image from {image_path}")
-            
-            # Original image for comparison
-            original = img.copy()
-            
-            # Convert to grayscale
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Multiple preprocessing approaches
-            processed_images = []
-            
+    @property
+    def easyocr_reader(self) -> Optional[Any]:
+        """Shared per-process EasyOCR reader (for better accuracy, if available), loaded lazily"""
+        return get_easyocr_reader()
+
+    def _is_pdf(self, source: OCRSource) -> bool:
+        """True if the source is a PDF path or PDF bytes"""
+        if isinstance(source, str):
+            return source.lower().endswith('.pdf')
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return bytes(source[:5]) == b'%PDF-'
+        return False
+
+    def _open_pdf(self, source: Union[str, bytes]) -> Any:
+        """Open a PDF from a path or from in-memory bytes"""
+        if fitz is None:
+            raise RuntimeError('PDF provided but PyMuPDF is not installed')
+        if isinstance(source, str):
+            return fitz.open(source)
+        return fitz.open(stream=bytes(source), filetype='pdf')
+
+    def _build_variant(self, name: str, gray: np.ndarray) -> Optional[np.ndarray]:
+        """Build one named preprocessing variant from a grayscale image (None if not applicable)"""
+        if name == 'adaptive':
             # Approach 1: Standard preprocessing
             denoised = cv2.medianBlur(gray, 3)
             thresh1 = cv2.adaptiveThreshold(
                 denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
             )
             kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
-            cleaned1 = cv2.morphologyEx(thresh1, cv2.MORPH_CLOSE, kernel)
-            processed_images.append(cleaned1)
-            
+            return cv2.morphologyEx(thresh1, cv2.MORPH_CLOSE, kernel)
+
+        if name == 'clahe_otsu':
             # Approach 2: Enhanced contrast
             clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
             enhanced = clahe.apply(gray)
-            thresh2 = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-            processed_images.append(thresh2)
-            
+            return cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+        if name == 'blur_otsu':
             # Approach 3: Gaussian blur + threshold
             blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-            thresh3 = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-            processed_images.append(thresh3)
-            
+            return cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+        if name == 'morph_adaptive':
             # Approach 4: Morphological operations
             kernel_morph = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
             morph = cv2.morphologyEx(gray, cv2.MORPH_CLOSE, kernel_morph)
-            thresh4 = cv2.adaptiveThreshold(
+            return cv2.adaptiveThreshold(
                 morph, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 15, 10
             )
-            processed_images.append(thresh4)
-            
-            # Approach 5: Deskewing
-            coords = np.column_stack(np.where(thresh1 > 0))
-            if len(coords) > 100:
-                angle = cv2.minAreaRect(coords)[-1]
-                if angle < -45:
-                    angle = -(90 + angle)
-                else:
-                    angle = -angle
-                (h, w) = gray.shape[:2]
-                center = (w // 2, h // 2)
-                M = cv2.getRotationMatrix2D(center, angle, 1.0)
-                rotated = cv2.warpAffine(gray, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
-                thresh5 = cv2.threshold(rotated, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-                processed_images.append(thresh5)
+
+        if name == 'deskew':
+            # Approach 5: Deskewing (a no-op rotation when the page was already straightened)
+            rotated, _angle, _matrix = self._deskew(gray)
+            return cv2.threshold(rotated, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+        raise ValueError(f"Unknown preprocessing variant: {name}")
+
+    def _load_grayscale(self, source: OCRSource) -> np.ndarray:
+        """Decode an image path, image bytes or array into a single grayscale array"""
+        if isinstance(source, np.ndarray):
+            if source.ndim == 3:
+                return cv2.cvtColor(source, cv2.COLOR_BGR2GRAY if source.shape[2] == 3 else cv2.COLOR_BGRA2GRAY)
+            return source
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            gray = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+            if gray is None:
+                raise ValueError("Could not decode image bytes")
+            return gray
+        # Decode straight to grayscale; no intermediate colour copy
+        gray = cv2.imread(source, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise ValueError(f"Could not read image from {source}")
+        return gray
+
+    def _assess_image_quality(self, gray: np.ndarray) -> Dict[str, Any]:
+        """Cheap statistics on a thumbnail of the page and the preprocessing variants worth building for it"""
+        h, w = gray.shape[:2]
+        scale = min(1.0, QUALITY_THUMB_SIDE / float(max(h, w)))
+        # Nearest-neighbour sampling keeps the original grey levels and noise (area averaging would hide both)
+        thumb = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_NEAREST) if scale < 1.0 else gray
+
+        hist = cv2.calcHist([thumb], [0], None, [256], [0, 256]).ravel()
+        cdf = np.cumsum(hist) / max(hist.sum(), 1)
+        p5, p95 = int(np.searchsorted(cdf, 0.05)), int(np.searchsorted(cdf, 0.95))
+        contrast = p95 - p5
+        # Share of pixels already at (near) pure black or white
+        binary_fraction = float((hist[:32].sum() + hist[224:].sum()) / max(hist.sum(), 1))
+        is_binary = binary_fraction >= QUALITY_BINARY_FRACTION
+
+        # Noise: typical residual after a 3x3 median filter (the median ignores text edges)
+        noise = float(np.median(cv2.absdiff(thumb, cv2.medianBlur(thumb, 3))))
+        # Uneven lighting: spread of the paper brightness once text is dilated away
+        background = cv2.blur(cv2.dilate(thumb, np.ones((15, 15), np.uint8)), (31, 31))
+        illumination_spread = float(np.percentile(background, 95) - np.percentile(background, 5))
+        skew = self._estimate_skew(thumb)
+
+        recommended = {'blur_otsu'}
+        if not is_binary:
+            if contrast < QUALITY_LOW_CONTRAST:
+                recommended.add('clahe_otsu')
+            if noise > QUALITY_NOISE_LEVEL:
+                recommended.add('adaptive')
+            if illumination_spread > QUALITY_UNEVEN_LIGHTING:
+                recommended.update(('adaptive', 'morph_adaptive'))
+        if abs(skew) >= self.deskew_min_angle:
+            recommended.add('deskew')
+
+        return {
+            'contrast': contrast,
+            'noise': round(noise, 2),
+            'illumination_spread': round(illumination_spread, 1),
+            'skew_degrees': round(skew, 2),
+            'is_binary': is_binary,
+            'variants': [name for name in PREPROCESSING_VARIANTS if name in recommended]
+        }
+
+    def _estimate_skew(self, gray: np.ndarray) -> float:
+        """Angle (degrees, cv2.getRotationMatrix2D convention) that makes the text lines horizontal.
+
+        Projection-profile search on a thumbnail: ink pixels are projected onto the vertical axis along
+        each candidate angle, and the angle whose row histogram is most sharply peaked wins.
+        """
+        h, w = gray.shape[:2]
+        factor = min(1.0, SKEW_SAMPLE_SIDE / float(max(h, w)))
+        thumb = cv2.resize(gray, (max(1, int(w * factor)), max(1, int(h * factor))), interpolation=cv2.INTER_AREA) if factor < 1.0 else gray
+        ink = cv2.threshold(thumb, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+        ys, xs = np.nonzero(ink)
+        # Too little ink to measure, or mostly ink (photo / dark page) where rows carry no signal
+        if len(ys) <= 100 or len(ys) > ink.size * 0.5:
+            return 0.0
+        if len(ys) > SKEW_MAX_POINTS:
+            keep = np.linspace(0, len(ys) - 1, SKEW_MAX_POINTS).astype(np.int64)
+            ys, xs = ys[keep], xs[keep]
+        ys = ys.astype(np.float64)
+        xs = xs.astype(np.float64) - thumb.shape[1] / 2.0
+
+        def sharpness(angle: float) -> float:
+            rows = np.round(ys - xs * np.tan(np.radians(angle))).astype(np.int64)
+            profile = np.bincount(rows - rows.min()).astype(np.float64)
+            return float(np.dot(profile, profile))
+
+        # Coarse 1 degree sweep, then 0.1 degree refinement around the best candidate
+        best = max(np.arange(-SKEW_MAX_DEGREES, SKEW_MAX_DEGREES + 0.5, 1.0), key=sharpness)
+        best = max(np.arange(best - 1.0, best + 1.05, 0.1), key=sharpness)
+        return round(float(best), 2)
+
+    def _deskew(self, gray: np.ndarray) -> Tuple[np.ndarray, float, Optional[np.ndarray]]:
+        """Straighten a page with one rotation; returns (page, angle applied, rotation matrix or None)"""
+        try:
+            angle = self._estimate_skew(gray)
+        except Exception as e:
+            logger.warning(f"Skew estimate failed, leaving page unrotated: {e}")
+            return gray, 0.0, None
+        if abs(angle) < self.deskew_min_angle:
+            return gray, 0.0, None
+        h, w = gray.shape[:2]
+        matrix = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), angle, 1.0)
+        rotated = cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        return rotated, angle, matrix
+
+    def _select_variants(self, gray: np.ndarray) -> Tuple[List[str], Optional[Dict[str, Any]]]:
+        """Variant names to build for a page: all of them, or the classifier's subset in adaptive mode"""
+        if not self.adaptive_variants:
+            return list(PREPROCESSING_VARIANTS), None
+        try:
+            with ocr_metrics.stage('quality'):
+                quality = self._assess_image_quality(gray)
+        except Exception as e:
+            logger.warning(f"Image quality check failed, building every variant: {e}")
+            return list(PREPROCESSING_VARIANTS), None
+        logger.info(f"Image quality {quality}; building variants: {', '.join(quality['variants'])}")
+        return quality['variants'], quality
+
+    def _preprocess_gray(self, gray: np.ndarray, names: Optional[List[str]] = None) -> List[Tuple[str, np.ndarray]]:
+        """Build the named preprocessing variants (default: all) for a grayscale page"""
+        processed_images = []
+        with ocr_metrics.stage('preprocess'):
+            for name in (names or PREPROCESSING_VARIANTS):
+                variant = self._build_variant(name, gray)
+                if variant is not None:
+                    processed_images.append((name, variant))
+        return processed_images
+
+    def preprocess_image_advanced(self, image: OCRSource) -> List[np.ndarray]:
+        """Advanced image preprocessing with multiple techniques"""
+        try:
+            gray = self._load_grayscale(image)
             
-            return processed_images
+            # Multiple preprocessing approaches
+            names, _quality = self._select_variants(gray)
+            return [variant for _name, variant in self._preprocess_gray(gray, names)]
             
         except Exception as e:
             logger.error(f"Error in advanced preprocessing: {e}")
-            # Return a very basic grayscale image as fallback without relying on img variable
+            # Return a very basic grayscale image as fallback
             try:
-                raw = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-                if raw is None:
-                    raise ValueError("Fallback read failed")
+                raw = self._load_grayscale(image)
                 thresh = cv2.threshold(raw, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
                 return [thresh]
             except Exception:
@@ -183,138 +776,784 @@ class AdvancedOCRService:
                 blank = np.full((10, 10), 255, dtype=np.uint8)
                 return [blank]
     
-    def extract_text_multi_engine(self, image_path: str) -> Dict[str, Any]:
-        """Extract text using multiple OCR engines and combine results"""
+    def extract_text_multi_engine(self, source: OCRSource, plan: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Extract text using multiple OCR engines and combine results.
+
+        `source` may be a file path, the raw file bytes, or an already decoded image array;
+        it is decoded once and the grayscale page is shared by every variant. For a PDF,
+        `plan` is its `plan_pdf_pages` result when the caller already has it.
+        """
+        gray = None
         try:
-            # If PDF, rasterize first page to image
-            raster_path, tmp = self._ensure_raster_image(image_path)
-            # Get preprocessed images
-            processed_images = self.preprocess_image_advanced(raster_path)
-            
-            all_results = []
-            
-            # Try each preprocessed image with Tesseract
-            for i, img in enumerate(processed_images):
-                # Tesseract configuration optimized for invoices
-                config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz.,/-:₹@%#'
-                
-                # Extract text with confidence
-                data = pytesseract.image_to_data(img, config=config, output_type=pytesseract.Output.DICT)
-                
-                # Calculate confidence
-                confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
-                avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-                
-                # Extract text
-                text = pytesseract.image_to_string(img, config=config)
-                
-                all_results.append({
-                    'engine': f'tesseract_v{i+1}',
-                    'text': text.strip(),
-                    'confidence': avg_confidence / 100,
-                    'word_count': len(text.split()),
-                    'char_count': len(text)
-                })
-            
-            # Try EasyOCR on original image if available
-            if self.easyocr_reader is not None:
-                try:
-                    easy_results = self.easyocr_reader.readtext(image_path)
-                    easy_text = '\n'.join([r[1] for r in easy_results]) if easy_results else ''
-                    easy_conf = sum([r[2] for r in easy_results]) / len(easy_results) if easy_results else 0
-                    all_results.append({
-                        'engine': 'easyocr',
-                        'text': easy_text,
-                        'confidence': float(easy_conf),
-                        'word_count': len(easy_text.split()),
-                        'char_count': len(easy_text)
-                    })
-                except Exception as e:
-                    logger.warning(f"EasyOCR failed: {e}")
-            
-            # Select best result based on confidence and text length
-            best_result = max(all_results, key=lambda x: (x['confidence'] * 0.7 + (x['word_count'] / 100) * 0.3))
-            
-            result = {
-                'best_text': best_result['text'],
-                'best_confidence': best_result['confidence'],
-                'best_engine': best_result['engine'],
-                'all_results': all_results,
-                'total_engines': len(all_results)
-            }
-            # Cleanup temporary raster file
-            if tmp and os.path.exists(tmp):
-                try:
-                    os.remove(tmp)
-                except Exception:
-                    pass
-            return result
+            # PDFs are streamed page by page; images are a single page
+            if self._is_pdf(source):
+                return self._extract_text_pdf(source, plan)
+            with ocr_metrics.stage('load'):
+                gray = self._load_grayscale(source)
+            return self._extract_text_from_gray(gray)
             
         except Exception as e:
             logger.error(f"Error in multi-engine text extraction: {e}")
-        # Fallback to single engine
+            # Fallback to single engine
             try:
-                raster_path, tmp = self._ensure_raster_image(image_path)
-                img = cv2.imread(raster_path)
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+                if gray is None:
+                    if self._is_pdf(source):
+                        doc = self._open_pdf(source)
+                        try:
+                            gray = self._render_pdf_page(doc.load_page(0))
+                        finally:
+                            doc.close()
+                    else:
+                        gray = self._load_grayscale(source)
                 text = pytesseract.image_to_string(gray)
-                result = {
+                return {
                     'best_text': text,
-            'best_confidence': 0.5 if text.strip() else 0.2,
+                    'best_confidence': 0.5 if text.strip() else 0.2,
                     'best_engine': 'tesseract_fallback',
+                    'best_words': [],
                     'all_results': [],
                     'total_engines': 1
                 }
-                if tmp and os.path.exists(tmp):
-                    try:
-                        os.remove(tmp)
-                    except Exception:
-                        pass
-                return result
-            except:
+            except Exception:
                 return {
                     'best_text': '',
-            'best_confidence': 0.1,
+                    'best_confidence': 0.1,
                     'best_engine': 'none',
+                    'best_words': [],
                     'all_results': [],
                     'total_engines': 0
                 }
     
-    def extract_invoice_data_advanced(self, text: str) -> Dict[str, Any]:
-        """Extract comprehensive structured data from OCR text"""
+    def _load_grayscale_reduced(self, source: OCRSource, max_width: int) -> np.ndarray:
+        """Decode an image to grayscale at roughly max_width, letting the codec skip pixels where it can"""
+        if isinstance(source, np.ndarray):
+            gray = self._load_grayscale(source)
+        else:
+            # Read only the header to pick a reduced decode (JPEG decodes 2/4/8x smaller far faster)
+            try:
+                width = Image.open(source if isinstance(source, str) else BytesIO(bytes(source))).size[0]
+            except Exception:
+                width = 0
+            flag = cv2.IMREAD_GRAYSCALE
+            for factor, reduced in ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                                    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)):
+                if width and width // factor >= max_width:
+                    flag = reduced
+                    break
+            if isinstance(source, str):
+                gray = cv2.imread(source, flag)
+            else:
+                gray = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), flag)
+            if gray is None:
+                raise ValueError("Could not decode image for preview")
+        if gray.shape[1] > max_width:
+            scale = max_width / gray.shape[1]
+            gray = cv2.resize(gray, (max_width, max(1, int(gray.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+        return gray
+
+    def extract_preview_text(self, source: OCRSource) -> Dict[str, Any]:
+        """Fast, low-resolution preview: one variant over the top of the first page.
+
+        PDFs with a text layer return that text directly; otherwise only the top region is
+        rendered/decoded at about `preview_dpi` and OCR'd once. The full-quality pass still
+        runs in process_invoice.
+        """
+        try:
+            if self._is_pdf(source):
+                doc = self._open_pdf(source)
+                try:
+                    page = doc.load_page(0)
+                    if self.pdf_text_layer:
+                        words = self._pdf_text_layer_words(page)
+                        if words is not None:
+                            text = _text_from_words(words)
+                            return {'best_text': text, 'best_confidence': 1.0, 'best_engine': 'pdf_text_layer',
+                                    'word_count': len(text.split())}
+                    rect = page.rect
+                    top = fitz.Rect(rect.x0, rect.y0, rect.x1, rect.y0 + rect.height * self.preview_top_fraction)
+                    zoom = self.preview_dpi / 72.0
+                    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False, clip=top)
+                    gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+                finally:
+                    doc.close()
+            else:
+                # A4 width at the preview DPI
+                gray = self._load_grayscale_reduced(source, int(8.27 * self.preview_dpi))
+                gray = gray[:max(1, int(gray.shape[0] * self.preview_top_fraction)), :]
+
+            variant = self._build_variant('blur_otsu', gray)
+            result = _ocr_variant(PREPROCESSING_VARIANTS.index('blur_otsu'), variant, self.ocr_backend)
+            return {
+                'best_text': result['text'],
+                'best_confidence': result['confidence'],
+                'best_engine': 'tesseract_preview',
+                'word_count': result['word_count']
+            }
+        except Exception as e:
+            logger.warning(f"Preview OCR failed: {e}")
+            return {'best_text': '', 'best_confidence': 0.0, 'best_engine': 'none', 'word_count': 0}
+
+    def _extract_text_from_gray(self, gray: np.ndarray) -> Dict[str, Any]:
+        """Run the configured OCR engines over one grayscale page"""
+        ocr_metrics.count('pages')
+        # Resample to the text size Tesseract prefers before any variant is built
+        with ocr_metrics.stage('normalize'):
+            gray, resolution = self._normalize_resolution(gray)
+        # Straighten the page once; every variant, region and engine below sees the rotated page
+        deskew_angle, rotation = 0.0, None
+        if self.deskew_pages:
+            with ocr_metrics.stage('deskew'):
+                gray, deskew_angle, rotation = self._deskew(gray)
+        regions = None
+        if self.text_regions:
+            with ocr_metrics.stage('text_regions'):
+                regions = self._detect_text_regions(gray)
+
+        if self.ocr_mode == 'cascade':
+            result = self._extract_text_cascade(gray, regions)
+        else:
+            # Get preprocessed images (only the recommended ones in adaptive mode)
+            names, quality = self._select_variants(gray)
+            processed_images = self._preprocess_gray(gray, names)
+            
+            # Try each preprocessed image with Tesseract
+            all_results = self._ocr_variants(processed_images, regions)
+            
+            # Try EasyOCR on original image if available
+            easy_result = self._run_easyocr(gray)
+            if easy_result:
+                all_results.append(easy_result)
+            
+            if quality is None:
+                result = self._combine_results(all_results)
+            else:
+                result = self._combine_results(all_results, image_quality=quality)
+
+        if regions:
+            result['text_regions'] = [dict(r) for r in regions]
+        if rotation is not None:
+            # Map boxes from the straightened page back onto the page as received
+            inverse = cv2.invertAffineTransform(rotation)
+            for box in result.get('best_words', []) + result.get('text_regions', []):
+                x0, y0 = box['left'], box['top']
+                x1, y1 = x0 + box['width'], y0 + box['height']
+                corners = np.array([[x0, y0, 1], [x1, y0, 1], [x0, y1, 1], [x1, y1, 1]], dtype=np.float64) @ inverse.T
+                left, top = np.maximum(corners.min(axis=0), 0)
+                right, bottom = corners.max(axis=0)
+                box.update(left=int(round(left)), top=int(round(top)),
+                           width=int(round(right - left)), height=int(round(bottom - top)))
+            result['deskew_angle'] = deskew_angle
+        if resolution is not None:
+            # Report word and region boxes in the coordinates of the page as it was received
+            inverse = 1.0 / resolution['scale']
+            for box in result.get('best_words', []) + result.get('text_regions', []):
+                for key in ('left', 'top', 'width', 'height'):
+                    box[key] = int(round(box[key] * inverse))
+            result['resolution'] = resolution
+        return result
+
+    def _detect_text_regions(self, gray: np.ndarray) -> Optional[List[Dict[str, int]]]:
+        """Find text blocks on a downsampled page, in reading order, with a Tesseract PSM for each.
+
+        Returns None when the page should be OCR'd whole (no blocks, too many, or mostly text).
+        """
+        try:
+            h, w = gray.shape[:2]
+            factor = min(1.0, REGION_SAMPLE_SIDE / float(max(h, w)))
+            small = cv2.resize(gray, (max(1, int(w * factor)), max(1, int(h * factor))), interpolation=cv2.INTER_AREA) if factor < 1.0 else gray
+            glyph = self._estimate_text_height(small) or max(3.0, small.shape[0] / 100.0)
+
+            # Character edges, smeared sideways into words/lines and downwards into blocks
+            edges = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+            mask = cv2.threshold(edges, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+            mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, int(glyph * 1.5)), 1)))
+            mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(1, int(glyph * 0.8)))))
+            contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        except Exception as e:
+            logger.warning(f"Text region detection failed, OCR-ing the full page: {e}")
+            return None
+
+        pad = int(glyph * 0.5 / factor) + 2
+        boxes = []
+        for contour in contours:
+            x, y, bw, bh = cv2.boundingRect(contour)
+            if bh < glyph * 0.5 or bw < glyph:
+                continue  # specks and stray marks
+            x0, y0 = max(0, int(x / factor) - pad), max(0, int(y / factor) - pad)
+            x1, y1 = min(w, int((x + bw) / factor) + pad), min(h, int((y + bh) / factor) + pad)
+            boxes.append([x0, y0, x1, y1])
+
+        # Padding can make neighbouring blocks overlap; merge until stable
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(boxes)):
+                for j in range(i + 1, len(boxes)):
+                    a, b = boxes[i], boxes[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                        del boxes[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+
+        covered = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in boxes)
+        if not boxes or len(boxes) > REGION_MAX_COUNT or covered > REGION_MAX_COVERAGE * h * w:
+            return None
+
+        # Reading order: rows of blocks top to bottom (a block joins a row when its centre falls inside it), left to right
+        rows: List[List[List[int]]] = []
+        for box in sorted(boxes, key=lambda b: b[1]):
+            centre = (box[1] + box[3]) / 2
+            if rows and rows[-1][0][1] <= centre <= max(b[3] for b in rows[-1]):
+                rows[-1].append(box)
+            else:
+                rows.append([box])
+
+        line_height = glyph / factor * 1.8
+        regions = []
+        for row in rows:
+            for x0, y0, x1, y1 in sorted(row, key=lambda b: b[0]):
+                regions.append({
+                    'left': x0, 'top': y0, 'width': x1 - x0, 'height': y1 - y0,
+                    # One text line -> PSM 7 (single line); otherwise PSM 6 (uniform block)
+                    'psm': 7 if (y1 - y0 - 2 * pad) <= line_height * 1.5 else 6
+                })
+        logger.info(f"Detected {len(regions)} text regions covering {covered / float(h * w):.0%} of the page")
+        return regions
+
+    def _estimate_text_height(self, gray: np.ndarray) -> Optional[float]:
+        """Median glyph height in pixels (about the x-height for mixed-case text), or None if no text is found"""
+        h, w = gray.shape[:2]
+        factor = min(1.0, TEXT_HEIGHT_SAMPLE_SIDE / float(max(h, w)))
+        sample = cv2.resize(gray, (max(1, int(w * factor)), max(1, int(h * factor))), interpolation=cv2.INTER_AREA) if factor < 1.0 else gray
+        ink = cv2.threshold(sample, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+        count, _labels, stats, _centroids = cv2.connectedComponentsWithStats(ink, connectivity=8)
+        if count <= 1:
+            return None
+
+        heights = stats[1:, cv2.CC_STAT_HEIGHT]
+        widths = stats[1:, cv2.CC_STAT_WIDTH]
+        # Keep glyph-like blobs: drop specks, rules, table borders and photos
+        glyphs = (heights >= 3) & (heights <= sample.shape[0] / 10) & (widths <= heights * 4)
+        if glyphs.sum() < TEXT_HEIGHT_MIN_GLYPHS:
+            return None
+        return float(np.median(heights[glyphs])) / factor
+
+    def _normalize_resolution(self, gray: np.ndarray) -> Tuple[np.ndarray, Optional[Dict[str, Any]]]:
+        """Resample a page so its text height suits Tesseract and it fits the per-page pixel budget.
+
+        Returns the (possibly unchanged) page and a summary of the resampling, or None if nothing changed.
+        """
+        h, w = gray.shape[:2]
+        scale = 1.0
+        text_height = None
+        if self.target_text_height > 0:
+            try:
+                text_height = self._estimate_text_height(gray)
+            except Exception as e:
+                logger.warning(f"Text height estimate failed, keeping page resolution: {e}")
+            if text_height:
+                scale = min(max(self.target_text_height / text_height, 0.25), 2.0)
+                # Text already close to the target size is left alone
+                if 0.8 <= scale <= 1.25:
+                    scale = 1.0
+
+        if self.max_pixels_per_page > 0 and h * w * scale * scale > self.max_pixels_per_page:
+            scale = (self.max_pixels_per_page / float(h * w)) ** 0.5
+
+        if scale == 1.0:
+            return gray, None
+
+        size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+        resized = cv2.resize(gray, size, interpolation=interpolation)
+        logger.info(f"Resampled page {w}x{h} -> {size[0]}x{size[1]} (text height {text_height or 'unknown'} px)")
+        return resized, {
+            'scale': round(scale, 4),
+            'text_height': round(text_height, 1) if text_height else None,
+            'original_size': [w, h],
+            'processed_size': list(size)
+        }
+
+    def _render_pdf_page(self, page: Any) -> np.ndarray:
+        """Render a PyMuPDF page straight into a grayscale ndarray at the configured DPI"""
+        zoom = self.pdf_dpi / 72.0
+        with ocr_metrics.stage('rasterize'):
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+        # Wrap the pixmap samples directly; no PNG encode/decode round-trip
+        return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+
+    def _pdf_page_words(self, page: Any) -> List[Dict[str, Any]]:
+        """Read a page's embedded text layer as words, scaled to the raster DPI and at confidence 1.0"""
+        scale = self.pdf_dpi / 72.0
+        words = []
+        # PyMuPDF word tuples: (x0, y0, x1, y1, text, block_no, line_no, word_no)
+        for x0, y0, x1, y1, text, block_no, line_no, _word_no in page.get_text('words', sort=True):
+            if not text.strip():
+                continue
+            words.append({
+                'text': text,
+                'confidence': 1.0,
+                'left': int(x0 * scale),
+                'top': int(y0 * scale),
+                'width': int((x1 - x0) * scale),
+                'height': int((y1 - y0) * scale),
+                'block': block_no + 1,
+                'par': 1,
+                'line': line_no + 1
+            })
+        return words
+
+    @staticmethod
+    def _area_coverage(page: Any, rects: List[Any]) -> float:
+        """Share of the page covered by the given rectangles (overlaps counted twice, capped at 1.0)"""
+        page_rect = page.rect
+        page_area = page_rect.width * page_rect.height
+        if page_area <= 0:
+            return 0.0
+        covered = 0.0
+        for rect in rects:
+            clipped = fitz.Rect(rect) & page_rect
+            if not clipped.is_empty:
+                covered += clipped.width * clipped.height
+        return min(1.0, covered / page_area)
+
+    def _pdf_text_layer_words(self, page: Any) -> Optional[List[Dict[str, Any]]]:
+        """The page's text-layer words if they can stand in for OCR, else None (rasterize the page).
+
+        Enough characters is not sufficient: scanner apps put a footer such as "Scanned with ..."
+        or "Page 1 of 1" over a full-page image. A page counts as text-only when its images cover
+        little of it; otherwise the text layer itself must cover a meaningful share of the page.
+        """
+        words = self._pdf_page_words(page)
+        if sum(len(w['text']) for w in words) < self.pdf_text_min_chars:
+            return None
+        image_coverage = self._area_coverage(page, [info['bbox'] for info in page.get_image_info()])
+        if image_coverage <= self.pdf_image_max_coverage:
+            return words
+        # Word boxes are in raster pixels; map them back to points
+        scale = 72.0 / self.pdf_dpi
+        word_rects = [(w['left'] * scale, w['top'] * scale, (w['left'] + w['width']) * scale, (w['top'] + w['height']) * scale)
+                      for w in words]
+        if self._area_coverage(page, word_rects) >= self.pdf_text_min_coverage:
+            return words
+        return None
+
+    def _scan_pdf_text_layer(self, source: Union[str, bytes]) -> Tuple[int, Dict[int, List[Dict[str, Any]]]]:
+        """Return (pages_to_process, {page_index: words}) for pages with a usable text layer"""
+        doc = self._open_pdf(source)
+        try:
+            if doc.page_count == 0:
+                raise RuntimeError('Empty PDF')
+            if doc.page_count > self.pdf_max_pages:
+                logger.warning(f"PDF has {doc.page_count} pages; only the first {self.pdf_max_pages} are processed")
+            page_count = min(doc.page_count, self.pdf_max_pages)
+            text_pages = {}
+            if self.pdf_text_layer:
+                for index in range(page_count):
+                    words = self._pdf_text_layer_words(doc.load_page(index))
+                    if words is not None:
+                        text_pages[index] = words
+            return page_count, text_pages
+        finally:
+            doc.close()
+
+    def _iter_pdf_pages(self, source: Union[str, bytes], page_indexes: List[int]):
+        """Yield (page_index, grayscale_array) for the given PDF pages, rendering ahead in a background thread.
+
+        At most `pdf_prefetch_pages` rendered pages wait in memory, so long documents stay
+        bounded while page N is rendered during OCR of page N-1.
+        """
+        pages: queue.Queue = queue.Queue(maxsize=max(1, self.pdf_prefetch_pages))
+        stop = threading.Event()
+        done = object()
+
+        def _put(item: Any) -> bool:
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def _render() -> None:
+            # The document is opened, used and closed on this thread only
+            try:
+                doc = self._open_pdf(source)
+                try:
+                    for index in page_indexes:
+                        if stop.is_set():
+                            return
+                        if not _put((index, self._render_pdf_page(doc.load_page(index)))):
+                            return
+                finally:
+                    doc.close()
+            except Exception as e:
+                _put((None, e))
+            finally:
+                _put(done)
+
+        # Run in a copy of this context so rasterize time lands in the current job's timings
+        renderer = threading.Thread(target=contextvars.copy_context().run, args=(_render,), name='pdf-rasterizer', daemon=True)
+        renderer.start()
+        try:
+            while True:
+                item = pages.get()
+                if item is done:
+                    break
+                if item[0] is None:
+                    raise item[1]
+                yield item
+        finally:
+            stop.set()
+            renderer.join(timeout=5)
+
+    def _text_layer_page_result(self, words: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build a page result from embedded PDF text, bypassing OCR"""
+        text = _text_from_words(words)
+        return {
+            'best_text': text,
+            'best_confidence': 1.0,
+            'best_engine': 'pdf_text_layer',
+            'best_words': words,
+            'all_results': [],
+            'total_engines': 0
+        }
+
+    def plan_pdf_pages(self, source: Union[str, bytes]) -> Dict[str, Any]:
+        """Split a PDF into finished text-layer page results and the page indexes that still need OCR"""
+        page_count, text_pages = self._scan_pdf_text_layer(source)
+        page_results = []
+        for index, words in text_pages.items():
+            page_result = self._text_layer_page_result(words)
+            page_result.update(page=index + 1, source='text')
+            page_results.append(page_result)
+        return {
+            'page_count': page_count,
+            'text_pages': page_results,
+            'scanned_pages': [i for i in range(page_count) if i not in text_pages]
+        }
+
+    def extract_text_pdf_page(self, source: Union[str, bytes], index: int) -> Dict[str, Any]:
+        """Rasterize and OCR a single PDF page; the unit of work for per-page task fan-out"""
+        with ocr_metrics.track_job('pdf_page') as timings:
+            doc = self._open_pdf(source)
+            try:
+                gray = self._render_pdf_page(doc.load_page(index))
+            finally:
+                doc.close()
+            page_result = self._extract_text_from_gray(gray)
+            # finish_pdf_pages folds these into the document's timings
+            page_result.update(page=index + 1, source='image', page_timings=timings.as_dict())
+        return page_result
+
+    def _extract_text_pdf(self, source: Union[str, bytes], plan: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Use the PDF text layer where present and OCR the remaining pages as they are rasterized"""
+        if plan is None:
+            plan = self.plan_pdf_pages(source)
+        page_results = list(plan['text_pages'])
+
+        # Born-digital documents finish here without rasterizing anything
+        scanned_pages = plan['scanned_pages']
+        if scanned_pages:
+            for index, gray in self._iter_pdf_pages(source, scanned_pages):
+                page_result = self._extract_text_from_gray(gray)
+                page_result.update(page=index + 1, source='image')
+                page_results.append(page_result)
+        return self._merge_page_results(page_results)
+
+    def _merge_page_results(self, page_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Merge per-page OCR results into one multi-engine result in page order"""
+        page_results = sorted(page_results, key=lambda r: r.get('page', 0))
+        if len(page_results) == 1 and page_results[0].get('source') != 'text':
+            merged = dict(page_results[0])
+        else:
+            merged = {
+                'ocr_mode': self.ocr_mode,
+                'ocr_backend': self.ocr_backend
+            }
+
+        all_results = []
+        best_words = []
+        engine_weights: Dict[str, int] = {}
+        weighted_conf = 0.0
+        total_words = 0
+        for page in page_results:
+            page_no = page.get('page', 1)
+            for r in page.get('all_results', []):
+                all_results.append(dict(r, page=page_no))
+            for w in page.get('best_words', []):
+                best_words.append(dict(w, page=page_no))
+            words = max(len(page.get('best_text', '').split()), 1)
+            weighted_conf += page.get('best_confidence', 0.0) * words
+            total_words += words
+            engine_weights[page.get('best_engine', 'none')] = engine_weights.get(page.get('best_engine', 'none'), 0) + words
+
+        merged.update({
+            'best_text': '\n\n'.join(p.get('best_text', '') for p in page_results if p.get('best_text')),
+            # Pages with more text weigh more in the document confidence
+            'best_confidence': weighted_conf / total_words if total_words else 0.0,
+            'best_engine': max(engine_weights, key=engine_weights.get) if engine_weights else 'none',
+            'best_words': best_words,
+            'all_results': all_results,
+            'total_engines': sum(p.get('total_engines', 0) for p in page_results),
+            'page_count': len(page_results),
+            'pages': [
+                {
+                    'page': p.get('page'),
+                    'source': p.get('source', 'image'),
+                    'engine': p.get('best_engine'),
+                    'confidence': p.get('best_confidence', 0.0),
+                    'word_count': len(p.get('best_text', '').split()),
+                    'cascade_stage': p.get('cascade_stage'),
+                    'image_quality': p.get('image_quality'),
+                    'resolution': p.get('resolution'),
+                    'deskew_angle': p.get('deskew_angle')
+                }
+                for p in page_results
+            ]
+        })
+        merged.pop('page', None)
+        merged.pop('source', None)
+        return merged
+
+    def _run_easyocr(self, image: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Run EasyOCR on the raster image if a reader is available"""
+        if self.easyocr_reader is None:
+            return None
+        try:
+            with ocr_metrics.stage('easyocr'):
+                easy_results = self.easyocr_reader.readtext(image)
+            easy_text = '\n'.join([r[1] for r in easy_results]) if easy_results else ''
+            easy_conf = sum([r[2] for r in easy_results]) / len(easy_results) if easy_results else 0
+            return {
+                'engine': 'easyocr',
+                'text': easy_text,
+                'confidence': float(easy_conf),
+                'word_count': len(easy_text.split()),
+                'char_count': len(easy_text),
+                'words': _words_from_easyocr(easy_results)
+            }
+        except Exception as e:
+            logger.warning(f"EasyOCR failed: {e}")
+            return None
+
+    def _combine_results(self, all_results: List[Dict[str, Any]], best_result: Optional[Dict[str, Any]] = None,
+                         **extra: Any) -> Dict[str, Any]:
+        """Pick the best engine result (unless given) and build the multi-engine result dict"""
+        if best_result is None:
+            # Select best result based on confidence and text length
+            best_result = max(all_results, key=lambda x: (x['confidence'] * 0.7 + (x['word_count'] / 100) * 0.3))
+        
+        # Keep the word layout of the winning variant only; the others are summaries
+        best_words = best_result.get('words', [])
+        for r in all_results:
+            r.pop('words', None)
+        
+        result = {
+            'best_text': best_result['text'],
+            'best_confidence': best_result['confidence'],
+            'best_engine': best_result['engine'],
+            'best_words': best_words,
+            'all_results': all_results,
+            'total_engines': len(all_results),
+            'ocr_mode': self.ocr_mode,
+            'ocr_backend': self.ocr_backend
+        }
+        result.update(extra)
+        return result
+
+    def _extract_text_cascade(self, gray: np.ndarray, regions: Optional[List[Dict[str, int]]] = None) -> Dict[str, Any]:
+        """Run OCR stages in order and stop at the first one that clears the confidence/word thresholds"""
+        all_results = []
+        stages_run = []
+        winner = None
+
+        order = self.cascade_order
+        names, quality = self._select_variants(gray)
+        if quality is not None:
+            # Skip variants the classifier ruled out; keep non-variant stages such as easyocr
+            filtered = [s for s in order if s not in PREPROCESSING_VARIANTS or s in names]
+            if any(s in PREPROCESSING_VARIANTS for s in filtered):
+                order = filtered
+
+        for stage in order:
+            if stage == 'easyocr':
+                stage_result = self._run_easyocr(gray)
+            elif stage in PREPROCESSING_VARIANTS:
+                with ocr_metrics.stage('preprocess'):
+                    variant = self._build_variant(stage, gray)
+                stage_result = self._ocr_variants([(stage, variant)], regions)[0] if variant is not None else None
+            else:
+                logger.warning(f"Unknown OCR cascade stage skipped: {stage}")
+                continue
+            if not stage_result:
+                continue
+
+            stage_result['stage'] = stage
+            all_results.append(stage_result)
+            stages_run.append(stage)
+            if (stage_result['confidence'] >= self.cascade_min_confidence
+                    and stage_result['word_count'] >= self.cascade_min_words):
+                winner = stage_result
+                break
+
+        if not all_results:
+            raise ValueError("No OCR cascade stage produced a result")
+
+        cascade_stage = winner['stage'] if winner else None
+        logger.info(f"OCR cascade finished after {len(stages_run)} stage(s); winning stage: {cascade_stage or 'none (best of all)'}")
+        extra = {'image_quality': quality} if quality is not None else {}
+        return self._combine_results(
+            all_results,
+            best_result=winner,
+            cascade_stage=cascade_stage,
+            stages_run=stages_run,
+            **extra
+        )
+
+    def _ocr_variants(self, processed_images: List[Tuple[str, np.ndarray]],
+                      regions: Optional[List[Dict[str, int]]] = None) -> List[Dict[str, Any]]:
+        """OCR every preprocessed variant (or each variant's text regions), concurrently when parallel mode is enabled"""
+        # Engine names follow the variant's position in PREPROCESSING_VARIANTS, whichever subset was built
+        calls = []
+        plan = []
+        for name, img in processed_images:
+            index = PREPROCESSING_VARIANTS.index(name)
+            # Without page-level deskew the deskew variant may be rotated, so region boxes would not line up
+            label = f'tesseract:{name}'
+            if regions and (self.deskew_pages or name != 'deskew'):
+                plan.append((index, len(calls), len(regions)))
+                calls.extend(
+                    (label, _recognize_words, (img[r['top']:r['top'] + r['height'], r['left']:r['left'] + r['width']], self.ocr_backend, r['psm']))
+                    for r in regions
+                )
+            else:
+                plan.append((index, len(calls), None))
+                calls.append((label, _ocr_variant, (index, img, self.ocr_backend)))
+
+        ocr_metrics.count('ocr_calls', len(calls))
+        # Wall time for the batch; the per-variant tesseract:<name> stages add up the time each call took
+        with ocr_metrics.stage('tesseract'):
+            outputs = self._run_ocr_calls(calls)
+        results = []
+        for index, start, count in plan:
+            if count is None:
+                results.append(outputs[start])
+            else:
+                words = _stitch_region_words(regions, outputs[start:start + count])
+                results.append(_variant_result(index, words, self.ocr_backend))
+        return results
+
+    def _run_ocr_calls(self, calls: List[Tuple[str, Any, tuple]]) -> List[Any]:
+        """Run (label, fn, args) OCR calls in the worker pool (or inline), recording each call's time under its label"""
+        timed = self._run_timed_calls([(fn, args) for _label, fn, args in calls])
+        for (label, _fn, _args), (_result, seconds) in zip(calls, timed):
+            ocr_metrics.add_stage(label, seconds)
+        return [result for result, _seconds in timed]
+
+    def _run_timed_calls(self, calls: List[Tuple[Any, tuple]]) -> List[Tuple[Any, float]]:
+        """Run module-level OCR calls in the worker pool (or inline) and return (result, seconds) in order"""
+        if not self.parallel_variants or len(calls) < 2:
+            return [_timed_call(fn, args) for fn, args in calls]
+
+        try:
+            executor = get_ocr_executor(self.max_workers)
+            futures = [executor.submit(_timed_call, fn, args) for fn, args in calls]
+            # Keep call order so engine names and tie-breaking match sequential mode
+            return [f.result() for f in futures]
+        except BrokenExecutor as e:
+            # A pool process died (e.g. OOM-killed); drop the pool so the next call rebuilds it
+            logger.warning(f"OCR pool broken, running variants sequentially: {e}")
+            with _ocr_executors_lock:
+                for key, pooled in list(_ocr_executors.items()):
+                    if pooled is executor:
+                        del _ocr_executors[key]
+            return [_timed_call(fn, args) for fn, args in calls]
+        except Exception as e:
+            logger.warning(f"Parallel OCR failed, running variants sequentially: {e}")
+            return [_timed_call(fn, args) for fn, args in calls]
+
+    def _extraction_patterns(self) -> Dict[str, Any]:
+        """This instance's field patterns, compiled (shared by every instance with the same patterns)"""
+        return _compile_extraction_patterns(tuple(self.invoice_patterns.items()), self.gst_pattern, self.pan_pattern,
+                                            tuple(self.line_item_patterns.items()))
+
+    @staticmethod
+    def _first_anchor_positions(text: str, patterns: Dict[str, Any]) -> Dict[str, int]:
+        """One scan over the text: offset of the first keyword anchor of every anchored field present"""
+        first: Dict[str, int] = {}
+        scan = patterns['anchor_scan']
+        if scan is None:
+            return first
+        wanted = len(patterns['anchors'])
+        for m in scan.finditer(text):
+            for field in patterns['keyword_fields'].get(m.group(1).lower(), ()):
+                first.setdefault(field, m.start())
+            if len(first) == wanted:
+                break
+        return first
+
+    def extract_invoice_data_advanced(self, text: str, words: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Extract comprehensive structured data from OCR text.
+
+        Besides the fields, `field_spans` maps each extracted field to the [start, end) offsets of the
+        matched value in the cleaned text (`_clean_text(text)`). When the OCR word boxes are given,
+        line items are read from table rows rebuilt from them instead of from the text lines.
+        """
         extracted_data = {}
+        field_spans: Dict[str, List[int]] = {}
         
         try:
             # Clean and normalize text
             cleaned_text = self._clean_text(text)
+            patterns = self._extraction_patterns()
+            first_anchor = self._first_anchor_positions(cleaned_text, patterns)
             
             # Extract basic information
-            for field, pattern in self.invoice_patterns.items():
-                matches = re.search(pattern, cleaned_text, re.IGNORECASE | re.MULTILINE)
+            for field, regex in patterns['fields'].items():
+                start = 0
+                if field in patterns['anchors']:
+                    if field not in first_anchor:
+                        continue  # none of the field's keywords occur, so its pattern cannot match
+                    if patterns['anchors'][field]:
+                        start = first_anchor[field]
+                matches = regex.search(cleaned_text, start)
                 if matches:
-                    if field in ['igst', 'cgst', 'sgst', 'tcs', 'tds']:
+                    if field in TAX_FIELDS:
                         # For tax fields, extract both rate and amount
                         if len(matches.groups()) >= 2:
                             extracted_data[f'{field}_rate'] = matches.group(1)
                             extracted_data[f'{field}_amount'] = self._parse_amount(matches.group(2))
+                            field_spans[f'{field}_rate'] = list(matches.span(1))
+                            field_spans[f'{field}_amount'] = list(matches.span(2))
                     else:
                         extracted_data[field] = matches.group(1).strip()
+                        field_spans[field] = list(matches.span(1))
             
             # Extract GST and PAN numbers
-            gst_matches = re.findall(self.gst_pattern, cleaned_text)
+            gst_matches = list(patterns['gstin'].finditer(cleaned_text))
             if gst_matches:
-                extracted_data['gstin'] = gst_matches[0]
+                extracted_data['gstin'] = gst_matches[0].group(0)
+                field_spans['gstin'] = list(gst_matches[0].span())
                 # Try to extract multiple GST numbers (buyer/seller)
                 if len(gst_matches) > 1:
-                    extracted_data['buyer_gstin'] = gst_matches[0]
-                    extracted_data['seller_gstin'] = gst_matches[1]
+                    extracted_data['buyer_gstin'] = gst_matches[0].group(0)
+                    extracted_data['seller_gstin'] = gst_matches[1].group(0)
+                    field_spans['buyer_gstin'] = list(gst_matches[0].span())
+                    field_spans['seller_gstin'] = list(gst_matches[1].span())
             
-            pan_matches = re.findall(self.pan_pattern, cleaned_text)
-            if pan_matches:
-                extracted_data['pan'] = pan_matches[0]
+            pan_match = patterns['pan'].search(cleaned_text)
+            if pan_match:
+                extracted_data['pan'] = pan_match.group(0)
+                field_spans['pan'] = list(pan_match.span())
             
             # Extract comprehensive line items
-            line_items = self._extract_line_items_advanced(cleaned_text)
+            with ocr_metrics.stage('line_items'):
+                line_items = self._extract_line_items_advanced(text, words)
             if line_items:
                 extracted_data['line_items'] = line_items
                 extracted_data['total_items'] = len(line_items)
@@ -335,8 +1574,10 @@ class AdvancedOCRService:
             extracted_data['extraction_summary'] = self._calculate_extraction_summary(extracted_data)
             
             # Validate data consistency
-            extracted_data['validation_results'] = self._validate_invoice_data(extracted_data)
+            with ocr_metrics.stage('validation'):
+                extracted_data['validation_results'] = self._validate_invoice_data(extracted_data)
             
+            extracted_data['field_spans'] = field_spans
             return extracted_data
             
         except Exception as e:
@@ -345,36 +1586,23 @@ class AdvancedOCRService:
     
     def _clean_text(self, text: str) -> str:
         """Clean and normalize OCR text"""
-        # Remove excessive whitespace
-        cleaned = re.sub(r'\n+', '\n', text)
-        cleaned = re.sub(r'\s+', ' ', cleaned)
-        
-        # Fix common OCR errors
-        replacements = {
-            'G5T': 'GST',
-            'lGST': 'IGST',
-            'CG5T': 'CGST',
-            'SG5T': 'SGST',
-            'AMT': 'AMOUNT',
-            'QTY': 'QUANTITY',
-            'TOTL': 'TOTAL',
-            '₹ ': '₹',
-            'Rs ': '₹'
-        }
-        
-        for old, new in replacements.items():
-            cleaned = cleaned.replace(old, new)
+        # Remove excessive whitespace (newlines included)
+        cleaned = _WHITESPACE_RE.sub(' ', text)
         
-        return cleaned
+        # Fix common OCR errors in a single pass
+        return _OCR_FIX_RE.sub(lambda m: OCR_TEXT_FIXES[m.group(0)], cleaned)
     
-    def _parse_amount(self, amount_str: str) -> Optional[float]:
+    def _parse_amount(self, amount_str: Union[str, float, None]) -> Optional[float]:
         """Parse amount string to float"""
         if not amount_str:
             return None
+        if isinstance(amount_str, (int, float)):
+            # Already parsed (tax amounts are parsed when matched)
+            return float(amount_str)
         
         try:
             # Remove currency symbols and commas
-            cleaned = re.sub(r'[₹Rs.,]', '', amount_str).strip()
+            cleaned = _AMOUNT_STRIP_RE.sub('', amount_str).strip()
             return float(cleaned)
         except (ValueError, AttributeError):
             return None
@@ -399,113 +1627,227 @@ class AdvancedOCRService:
         except Exception:
             return None
     
-    def _extract_line_items_advanced(self, text: str) -> List[Dict[str, Any]]:
-        """Extract detailed line items from invoice text"""
-        line_items = []
+    def _extract_line_items_advanced(self, text: str, words: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Extract detailed line items from invoice text, or from table rows rebuilt from OCR word boxes.
+
+        One pass over the lines, each classified once. Once a table header row (Description / HSN /
+        Qty / Rate / Amount ...) is seen, each row's trailing numbers are mapped onto the header's
+        columns, right-aligned, until a subtotal/tax/total line ends the table. Without a header, a
+        description line opens an item that the next LINE_ITEM_LOOKAHEAD raw lines fill in, and a line
+        ending in a money amount is an item of its own.
+        """
+        table_items: List[Dict[str, Any]] = []
+        loose_items: List[Dict[str, Any]] = []
         
         try:
-            lines = text.split('\n')
-            current_item = {}
+            rows = self._rows_from_words(words) if words else text.split('\n')
+            patterns = self._extraction_patterns()
+            columns: Optional[List[str]] = None  # header columns while inside an item table
+            seen_header = False
+            current: Optional[Dict[str, Any]] = None
+            window = 0
             
-            for i, line in enumerate(lines):
-                line = line.strip()
+            for raw_line in rows:
+                line = self._clean_text(raw_line).strip()
                 if not line:
+                    window -= 1  # blank lines still count towards the look-ahead window
                     continue
                 
-                # Look for item description (usually longer text without numbers at start)
-                if re.match(r'^[A-Za-z][A-Za-z\s]+', line) and not re.search(r'^\d', line):
-                    if current_item and 'description' in current_item:
-                        line_items.append(current_item)
-                    
-                    current_item = {'description': line}
-                    
-                    # Look ahead for quantity, rate, amount in next few lines
-                    for j in range(i+1, min(i+4, len(lines))):
-                        next_line = lines[j].strip()
-                        
-                        # Extract HSN code
-                        hsn_match = re.search(self.line_item_patterns['hsn_code'], next_line)
-                        if hsn_match and 'hsn_code' not in current_item:
-                            current_item['hsn_code'] = hsn_match.group(0)
-                        
-                        # Extract quantity
-                        qty_match = re.search(self.line_item_patterns['quantity'], next_line, re.IGNORECASE)
-                        if qty_match:
-                            current_item['quantity'] = float(qty_match.group(1))
-                        
-                        # Extract rate
-                        rate_match = re.search(self.line_item_patterns['rate'], next_line, re.IGNORECASE)
-                        if rate_match:
-                            current_item['rate'] = self._parse_amount(rate_match.group(1))
+                header = self._table_header(line)
+                if header:
+                    self._add_line_item(table_items if columns else loose_items, current)
+                    columns, seen_header, current, window = header, True, None, 0
+                    continue
+                
+                if _ITEM_SUMMARY_RE.match(line) and (not columns or _SUMMARY_LABEL_RE.fullmatch(self._split_row(line)[0])):
+                    # Subtotal / tax / total lines end the open item (and the table); in a table, a row
+                    # whose description merely starts with such a word ("GST filing service") is an item
+                    if self._add_line_item(table_items if columns else loose_items, current) and columns:
+                        return table_items
+                    columns, current, window = None, None, 0
+                    continue
+                
+                if columns:
+                    description, numbers = self._split_row(line)
+                    if re.search('[A-Za-z]', description):
+                        # A new table row: description (minus any serial number) and its column values
+                        if self._add_line_item(table_items, current):
+                            return table_items
+                        current = {'description': _SERIAL_NUMBER_RE.sub('', description)}
+                        leftover = self._fill_columns(current, numbers, columns)
+                        if leftover:
+                            current['description'] = f"{current['description']} {' '.join(leftover)}"
+                        # A description without numbers takes them from the next lines
+                        window = 0 if numbers else LINE_ITEM_LOOKAHEAD
+                    elif numbers and current is not None and window > 0 and 'amount' not in current:
+                        self._fill_columns(current, numbers, columns)
+                        window -= 1
+                    else:
+                        window -= 1
+                    continue
+                
+                if seen_header:
+                    continue  # after the item table: footer text, not items
+                
+                amount_match = _TRAILING_AMOUNT_RE.search(line)
+                if amount_match and not _MONEY_RE.fullmatch(amount_match.group(1)):
+                    amount_match = None
+                # Text before a trailing amount, when the amount is a separate token
+                head = line[:amount_match.start()] if amount_match else ''
+                head = head.strip() if head[-1:].isspace() else ''
+                
+                if _ITEM_DESCRIPTION_RE.match(line):
+                    # Item description (text first); an amount on the same line is its line total
+                    self._add_line_item(loose_items, current)
+                    current = {'description': head or line}
+                    if head:
+                        current['amount'] = self._parse_amount(amount_match.group(1))
+                    self._apply_line_tokens(current, head or line, patterns)
+                    qty_in_desc = _QTY_IN_DESCRIPTION_RE.search(head) if head and 'quantity' not in current else None
+                    if qty_in_desc and float(qty_in_desc.group(1)) > 0:
+                        current['quantity'] = float(qty_in_desc.group(1))
+                        current.setdefault('rate', current['amount'] / current['quantity'] if current['amount'] else None)
+                    window = LINE_ITEM_LOOKAHEAD
+                
+                elif current is not None and window > 0:
+                    # Detail line under the open description
+                    self._apply_line_tokens(current, line, patterns)
+                    if amount_match and 'amount' not in current:
+                        current['amount'] = self._parse_amount(amount_match.group(1))
+                    window -= 1
+                
+                elif head:
+                    # Alternative pattern: a line with a clear trailing amount is an item on its own
+                    amount = self._parse_amount(amount_match.group(1))
+                    if amount and amount > 0:
+                        self._add_line_item(loose_items, current)
+                        current, window = None, 0
+                        line_item = {
+                            'description': head,
+                            'amount': amount,
+                            'quantity': 1,  # Default
+                            'rate': amount  # Assume rate = amount if quantity = 1
+                        }
                         
-                        # Extract discount
-                        disc_match = re.search(self.line_item_patterns['discount'], next_line, re.IGNORECASE)
-                        if disc_match:
-                            current_item['discount'] = disc_match.group(1)
+                        # Try to extract quantity from description
+                        qty_in_desc = _QTY_IN_DESCRIPTION_RE.search(head)
+                        if qty_in_desc:
+                            qty = float(qty_in_desc.group(1))
+                            line_item['quantity'] = qty
+                            line_item['rate'] = amount / qty if qty > 0 else amount
                         
-                        # Extract line total (amount at end of line)
-                        amount_match = re.search(r'(\d+(?:,\d{3})*(?:\.\d{2})?)\s*$', next_line)
-                        if amount_match and 'amount' not in current_item:
-                            current_item['amount'] = self._parse_amount(amount_match.group(1))
+                        self._add_line_item(loose_items, line_item)
                 
-                # Alternative pattern: Look for lines with clear amount patterns
-                elif re.search(r'(\d+(?:,\d{3})*(?:\.\d{2})?)\s*$', line):
-                    amount = self._parse_amount(re.search(r'(\d+(?:,\d{3})*(?:\.\d{2})?)\s*$', line).group(1))
-                    if amount and amount > 0:
-                        # Extract description (everything before the amount)
-                        desc_match = re.match(r'^(.+?)\s+\d+(?:,\d{3})*(?:\.\d{2})?\s*$', line)
-                        if desc_match:
-                            description = desc_match.group(1).strip()
-                            
-                            line_item = {
-                                'description': description,
-                                'amount': amount,
-                                'quantity': 1,  # Default
-                                'rate': amount  # Assume rate = amount if quantity = 1
-                            }
-                            
-                            # Try to extract quantity from description
-                            qty_in_desc = re.search(r'(\d+(?:\.\d+)?)\s*(?:nos|pcs|qty|units?)', description, re.IGNORECASE)
-                            if qty_in_desc:
-                                qty = float(qty_in_desc.group(1))
-                                line_item['quantity'] = qty
-                                line_item['rate'] = amount / qty if qty > 0 else amount
-                            
-                            line_items.append(line_item)
+                else:
+                    window -= 1
             
             # Add last item if exists
-            if current_item and 'description' in current_item:
-                line_items.append(current_item)
-            
-            # Clean up and validate line items
-            validated_items = []
-            for item in line_items:
-                if 'description' in item and len(item['description']) > 3:
-                    # Set defaults for missing fields
-                    item.setdefault('quantity', 1)
-                    item.setdefault('rate', item.get('amount', 0))
-                    item.setdefault('amount', item.get('rate', 0) * item.get('quantity', 1))
-                    
-                    # Validate amounts
-                    if item.get('amount', 0) > 0:
-                        validated_items.append(item)
-            
-            return validated_items[:15]  # Limit to first 15 items
+            self._add_line_item(table_items if columns else loose_items, current)
             
         except Exception as e:
             logger.error(f"Error extracting advanced line items: {e}")
-            return []
+        
+        # Rows of a recognised item table win over loose heuristics
+        return (table_items if seen_header else loose_items)[:MAX_LINE_ITEMS]
+    
+    @staticmethod
+    def _table_header(line: str) -> Optional[List[str]]:
+        """Column kinds of an item-table header row, left to right (None if the line is not a header)"""
+        kinds = [m.lastgroup for m in _TABLE_HEADER_RE.finditer(line)]
+        distinct = set(kinds)
+        if len(distinct) < 3 or not distinct & {'quantity', 'rate', 'hsn_code'} or not distinct & {'amount', 'rate'}:
+            return None
+        columns: List[str] = []
+        for kind in kinds:
+            if kind != 'description' and kind not in columns:
+                columns.append(kind)
+        return columns
+    
+    @staticmethod
+    def _split_row(line: str) -> Tuple[str, List[str]]:
+        """Split a table row into its leading text and the run of numeric tokens that ends it"""
+        tokens = line.split()
+        k = len(tokens)
+        while k > 0 and _NUMBER_TOKEN_RE.fullmatch(tokens[k - 1]):
+            k -= 1
+        return ' '.join(tokens[:k]), tokens[k:]
+    
+    def _fill_columns(self, item: Dict[str, Any], numbers: List[str], columns: List[str]) -> List[str]:
+        """Assign a row's numbers to the header columns, right-aligned (the amount column is last); returns unused numbers"""
+        n = min(len(numbers), len(columns))
+        for kind, token in zip(columns[len(columns) - n:], numbers[len(numbers) - n:]):
+            if kind in ('rate', 'amount'):
+                item[kind] = self._parse_amount(token)
+            elif kind == 'quantity':
+                try:
+                    item['quantity'] = float(token.replace(',', ''))
+                except ValueError:
+                    pass
+            elif kind in ('hsn_code', 'discount'):
+                item[kind] = token
+        return numbers[:len(numbers) - n]
+    
+    def _apply_line_tokens(self, item: Dict[str, Any], line: str, patterns: Dict[str, Any]) -> None:
+        """Fill an item from one tokenizer scan of a line (first HSN code wins, later quantity/rate/discount win)"""
+        if patterns['line_tokens'] is None:
+            return
+        groups = patterns['token_groups']
+        for m in patterns['line_tokens'].finditer(line):
+            name = m.lastgroup
+            value = m.group(groups[name])
+            if name == 'hsn_code':
+                item.setdefault('hsn_code', value)
+            elif name == 'quantity':
+                item['quantity'] = float(value)
+            elif name == 'rate':
+                item['rate'] = self._parse_amount(value)
+            elif name == 'discount':
+                item['discount'] = value
+    
+    @staticmethod
+    def _add_line_item(line_items: List[Dict[str, Any]], item: Optional[Dict[str, Any]]) -> bool:
+        """Validate an item, fill its defaults and keep it; True once MAX_LINE_ITEMS are collected"""
+        if item and len(item.get('description', '')) > 3:
+            # Set defaults for missing fields
+            item.setdefault('quantity', 1)
+            item.setdefault('rate', item.get('amount', 0))
+            item.setdefault('amount', (item.get('rate') or 0) * item.get('quantity', 1))
+            
+            # Validate amounts
+            if (item.get('amount') or 0) > 0:
+                line_items.append(item)
+        return len(line_items) >= MAX_LINE_ITEMS
+    
+    def _rows_from_words(self, words: List[Dict[str, Any]]) -> List[str]:
+        """Rebuild visual rows from word boxes: words whose vertical centres line up form one row, read left to right.
+
+        Tesseract often splits a table into column blocks; grouping by position puts each row back together.
+        """
+        ordered = sorted(
+            (w for w in words if w.get('text')),
+            key=lambda w: (w.get('page', 1), w['top'] + w['height'] / 2.0)
+        )
+        rows: List[List[Dict[str, Any]]] = []
+        page = centre = half_height = None
+        for w in ordered:
+            mid = w['top'] + w['height'] / 2.0
+            if rows and w.get('page', 1) == page and abs(mid - centre) <= half_height:
+                rows[-1].append(w)
+            else:
+                rows.append([w])
+                page, centre, half_height = w.get('page', 1), mid, max(w['height'], 2) / 2.0
+        return [' '.join(w['text'] for w in sorted(row, key=lambda w: w['left'])) for row in rows]
     
     def _calculate_extraction_summary(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate summary of extraction results"""
         summary = {
-            'fields_extracted': len([k for k, v in data.items() if v and k != 'extraction_summary']),
+            'fields_extracted': len([k for k, v in data.items() if v and k not in _META_KEYS]),
             'has_vendor_info': bool(data.get('vendor_name') or data.get('phone') or data.get('email')),
             'has_amounts': bool(data.get('total_amount') or data.get('subtotal')),
             'has_tax_info': bool(data.get('gstin') or data.get('igst_amount') or data.get('cgst_amount')),
             'has_line_items': bool(data.get('line_items')),
             'line_items_count': len(data.get('line_items', [])),
-            'confidence_level': 'high' if len([k for k, v in data.items() if v]) > 8 else 'medium' if len([k for k, v in data.items() if v]) > 4 else 'low'
+            'confidence_level': 'high' if len([k for k, v in data.items() if v and k not in _META_KEYS]) > 8 else 'medium' if len([k for k, v in data.items() if v and k not in _META_KEYS]) > 4 else 'low'
         }
         return summary
     
@@ -525,7 +1867,7 @@ class AdvancedOCRService:
                 validation['is_valid_invoice'] = False
         
         # Validate GST format
-        if data.get('gstin') and not re.match(self.gst_pattern, data['gstin']):
+        if data.get('gstin') and not self._extraction_patterns()['gstin'].match(data['gstin']):
             validation['errors'].append("Invalid GST format")
         
         # Validate amount consistency
@@ -559,7 +1901,7 @@ class AdvancedOCRService:
             return validation_result
         
         # Check format
-        if not re.match(self.gst_pattern, gstin):
+        if not self._extraction_patterns()['gstin'].match(gstin):
             return validation_result
         
         try:
@@ -606,65 +1948,200 @@ class AdvancedOCRService:
         }
         return entity_types.get(code, 'Unknown')
     
-    async def process_invoice_advanced(self, file_path: str) -> Dict[str, Any]:
-        """Complete advanced invoice processing pipeline"""
+    def extractor_version(self) -> str:
+        """Stamp identifying the extraction logic and this instance's patterns"""
+        parts = [EXTRACTOR_VERSION, self.gst_pattern, self.pan_pattern, json.dumps(self.invoice_patterns, sort_keys=True),
+                 json.dumps(self.line_item_patterns, sort_keys=True)]
+        return f"{EXTRACTOR_VERSION}-{OCRResultCache.digest('|'.join(parts).encode('utf-8'))[:8]}"
+
+    def config_version(self) -> str:
+        """Fingerprint of every setting that changes OCR output; part of the result cache key"""
+        parts = [
+            OCR_PIPELINE_VERSION, self.ocr_backend, self.ocr_mode, ','.join(self.cascade_order),
+            str(self.cascade_min_confidence), str(self.cascade_min_words), str(self.adaptive_variants), str(self.text_regions),
+            str(self.deskew_pages), str(self.deskew_min_angle),
+            str(self.target_text_height), str(self.max_pixels_per_page), str(self.pdf_dpi),
+            str(self.pdf_max_pages), str(self.pdf_text_layer), str(self.pdf_text_min_chars),
+            str(self.pdf_image_max_coverage), str(self.pdf_text_min_coverage),
+            TESSERACT_CHAR_WHITELIST, str(easyocr is not None and settings.ocr_enable_easyocr),
+            # Cached results include the extracted fields
+            self.extractor_version()
+        ]
+        return OCRResultCache.digest('|'.join(parts).encode('utf-8'))[:16]
+
+    def _content_digest(self, source: OCRSource) -> str:
+        """SHA-256 of the source file contents (or of the array pixels)"""
+        if isinstance(source, str):
+            return OCRResultCache.digest_file(source)
+        if isinstance(source, np.ndarray):
+            return OCRResultCache.digest(str(source.shape).encode() + np.ascontiguousarray(source).tobytes())
+        return OCRResultCache.digest(bytes(source))
+
+    def _cache_key(self, source: OCRSource, content_digest: Optional[str] = None) -> Optional[str]:
+        if get_ocr_cache() is None:
+            return None
         try:
-            # Extract text using multiple engines
-            ocr_results = self.extract_text_multi_engine(file_path)
-            
-            # Extract structured data using advanced patterns
-            invoice_data = self.extract_invoice_data_advanced(ocr_results['best_text'])
-            
-            # Validate GST if present
-            gst_details = None
-            if invoice_data.get('gstin'):
-                gst_details = self.validate_gst_number(invoice_data['gstin'])
-            
-            # Calculate confidence score based on multiple factors
-            overall_confidence = self._calculate_overall_confidence(ocr_results, invoice_data)
-            # Guarantee a small floor to avoid 0% UI if any text is present
-            if overall_confidence == 0 and (ocr_results.get('best_text') or '').strip():
-                overall_confidence = max(0.15, ocr_results.get('best_confidence', 0.1))
-            
-            # Generate processing report
-            processing_report = self._generate_processing_report(ocr_results, invoice_data)
-            
-            result = {
-                'ocr_results': {
-                    'text': ocr_results['best_text'],
-                    'confidence': ocr_results['best_confidence'],
-                    'engine_used': ocr_results['best_engine'],
-                    'engines_tried': ocr_results['total_engines'],
-                    'all_results': ocr_results['all_results']
-                },
-                'invoice_data': invoice_data,
-                'gst_details': gst_details,
-                'overall_confidence': overall_confidence,
-                'processing_report': processing_report,
-                'processing_status': 'success',
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            return result
-            
+            return OCRResultCache.make_key(content_digest or self._content_digest(source), self.config_version())
         except Exception as e:
-            logger.error(f"Error in advanced invoice processing: {e}")
-            return {
-                'ocr_results': {
-                    'text': '',
-                    'confidence': 0.0,
-                    'engine_used': 'none',
-                    'engines_tried': 0,
-                    'all_results': []
-                },
-                'invoice_data': {},
-                'gst_details': None,
-                'overall_confidence': 0.1,
-                'processing_report': {'errors': [str(e)]},
-                'processing_status': 'failed',
-                'timestamp': datetime.now().isoformat(),
-                'error': str(e)
-            }
+            logger.warning(f"Could not compute OCR cache key: {e}")
+            return None
+
+    def cached_result(self, source: OCRSource, content_digest: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return a stored process_invoice result for identical content, without running OCR"""
+        key = self._cache_key(source, content_digest)
+        if key is None:
+            return None
+        result = get_ocr_cache().get(key)
+        if result is not None:
+            result['cache_hit'] = True
+        return result
+
+    async def process_invoice_advanced(self, source: OCRSource, content_digest: Optional[str] = None) -> Dict[str, Any]:
+        """Coroutine form of process_invoice for async callers; the OCR runs in a worker thread, off the event loop"""
+        return await asyncio.to_thread(self.process_invoice, source, content_digest)
+
+    def process_invoice(self, source: OCRSource, content_digest: Optional[str] = None,
+                        plan: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Complete advanced invoice processing pipeline (path, file bytes or image array).
+
+        Results are cached by SHA-256 of the content plus the OCR config version, so
+        re-uploads of the same file skip OCR; pass `content_digest` if it is already known,
+        and `plan` if the PDF's pages were already planned with `plan_pdf_pages`.
+        Synchronous, so Celery tasks and executor threads call it without an event loop.
+        Stage timings and counters for this run are in processing_report['timings'].
+        """
+        with ocr_metrics.track_job('invoice') as timings:
+            with ocr_metrics.stage('cache_lookup'):
+                cache_key = self._cache_key(source, content_digest)
+                cached = get_ocr_cache().get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                logger.info("OCR cache hit; skipping OCR")
+                ocr_metrics.count('cache_hits')
+                cached['cache_hit'] = True
+                # Report this run's timings, not those of the run that filled the cache
+                return self._attach_timings(cached, timings)
+
+            try:
+                # Extract text using multiple engines
+                ocr_results = self.extract_text_multi_engine(source, plan)
+                result = self.build_invoice_result(ocr_results)
+                if cache_key is not None and self._cacheable(result):
+                    with ocr_metrics.stage('cache_store'):
+                        get_ocr_cache().set(cache_key, result)
+                return self._attach_timings(result, timings)
+                
+            except Exception as e:
+                logger.error(f"Error in advanced invoice processing: {e}")
+                return self._attach_timings(self._failed_result(e), timings)
+
+    def finish_pdf_pages(self, source: Union[str, bytes], page_results: List[Dict[str, Any]],
+                         content_digest: Optional[str] = None, plan: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Merge separately OCR'd PDF pages and run extraction; the result matches process_invoice.
+
+        Used when pages were OCR'd by separate workers. `page_results` only needs the rasterized
+        pages: text-layer pages come from `plan` (the `plan_pdf_pages` result the split was made
+        from), or from the PDF again without one. Each page's own timings are added to the
+        document's, so the report covers the whole document. Pages whose OCR raised are listed
+        in processing_report['failed_pages'], and such a partial result is not cached.
+        """
+        with ocr_metrics.track_job('pdf_merge') as timings:
+            try:
+                page_results = [dict(p) for p in page_results]
+                for page in page_results:
+                    timings.merge(page.pop('page_timings', None))
+                failed_pages = [{'page': p.get('page'), 'error': p['error']} for p in page_results if p.get('error')]
+                with ocr_metrics.stage('merge_pages'):
+                    if plan is None:
+                        plan = self.plan_pdf_pages(source)
+                    ocr_results = self._merge_page_results(list(plan['text_pages']) + page_results)
+                result = self.build_invoice_result(ocr_results)
+                if failed_pages:
+                    result['processing_report']['failed_pages'] = failed_pages
+                cacheable = self._cacheable(result) and not failed_pages
+                cache_key = self._cache_key(source, content_digest) if cacheable else None
+                if cache_key is not None:
+                    with ocr_metrics.stage('cache_store'):
+                        get_ocr_cache().set(cache_key, result)
+                return self._attach_timings(result, timings)
+            except Exception as e:
+                logger.error(f"Error merging PDF pages: {e}")
+                return self._attach_timings(self._failed_result(e), timings)
+
+    @staticmethod
+    def _cacheable(result: Dict[str, Any]) -> bool:
+        """Only real OCR output is cached; an empty or fallback result may be a transient failure (e.g. no Tesseract)"""
+        ocr = result.get('ocr_results') or {}
+        return ocr.get('engine_used') not in UNCACHEABLE_ENGINES and bool((ocr.get('text') or '').strip())
+
+    @staticmethod
+    def _attach_timings(result: Dict[str, Any], timings: 'ocr_metrics.StageTimings') -> Dict[str, Any]:
+        """Put the job's stage timings and counters into the result's processing report"""
+        if result.get('processing_status') != 'success':
+            timings.status = 'failed'
+        result.setdefault('processing_report', {})['timings'] = timings.as_dict()
+        return result
+
+    def build_invoice_result(self, ocr_results: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract, validate and score invoice data from OCR results, returning the full pipeline result"""
+        # Extract structured data using advanced patterns
+        with ocr_metrics.stage('extraction'):
+            invoice_data = self.extract_invoice_data_advanced(ocr_results['best_text'], ocr_results.get('best_words'))
+        
+        # Validate GST if present
+        gst_details = None
+        if invoice_data.get('gstin'):
+            with ocr_metrics.stage('gst_validation'):
+                gst_details = self.validate_gst_number(invoice_data['gstin'])
+        
+        # Calculate confidence score based on multiple factors
+        overall_confidence = self._calculate_overall_confidence(ocr_results, invoice_data)
+        # Guarantee a small floor to avoid 0% UI if any text is present
+        if overall_confidence == 0 and (ocr_results.get('best_text') or '').strip():
+            overall_confidence = max(0.15, ocr_results.get('best_confidence', 0.1))
+        
+        # Generate processing report
+        processing_report = self._generate_processing_report(ocr_results, invoice_data)
+        
+        return {
+            'ocr_results': {
+                'text': ocr_results['best_text'],
+                'confidence': ocr_results['best_confidence'],
+                'engine_used': ocr_results['best_engine'],
+                'engines_tried': ocr_results['total_engines'],
+                'all_results': ocr_results['all_results'],
+                'words': ocr_results.get('best_words', []),
+                'page_count': ocr_results.get('page_count', 1),
+                'pages': ocr_results.get('pages', [])
+            },
+            'invoice_data': invoice_data,
+            'gst_details': gst_details,
+            'overall_confidence': overall_confidence,
+            'processing_report': processing_report,
+            'processing_status': 'success',
+            'extractor_version': self.extractor_version(),
+            'timestamp': datetime.now().isoformat(),
+            'cache_hit': False
+        }
+
+    def _failed_result(self, error: Exception) -> Dict[str, Any]:
+        """Pipeline result for a document that could not be processed"""
+        return {
+            'ocr_results': {
+                'text': '',
+                'confidence': 0.0,
+                'engine_used': 'none',
+                'engines_tried': 0,
+                'all_results': [],
+                'words': []
+            },
+            'invoice_data': {},
+            'gst_details': None,
+            'overall_confidence': 0.1,
+            'processing_report': {'errors': [str(error)]},
+            'processing_status': 'failed',
+            'timestamp': datetime.now().isoformat(),
+            'error': str(error)
+        }
     
     def _calculate_overall_confidence(self, ocr_results: Dict, invoice_data: Dict) -> float:
         """Calculate overall confidence score"""
@@ -672,7 +2149,7 @@ class AdvancedOCRService:
         
         # Data completeness factor
         total_fields = len(self.invoice_patterns)
-        extracted_fields = len([k for k, v in invoice_data.items() if v and k not in ['extraction_summary', 'validation_results']])
+        extracted_fields = len([k for k, v in invoice_data.items() if v and k not in _META_KEYS])
         completeness_score = extracted_fields / total_fields
         
         # Validation factor
@@ -698,8 +2175,16 @@ class AdvancedOCRService:
             'ocr_summary': {
                 'engines_used': ocr_results.get('total_engines', 0),
                 'best_engine': ocr_results.get('best_engine', 'unknown'),
+                'backend': ocr_results.get('ocr_backend', 'pytesseract'),
                 'text_length': len(ocr_results.get('best_text', '')),
-                'confidence': ocr_results.get('best_confidence', 0)
+                'confidence': ocr_results.get('best_confidence', 0),
+                'mode': ocr_results.get('ocr_mode', 'all'),
+                'cascade_stage': ocr_results.get('cascade_stage'),
+                'stages_run': ocr_results.get('stages_run', []),
+                'image_quality': ocr_results.get('image_quality'),
+                'resolution': ocr_results.get('resolution'),
+                'text_regions': len(ocr_results['text_regions']) if ocr_results.get('text_regions') else None,
+                'deskew_angle': ocr_results.get('deskew_angle')
             },
             'extraction_summary': invoice_data.get('extraction_summary', {}),
             'validation_summary': invoice_data.get('validation_results', {}),
@@ -0,0 +1,221 @@
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple, Callable
+
+from sqlalchemy import update, bindparam
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import SessionLocal
+from ..models import Invoice, InvoiceStatus
+from .ocr_service import AdvancedOCRService, get_ocr_executor
+from .ocr_artifacts import load_ocr_outputs
+
+logger = logging.getLogger(__name__)
+
+# Invoice columns derived from extracted data (the same ones process_invoice_ocr fills)
+EXTRACTED_COLUMNS = ('invoice_number', 'total_amount', 'invoice_date')
+
+_service: Optional[AdvancedOCRService] = None
+
+
+def _extraction_service() -> AdvancedOCRService:
+    """One service per worker process; extraction keeps no per-call state"""
+    global _service
+    if _service is None:
+        _service = AdvancedOCRService()
+    return _service
+
+
+def extractor_version() -> str:
+    """Current extractor version stamp (see AdvancedOCRService.extractor_version)"""
+    return _extraction_service().extractor_version()
+
+
+def _reextract_one(payload: Tuple[int, str, Optional[List[Dict[str, Any]]], float]) -> Dict[str, Any]:
+    """Run field extraction and validation over one invoice's stored OCR text (module-level for the process pool)"""
+    invoice_id, text, words, ocr_confidence = payload
+    service = _extraction_service()
+    try:
+        invoice_data = service.extract_invoice_data_advanced(text, words)
+        gst_details = service.validate_gst_number(invoice_data['gstin']) if invoice_data.get('gstin') else None
+        overall_confidence = service._calculate_overall_confidence({'best_confidence': ocr_confidence}, invoice_data)
+        return {
+            'id': invoice_id,
+            'invoice_data': invoice_data,
+            'gst_details': gst_details,
+            'overall_confidence': overall_confidence
+        }
+    except Exception as e:
+        return {'id': invoice_id, 'error': str(e)}
+
+
+def _column_values(invoice_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Invoice column values for extracted data, converted the way process_invoice_ocr stores them"""
+    invoice_date = None
+    if invoice_data.get('date'):
+        try:
+            invoice_date = datetime.fromisoformat(invoice_data['date'])
+        except Exception:
+            invoice_date = None
+    return {
+        'invoice_number': invoice_data.get('invoice_number', ''),
+        'total_amount': invoice_data.get('total_amount', 0.0),
+        'invoice_date': invoice_date
+    }
+
+
+def _stored_ocr(extra_data: Dict[str, Any], artifact: Optional[Dict[str, Any]] = None) -> Tuple[Optional[List[Dict[str, Any]]], float]:
+    """Word boxes and OCR confidence kept from the original OCR run, if any.
+
+    Word boxes live in the OCR artifact; rows written before artifacts existed keep them in extra_data.
+    """
+    stored = (extra_data.get('ocr_results') or {}).get('ocr_results') or {}
+    words = (artifact or {}).get('words') or stored.get('words') or None
+    return words, stored.get('confidence', 0.0) or 0.0
+
+
+def _updated_extra_data(extra_data: Dict[str, Any], result: Dict[str, Any], version: str) -> Dict[str, Any]:
+    """Copy of extra_data with the new extraction merged in and the extractor version stamped"""
+    invoice_data = result['invoice_data']
+    updated = dict(extra_data)
+    updated.update({
+        'extraction_summary': invoice_data.get('extraction_summary', {}),
+        'validation_results': invoice_data.get('validation_results', {}),
+        'extractor_version': version,
+        'reextracted_at': datetime.utcnow().isoformat()
+    })
+    if result.get('gst_details'):
+        updated['gst_details'] = result['gst_details']
+    else:
+        updated.pop('gst_details', None)
+    if isinstance(updated.get('ocr_results'), dict):
+        # Keep the stored full result consistent with the new extraction
+        ocr_result = dict(updated['ocr_results'])
+        ocr_result.update({
+            'invoice_data': invoice_data,
+            'gst_details': result.get('gst_details'),
+            'overall_confidence': result['overall_confidence']
+        })
+        updated['ocr_results'] = ocr_result
+        updated['confidence'] = result['overall_confidence']
+    return updated
+
+
+def _write_batch(db: Session, mappings: List[Dict[str, Any]]) -> int:
+    """Write re-extracted rows unless OCR rewrote them since they were read; returns the rows written.
+
+    Each mapping carries the `processed_at` that was read. A row whose processed_at changed (an OCR task
+    stored a new result meanwhile) or that is no longer PROCESSED is left alone, so the newer extra_data,
+    including its OCR artifact reference, is never overwritten.
+    """
+    table = Invoice.__table__
+    # executemany needs the same columns in every parameter set, so group by the changed columns
+    groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    for mapping in mappings:
+        columns = tuple(sorted(k for k in mapping if k not in ('id', 'processed_at')))
+        groups.setdefault(columns, []).append(mapping)
+
+    written = 0
+    for columns, group in groups.items():
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam('w_id'),
+                   table.c.status == InvoiceStatus.PROCESSED,
+                   table.c.processed_at.is_not_distinct_from(bindparam('w_processed_at')))
+            .values({column: bindparam(f'v_{column}') for column in columns})
+        )
+        params = [dict({f'v_{column}': m[column] for column in columns}, w_id=m['id'], w_processed_at=m['processed_at'])
+                  for m in group]
+        result = db.execute(statement, params)
+        written += result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(group)
+    db.commit()
+    return written
+
+
+def reextract_invoices(batch_size: Optional[int] = None, force: bool = False, user_id: Optional[int] = None,
+                       max_workers: Optional[int] = None,
+                       progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Re-run field extraction over stored Invoice.ocr_text without re-running OCR.
+
+    Only PROCESSED invoices are considered: others hold at most the preview text of their first page.
+    Rows are read in id order, batch_size at a time. Each batch is extracted in the OCR worker pool
+    (processes, or threads inside daemonic Celery workers), then only the changed columns plus the
+    stamped extra_data are written back. Rows already stamped with the current extractor version are
+    skipped unless `force` is set, so an interrupted or repeated run only does the remaining work.
+    """
+    batch_size = batch_size or settings.ocr_reextract_batch_size
+    version = extractor_version()
+    executor = get_ocr_executor(max_workers)
+    stats = {'extractor_version': version, 'scanned': 0, 'skipped': 0, 'updated': 0, 'unchanged_columns': 0, 'failed': 0,
+             'stale': 0}
+
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while True:
+            query = (
+                db.query(Invoice.id, Invoice.ocr_text, Invoice.extra_data, Invoice.invoice_number,
+                         Invoice.total_amount, Invoice.invoice_date, Invoice.processed_at)
+                .filter(Invoice.id > last_id, Invoice.status == InvoiceStatus.PROCESSED,
+                        Invoice.ocr_text.isnot(None), Invoice.ocr_text != '')
+            )
+            if user_id is not None:
+                query = query.filter(Invoice.user_id == user_id)
+            # Keyset pagination: each batch is its own short query, so writes never overlap an open cursor
+            rows = query.order_by(Invoice.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            stats['scanned'] += len(rows)
+
+            pending = {}
+            payloads = []
+            todo = []
+            for row in rows:
+                extra_data = row.extra_data if isinstance(row.extra_data, dict) else {}
+                if not force and extra_data.get('extractor_version') == version:
+                    stats['skipped'] += 1
+                    continue
+                todo.append((row, extra_data))
+            # One query per batch for the word boxes of rows that have an OCR artifact
+            artifacts = load_ocr_outputs(db, [row.id for row, extra_data in todo if extra_data.get('ocr_artifact_id')])
+            for row, extra_data in todo:
+                words, ocr_confidence = _stored_ocr(extra_data, artifacts.get(row.id))
+                pending[row.id] = (row, extra_data)
+                payloads.append((row.id, row.ocr_text, words, ocr_confidence))
+            if not payloads:
+                continue
+
+            chunksize = max(1, len(payloads) // (4 * (max_workers or settings.ocr_max_workers or 4)))
+            mappings = []
+            for result in executor.map(_reextract_one, payloads, chunksize=chunksize):
+                if 'error' in result:
+                    logger.warning(f"Re-extraction failed for invoice {result['id']}: {result['error']}")
+                    stats['failed'] += 1
+                    continue
+                row, extra_data = pending[result['id']]
+                mapping = {'id': row.id, 'processed_at': row.processed_at,
+                           'extra_data': _updated_extra_data(extra_data, result, version)}
+                # Only write the columns whose value actually changed
+                for column, value in _column_values(result['invoice_data']).items():
+                    if getattr(row, column) != value:
+                        mapping[column] = value
+                if len(mapping) == 3:
+                    stats['unchanged_columns'] += 1
+                mappings.append(mapping)
+
+            if mappings:
+                written = _write_batch(db, mappings)
+                stats['updated'] += written
+                stats['stale'] += len(mappings) - written
+            logger.info(f"Re-extraction progress: {stats}")
+            if progress is not None:
+                progress(dict(stats, last_id=last_id))
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    return stats
@@ -1,12 +1,22 @@
-from celery import Celery
+from celery import Celery, chord
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, before_task_publish, task_received
+from celery.worker.control import inspect_command
+from kombu import Queue
+from collections import deque
 from typing import Dict, Any, List
+import gc
 import logging
+import threading
+import time
 from .config import settings
 
 try:
-    from .services.ocr_service import AdvancedOCRService
+    from .services.ocr_service import AdvancedOCRService, warm_up_easyocr
     from .services.anomaly_service import AnomalyDetectionService
     from .services.forecast_service import ForecastingService
+    from .services.reextraction import reextract_invoices as run_reextraction
+    from .services.ocr_artifacts import save_ocr_artifact, ocr_extra_data
+    from .services import ocr_metrics
     from .db import SessionLocal
     from .models import Invoice, Transaction, Expense, User, InvoiceStatus
     from sqlalchemy.orm import Session
@@ -25,17 +35,246 @@ app = Celery(
     backend=settings.celery_result_backend,
 )
 
+# CPU-heavy OCR runs on its own queues so upload bursts cannot starve the analytics jobs,
+# and single uploads never wait behind bulk batches
+OCR_INTERACTIVE_QUEUE = 'ocr_interactive'
+OCR_BULK_QUEUE = 'ocr_bulk'
+ANALYTICS_QUEUE = 'analytics'
+DEFAULT_QUEUE = 'default'
+
 app.conf.update(
     task_serializer='json',
     accept_content=['json'],
     result_serializer='json',
     timezone='UTC',
     enable_utc=True,
+    task_queues=[Queue(OCR_INTERACTIVE_QUEUE), Queue(OCR_BULK_QUEUE), Queue(ANALYTICS_QUEUE), Queue(DEFAULT_QUEUE)],
+    task_default_queue=DEFAULT_QUEUE,
+    task_routes={
+        'app.tasks.process_invoice_ocr': {'queue': OCR_INTERACTIVE_QUEUE},
+        'app.tasks.ocr_invoice_page': {'queue': OCR_INTERACTIVE_QUEUE},
+        'app.tasks.merge_invoice_pages': {'queue': OCR_INTERACTIVE_QUEUE},
+        'app.tasks.reextract_invoices': {'queue': OCR_BULK_QUEUE},
+        'app.tasks.detect_anomalies': {'queue': ANALYTICS_QUEUE},
+        'app.tasks.generate_forecast': {'queue': ANALYTICS_QUEUE},
+    },
+    # A worker consuming several queues drains them in the order given to -Q
+    broker_transport_options={'queue_order_strategy': 'priority'},
 )
 
+# (concurrency, prefetch multiplier) per queue; a worker takes the profile of the first queue it consumes
+QUEUE_PROFILES = {
+    OCR_INTERACTIVE_QUEUE: (settings.celery_ocr_interactive_concurrency, settings.celery_ocr_interactive_prefetch),
+    OCR_BULK_QUEUE: (settings.celery_ocr_bulk_concurrency, settings.celery_ocr_bulk_prefetch),
+    ANALYTICS_QUEUE: (settings.celery_analytics_concurrency, settings.celery_analytics_prefetch),
+}
+
+# Broker wait per queue as seen by this worker; recorded in the consumer process when a task arrives
+QUEUE_WAIT_WINDOW = 1000
+_queue_waits: Dict[str, Dict[str, Any]] = {}
+_queue_waits_lock = threading.Lock()
+
+@before_task_publish.connect
+def stamp_enqueue_time(headers=None, **kwargs):
+    """Stamp each message with its publish time so workers can measure queue wait"""
+    if headers is not None:
+        headers.setdefault('enqueued_at', time.time())
+
+@task_received.connect
+def record_queue_wait(request=None, **kwargs):
+    """Record how long a task sat in the broker before this worker received it"""
+    enqueued_at = (request.request_dict or {}).get('enqueued_at')
+    if enqueued_at is None:
+        return
+    queue = (request.delivery_info or {}).get('routing_key') or DEFAULT_QUEUE
+    wait = max(0.0, time.time() - float(enqueued_at))
+    with _queue_waits_lock:
+        stats = _queue_waits.setdefault(queue, {'count': 0, 'total': 0.0, 'max': 0.0, 'recent': deque(maxlen=QUEUE_WAIT_WINDOW)})
+        stats['count'] += 1
+        stats['total'] += wait
+        stats['max'] = max(stats['max'], wait)
+        stats['recent'].append(wait)
+
+def queue_wait_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-queue wait summary in seconds: counts since start, p50/p95 over the most recent tasks"""
+    summary = {}
+    with _queue_waits_lock:
+        for queue, stats in _queue_waits.items():
+            recent = sorted(stats['recent'])
+            summary[queue] = {
+                'count': stats['count'],
+                'mean_seconds': round(stats['total'] / stats['count'], 3),
+                'max_seconds': round(stats['max'], 3),
+                'p50_seconds': round(recent[len(recent) // 2], 3),
+                'p95_seconds': round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 3)
+            }
+    return summary
+
+@inspect_command()
+def queue_wait(state):
+    """Per-queue broker wait times on this worker: celery -A app.tasks inspect queue_wait"""
+    return queue_wait_stats()
+
+@worker_init.connect
+def apply_queue_profile(sender=None, **kwargs):
+    """Size the pool and prefetch for the queue this worker consumes (-Q) before the pool starts"""
+    queues = sender.app.amqp.queues
+    consume_from = list(queues.consume_from or [])
+    # Without -Q the worker consumes every queue and keeps its own settings
+    if len(consume_from) == len(queues):
+        return
+    queue = next((name for name in consume_from if name in QUEUE_PROFILES), None)
+    if queue is None:
+        return
+    concurrency, prefetch = QUEUE_PROFILES[queue]
+    if concurrency:
+        sender.concurrency = concurrency
+    if prefetch:
+        sender.prefetch_multiplier = prefetch
+    logger.info(f"Worker profile '{queue}': concurrency={sender.concurrency}, prefetch={sender.prefetch_multiplier}")
+
+@worker_init.connect
+def preload_ocr_models(**kwargs):
+    """Load EasyOCR weights in the parent worker before the pool forks (OCR_EASYOCR_WARMUP=parent)"""
+    if not SERVICES_AVAILABLE or settings.ocr_easyocr_warmup != 'parent':
+        return
+    # Weights only: running inference here would start torch threads that do not survive fork
+    if warm_up_easyocr(run_inference=False):
+        # Keep the model objects out of GC passes so children do not dirty the shared pages
+        gc.freeze()
+        logger.info("EasyOCR models preloaded for copy-on-write sharing")
+
+@worker_process_init.connect
+def warm_up_ocr_models(**kwargs):
+    """Warm the per-process EasyOCR reader when a pool process starts"""
+    if not SERVICES_AVAILABLE or settings.ocr_easyocr_warmup not in ('child', 'parent'):
+        return
+    try:
+        warm_up_easyocr(run_inference=True)
+    except Exception as e:
+        logger.warning(f"EasyOCR warm-up failed: {e}")
+
+@worker_process_shutdown.connect
+def remove_ocr_metrics_snapshot(**kwargs):
+    """Pool processes exit via os._exit, skipping atexit, so withdraw their /metrics snapshot here"""
+    if SERVICES_AVAILABLE:
+        ocr_metrics.remove_snapshot()
+
+# Worker-lifetime service instances: built once per pool process instead of once per task
+_ocr_service = None
+_forecast_service = None
+
+def get_ocr_service() -> "AdvancedOCRService":
+    """This process's OCR service (created on first use in pools that skip worker_process_init)"""
+    global _ocr_service
+    if _ocr_service is None:
+        _ocr_service = AdvancedOCRService()
+    return _ocr_service
+
+def get_forecast_service() -> "ForecastingService":
+    """This process's forecasting service; it keeps no state between forecasts"""
+    global _forecast_service
+    if _forecast_service is None:
+        _forecast_service = ForecastingService()
+    return _forecast_service
+
+@worker_process_init.connect
+def init_worker_services(**kwargs):
+    """Create the shared service instances as each pool process starts, before its first task"""
+    if not SERVICES_AVAILABLE:
+        return
+    try:
+        get_ocr_service()
+        get_forecast_service()
+    except Exception as e:
+        logger.warning(f"Service initialization failed; retrying on first task: {e}")
+
+def _save_ocr_result(db: "Session", invoice: "Invoice", result: Dict[str, Any]) -> None:
+    """Copy a process_invoice result onto the invoice row and its OCR artifact (the caller commits)"""
+    from datetime import datetime as _dt
+    if result['processing_status'] == 'success':
+        invoice_data = result['invoice_data']
+        
+        # Update basic fields
+        invoice.total_amount = invoice_data.get('total_amount', 0.0)
+        invoice.invoice_number = invoice_data.get('invoice_number', '')
+        # Parse date if provided as string
+        inv_date = invoice_data.get('date', None)
+        if inv_date:
+            try:
+                invoice.invoice_date = _dt.fromisoformat(inv_date)
+            except Exception:
+                invoice.invoice_date = None
+        invoice.status = InvoiceStatus.PROCESSED
+        invoice.processed_at = _dt.utcnow()
+        # Mirror OCR fields
+        invoice.ocr_text = result.get('ocr_results', {}).get('text', '')
+        invoice.ocr_confidence = result.get('overall_confidence', result.get('ocr_results', {}).get('confidence', 0.0))
+        
+        # Full OCR output goes to its own compressed artifact; extra_data keeps a compact summary
+        invoice.extra_data = ocr_extra_data(result, save_ocr_artifact(db, invoice, result))
+        
+    else:
+        invoice.status = InvoiceStatus.FAILED
+        invoice.extra_data = {
+            'error': result.get('error', 'OCR processing failed'),
+            'processing_timestamp': result.get('timestamp', '')
+        }
+        invoice.processed_at = _dt.utcnow()
+
+def _mark_invoice_failed(invoice_id: int, error: str) -> None:
+    """Best-effort FAILED status for an invoice whose OCR task crashed"""
+    try:
+        db = SessionLocal()
+        try:
+            invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+            if invoice:
+                invoice.status = InvoiceStatus.FAILED
+                invoice.extra_data = {'error': error}
+                db.commit()
+        finally:
+            db.close()
+    except Exception as db_error:
+        logger.error(f"Failed to update invoice status: {db_error}")
+
+def _task_result(invoice_id: int, result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'status': 'success',
+        'invoice_id': invoice_id,
+        'ocr_result': result,
+        'overall_confidence': result.get('overall_confidence', 0.0),
+        'processing_engine': result.get('ocr_results', {}).get('engine_used', 'unknown'),
+        'timings': result.get('processing_report', {}).get('timings')
+    }
+
+def _fan_out_pages(invoice_id: int, file_path: str, plan: Dict[str, Any], content_digest: str = None,
+                   queue: str = OCR_INTERACTIVE_QUEUE) -> Dict[str, Any]:
+    """Queue one OCR task per scanned page with merge_invoice_pages as the chord callback"""
+    scanned_pages = plan['scanned_pages']
+    pages_total = len(scanned_pages)
+    header = [ocr_invoice_page.s(invoice_id, file_path, index, pages_total).set(queue=queue) for index in scanned_pages]
+    # The merge gets the plan, so the text layer is not scanned again
+    merge = chord(header)(merge_invoice_pages.s(invoice_id, file_path, content_digest, plan).set(queue=queue))
+    page_group = getattr(merge, 'parent', None)
+    return {
+        'status': 'split',
+        'invoice_id': invoice_id,
+        'step': 'ocr_pages',
+        'pages_total': pages_total,
+        'merge_task_id': merge.id,
+        'page_task_ids': [r.id for r in getattr(page_group, 'results', None) or []]
+    }
+
 @app.task(bind=True, name='app.tasks.process_invoice_ocr')
-def process_invoice_ocr(self, invoice_id: int, file_path: str) -> Dict[str, Any]:
-    """Process invoice OCR asynchronously with advanced OCR service"""
+def process_invoice_ocr(self, invoice_id: int, file_path: str, content_digest: str = None) -> Dict[str, Any]:
+    """Process invoice OCR asynchronously with advanced OCR service.
+
+    Scanned PDFs with at least OCR_FANOUT_MIN_PAGES pages needing OCR are split: each page is
+    OCR'd by its own ocr_invoice_page task and merge_invoice_pages extracts and saves the result,
+    so a long document finishes in about the time of its slowest page. Everything else is
+    processed here in one task. `content_digest` is the upload's SHA-256, when the caller has it,
+    so the OCR cache lookup does not hash the file again.
+    """
     if not SERVICES_AVAILABLE:
         return {
             'status': 'failed',
@@ -45,7 +284,7 @@ def process_invoice_ocr(self, invoice_id: int, file_path: str) -> Dict[str, Any]
     
     try:
         db = SessionLocal()
-        ocr_service = AdvancedOCRService()
+        ocr_service = get_ocr_service()
         
         # Update invoice status
         invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
@@ -58,86 +297,112 @@ def process_invoice_ocr(self, invoice_id: int, file_path: str) -> Dict[str, Any]
 
         invoice.status = InvoiceStatus.PROCESSING
         db.commit()
+
+        plan = None
+        # A cached document is answered below without planning or queueing any page work
+        if (settings.ocr_fanout_min_pages and ocr_service._is_pdf(file_path)
+                and ocr_service.cached_result(file_path, content_digest) is None):
+            self.update_state(state='PROGRESS', meta={'invoice_id': invoice_id, 'step': 'splitting'})
+            plan = ocr_service.plan_pdf_pages(file_path)
+            scanned_pages = plan['scanned_pages']
+            if len(scanned_pages) >= settings.ocr_fanout_min_pages:
+                # Pages stay on the queue the document came from, so bulk batches never take interactive workers
+                queue = (self.request.delivery_info or {}).get('routing_key') or OCR_INTERACTIVE_QUEUE
+                split = _fan_out_pages(invoice_id, file_path, plan, content_digest, queue)
+                self.update_state(state='PROGRESS', meta=split)
+                logger.info(f"Invoice {invoice_id}: OCR split into {len(scanned_pages)} page tasks")
+                return split
         
-        # Process with advanced OCR
-        import asyncio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            result = loop.run_until_complete(ocr_service.process_invoice_advanced(file_path))
-        finally:
-            loop.close()
+        self.update_state(state='PROGRESS', meta={'invoice_id': invoice_id, 'step': 'ocr'})
+        # Process with advanced OCR (reusing the page plan when the PDF was planned above)
+        result = ocr_service.process_invoice(file_path, content_digest, plan=plan)
         
         # Update invoice with extracted data
-        if result['processing_status'] == 'success':
-            invoice_data = result['invoice_data']
-            
-            # Update basic fields
-            invoice.total_amount = invoice_data.get('total_amount', 0.0)
-            invoice.invoice_number = invoice_data.get('invoice_number', '')
-            # Parse date if provided as string
-            inv_date = invoice_data.get('date', None)
-            if inv_date:
-                try:
-                    from datetime import datetime
-                    invoice.invoice_date = datetime.fromisoformat(inv_date)
-                except Exception:
-                    invoice.invoice_date = None
-            invoice.status = InvoiceStatus.PROCESSED
-            from datetime import datetime as _dt
-            invoice.processed_at = _dt.utcnow()
-            # Mirror OCR fields
-            invoice.ocr_text = result.get('ocr_results', {}).get('text', '')
-            invoice.ocr_confidence = result.get('overall_confidence', result.get('ocr_results', {}).get('confidence', 0.0))
-            
-            # Store complete OCR results in extra_data
-            invoice.extra_data = {
-                'ocr_results': result,
-                'confidence': result['overall_confidence'],
-                'processing_engine': result['ocr_results']['engine_used'],
-                'extraction_summary': invoice_data.get('extraction_summary', {}),
-                'validation_results': invoice_data.get('validation_results', {}),
-                'processing_timestamp': result['timestamp']
-            }
-            
-            # Store GST details if available
-            if result.get('gst_details'):
-                invoice.extra_data['gst_details'] = result['gst_details']
-            
-        else:
-            invoice.status = InvoiceStatus.FAILED
-            invoice.extra_data = {
-                'error': result.get('error', 'OCR processing failed'),
-                'processing_timestamp': result.get('timestamp', '')
-            }
-            from datetime import datetime as _dt
-            invoice.processed_at = _dt.utcnow()
-        
+        _save_ocr_result(db, invoice, result)
         db.commit()
         
-        return {
-            'status': 'success',
-            'invoice_id': invoice_id,
-            'ocr_result': result,
-            'overall_confidence': result.get('overall_confidence', 0.0),
-            'processing_engine': result.get('ocr_results', {}).get('engine_used', 'unknown')
-        }
+        return _task_result(invoice_id, result)
         
     except Exception as e:
         logger.error(f"OCR processing failed for invoice {invoice_id}: {e}")
         
         # Update invoice status to failed
-        try:
-            db = SessionLocal()
-            invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
-            if invoice:
-                invoice.status = InvoiceStatus.FAILED
-                invoice.extra_data = {'error': str(e)}
-                db.commit()
-        except Exception as db_error:
-            logger.error(f"Failed to update invoice status: {db_error}")
+        _mark_invoice_failed(invoice_id, str(e))
+        
+        return {
+            'status': 'failed',
+            'error': str(e),
+            'invoice_id': invoice_id
+        }
+    
+    finally:
+        if 'db' in locals():
+            try:
+                db.close()
+            except Exception:
+                pass
+
+@app.task(bind=True, name='app.tasks.ocr_invoice_page')
+def ocr_invoice_page(self, invoice_id: int, file_path: str, page_index: int, pages_total: int) -> Dict[str, Any]:
+    """OCR one rasterized page of a split PDF; a failed page yields an empty result so the merge still runs"""
+    self.update_state(state='PROGRESS', meta={
+        'invoice_id': invoice_id, 'step': 'ocr', 'page': page_index + 1, 'pages_total': pages_total
+    })
+    try:
+        return get_ocr_service().extract_text_pdf_page(file_path, page_index)
+    except Exception as e:
+        logger.error(f"OCR failed for invoice {invoice_id} page {page_index + 1}: {e}")
+        return {
+            'best_text': '',
+            'best_confidence': 0.0,
+            'best_engine': 'none',
+            'best_words': [],
+            'all_results': [],
+            'total_engines': 0,
+            'page': page_index + 1,
+            'source': 'image',
+            'error': str(e)
+        }
+
+@app.task(bind=True, name='app.tasks.merge_invoice_pages')
+def merge_invoice_pages(self, page_results: List[Dict[str, Any]], invoice_id: int, file_path: str,
+                        content_digest: str = None, plan: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Chord callback for split PDFs: merge the page results, extract invoice data and save it.
+
+    If every page task failed there is nothing to extract, so the invoice is marked FAILED.
+    """
+    failed_pages = [page for page in page_results if page.get('error')]
+    if page_results and len(failed_pages) == len(page_results):
+        error = f"OCR failed on all {len(page_results)} scanned pages: {failed_pages[0]['error']}"
+        logger.error(f"Invoice {invoice_id}: {error}")
+        _mark_invoice_failed(invoice_id, error)
+        return {
+            'status': 'failed',
+            'error': error,
+            'invoice_id': invoice_id
+        }
+
+    try:
+        db = SessionLocal()
+        invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+        if not invoice:
+            return {
+                'status': 'failed',
+                'error': 'Invoice not found',
+                'invoice_id': invoice_id
+            }
+
+        self.update_state(state='PROGRESS', meta={'invoice_id': invoice_id, 'step': 'extracting'})
+        result = get_ocr_service().finish_pdf_pages(file_path, page_results, content_digest, plan=plan)
+
+        _save_ocr_result(db, invoice, result)
+        db.commit()
+        
+        return _task_result(invoice_id, result)
         
+    except Exception as e:
+        logger.error(f"Merging OCR pages failed for invoice {invoice_id}: {e}")
+        _mark_invoice_failed(invoice_id, str(e))
         return {
             'status': 'failed',
             'error': str(e),
@@ -151,6 +416,48 @@ def process_invoice_ocr(self, invoice_id: int, file_path: str) -> Dict[str, Any]
             except Exception:
                 pass
 
+def invoice_ocr_progress(task_id: str) -> Dict[str, Any]:
+    """Progress of a process_invoice_ocr task, counting finished page tasks when the PDF was split.
+
+    Uploads use their job id as the task id, so this is what /upload/status reports while OCR runs.
+    """
+    result = app.AsyncResult(task_id)
+    info = result.info if isinstance(result.info, dict) else {}
+    # A finished task's full OCR output is on the invoice row, not in the progress
+    progress = {'state': result.state, **{key: value for key, value in info.items() if key != 'ocr_result'}}
+    if info.get('status') == 'split':
+        page_ids = info.get('page_task_ids') or []
+        progress['pages_done'] = sum(1 for page_id in page_ids if app.AsyncResult(page_id).ready())
+        merge = app.AsyncResult(info['merge_task_id'])
+        progress['merge_state'] = merge.state
+        if merge.ready() and isinstance(merge.result, dict):
+            progress['merge_status'] = merge.result.get('status')
+    return progress
+
+@app.task(bind=True, name='app.tasks.reextract_invoices')
+def reextract_invoices(self, batch_size: int = None, force: bool = False, user_id: int = None) -> Dict[str, Any]:
+    """Refresh extracted invoice fields from stored OCR text (no OCR); skips rows already at the current extractor version"""
+    if not SERVICES_AVAILABLE:
+        return {
+            'status': 'failed',
+            'error': 'OCR services not available'
+        }
+    
+    try:
+        stats = run_reextraction(
+            batch_size=batch_size,
+            force=force,
+            user_id=user_id,
+            progress=lambda p: self.update_state(state='PROGRESS', meta=p)
+        )
+        return {'status': 'completed', **stats}
+    except Exception as e:
+        logger.error(f"Invoice re-extraction failed: {e}")
+        return {
+            'status': 'failed',
+            'error': str(e)
+        }
+
 @app.task(bind=True, name='app.tasks.detect_anomalies')
 def detect_anomalies(self, user_id: int) -> Dict[str, Any]:
     """Detect anomalies in user's financial data"""
@@ -163,6 +470,7 @@ def detect_anomalies(self, user_id: int) -> Dict[str, Any]:
     
     try:
         db = SessionLocal()
+        # Fresh per task: the fitted models belong to this user's data and must not carry over to the next user
         anomaly_service = AnomalyDetectionService()
         
         self.update_state(state='PROGRESS', meta={'step': 'fetching_data'})
@@ -255,7 +563,7 @@ def generate_forecast(self, user_id: int, forecast_type: str = "revenue", horizo
     
     try:
         db = SessionLocal()
-        forecast_service = ForecastingService()
+        forecast_service = get_forecast_service()
         
         self.update_state(state='PROGRESS', meta={'step': 'fetching_data'})
         
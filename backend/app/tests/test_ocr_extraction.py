@@ -0,0 +1,134 @@
+"""Invoice field extraction: keyword-anchored search, field spans, OCR text fixes and amount parsing"""
+import pytest
+
+from app.services.ocr_service import TAX_FIELDS, AdvancedOCRService
+
+INVOICE_TEXT = (
+    "SHARMA TRADERS PVT LTD\n"
+    "12 MG Road, Pune City\n"
+    "GSTIN: 27ABCDE1234F1Z5\n"
+    "Invoice No: INV-2024-0042\n"
+    "Date: 15/03/2024\n"
+    "PO No: PO-7781\n"
+    "Email: accounts@sharmatraders.in\n"
+    "Sub Total: 8,250.00\n"
+    "CGST @ 9%: 742.50\n"
+    "SGST @ 9%: 742.50\n"
+    "Grand Total: Rs. 9,735.00\n"
+)
+RETAIL_TEXT = "KRISHNA ELECTRICALS\nBill # 5512 dt 02-01-24\nwww.krishnaelec.com\nlG5T 18% 90.00\nTOTL 590.00\n"
+NO_KEYWORDS_TEXT = "KRISHNA ELECTRICALS\nThank you for your business\n"
+
+AMOUNT_FIELDS = ('subtotal', 'tax_amount', 'total_amount') + tuple(f'{field}_amount' for field in TAX_FIELDS)
+
+
+@pytest.fixture(scope='module')
+def service():
+    return AdvancedOCRService()
+
+
+def _full_search(service, text):
+    """Every field pattern searched from the start of the text, with no keyword prefilter"""
+    cleaned = service._clean_text(text)
+    found = {}
+    for field, regex in service._extraction_patterns()['fields'].items():
+        m = regex.search(cleaned)
+        if not m:
+            continue
+        if field in TAX_FIELDS:
+            found[f'{field}_rate'] = m.group(1)
+            found[f'{field}_amount'] = service._parse_amount(m.group(2))
+        elif field in ('subtotal', 'tax_amount', 'total_amount'):
+            found[field] = service._parse_amount(m.group(1))
+        elif field in ('date', 'due_date'):
+            found[field] = service._parse_date(m.group(1))
+        else:
+            found[field] = m.group(1).strip()
+    return found
+
+
+def test_extracts_invoice_fields(service):
+    data = service.extract_invoice_data_advanced(INVOICE_TEXT)
+    assert data['invoice_number'] == 'INV-2024-0042'
+    assert data['purchase_order'] == 'PO-7781'
+    assert data['date'] == '2024-03-15'
+    assert data['email'] == 'accounts@sharmatraders.in'
+    assert data['gstin'] == '27ABCDE1234F1Z5'
+    assert data['subtotal'] == 8250.0
+    assert data['cgst_rate'] == '9%'
+    assert data['cgst_amount'] == 742.5
+    assert data['sgst_amount'] == 742.5
+
+
+@pytest.mark.parametrize('text', [INVOICE_TEXT, RETAIL_TEXT, NO_KEYWORDS_TEXT])
+def test_anchored_search_matches_full_search(service, text):
+    data = service.extract_invoice_data_advanced(text)
+    fields = {k: v for k, v in data.items() if k in service.invoice_patterns or k.endswith(('_rate', '_amount'))}
+    assert fields == _full_search(service, text)
+
+
+def test_fields_without_keywords_are_skipped(service):
+    patterns = service._extraction_patterns()
+    first = service._first_anchor_positions(service._clean_text(NO_KEYWORDS_TEXT), patterns)
+    assert first == {}
+    data = service.extract_invoice_data_advanced(NO_KEYWORDS_TEXT)
+    assert not set(patterns['anchors']) & set(data)
+
+
+def test_first_anchor_is_the_earliest_keyword(service):
+    cleaned = service._clean_text(RETAIL_TEXT)
+    first = service._first_anchor_positions(cleaned, service._extraction_patterns())
+    assert first['invoice_number'] == cleaned.index('Bill')
+    assert first['date'] == cleaned.index('dt ')
+    assert first['website'] == cleaned.index('www.')
+    assert 'email' not in first
+
+
+def test_custom_pattern_is_not_anchored():
+    service = AdvancedOCRService()
+    service.invoice_patterns['invoice_number'] = r'(?:ref)\s*:?\s*([A-Z0-9\-]+)'
+    assert 'invoice_number' not in service._extraction_patterns()['anchors']
+    data = service.extract_invoice_data_advanced("KRISHNA ELECTRICALS\nRef: KE-0091\n")
+    assert data['invoice_number'] == 'KE-0091'
+
+
+def test_field_spans_point_at_values(service):
+    data = service.extract_invoice_data_advanced(INVOICE_TEXT)
+    cleaned = service._clean_text(INVOICE_TEXT)
+    spans = data['field_spans']
+    assert set(spans) >= {'invoice_number', 'date', 'gstin', 'subtotal', 'cgst_rate', 'cgst_amount'}
+    for field, (start, end) in spans.items():
+        value = cleaned[start:end]
+        if field in AMOUNT_FIELDS:
+            assert service._parse_amount(value) == data[field]
+        elif field in ('date', 'due_date'):
+            assert service._parse_date(value) == data[field]
+        else:
+            assert value == data[field]
+
+
+@pytest.mark.parametrize('raw, cleaned', [
+    ('lG5T 18%', 'IGST 18%'),
+    ('lGST', 'IGST'),
+    ('CG5T SG5T G5T', 'CGST SGST GST'),
+    ('TOTL AMT', 'TOTAL AMOUNT'),
+    ('Rs 100  ₹ 200', '₹100 ₹200'),
+    ('Invoice\n\n No:\tINV-1', 'Invoice No: INV-1'),
+])
+def test_clean_text_fixes_ocr_misreads(service, raw, cleaned):
+    assert service._clean_text(raw) == cleaned
+
+
+@pytest.mark.parametrize('raw, amount', [
+    ('9,735.00', 9735.0),
+    ('Rs. 1,234.50', 1234.5),
+    ('₹ 742.50', 742.5),
+    ('rs 0.75', 0.75),
+    (742.5, 742.5),
+    (90, 90.0),
+    ('', None),
+    (None, None),
+    ('N/A', None),
+])
+def test_parse_amount(service, raw, amount):
+    assert service._parse_amount(raw) == amount
@@ -0,0 +1,96 @@
+"""Line-item parsing: header tables, loose text and rows rebuilt from OCR word boxes"""
+import pytest
+
+from app.services.ocr_service import AdvancedOCRService
+
+
+@pytest.fixture(scope='module')
+def service():
+    return AdvancedOCRService()
+
+
+def test_table_row_starting_with_summary_word_is_an_item(service):
+    text = (
+        "Description Qty Rate Amount\n"
+        "GST filing service 1 1,000.00 1,000.00\n"
+        "Tax audit support 2 500.00 1,000.00\n"
+        "Total station rental 3 100.00 300.00\n"
+        "Sub Total: 2,300.00\n"
+        "CGST @ 9%: 207.00\n"
+        "Grand Total: Rs. 2,714.00\n"
+    )
+    items = service._extract_line_items_advanced(text)
+    assert [item['description'] for item in items] == ['GST filing service', 'Tax audit support', 'Total station rental']
+    assert items[0]['amount'] == 1000.0
+
+
+@pytest.mark.parametrize('summary', [
+    'Sub Total: 1,000.00',
+    'CGST @ 9%: 90.00',
+    'SGST 9% 90.00',
+    'Round Off -0.20',
+    'Grand Total: Rs. 1,180.00',
+    'Balance Due 1,180.00',
+])
+def test_summary_label_ends_table(service, summary):
+    text = f"Description Qty Rate Amount\nWidget A 2 500.00 1,000.00\n{summary}\nWidget B 1 50.00 50.00\n"
+    items = service._extract_line_items_advanced(text)
+    assert [item['description'] for item in items] == ['Widget A']
+
+
+def test_header_table(service):
+    text = (
+        "SHARMA TRADERS PVT LTD\n"
+        "Invoice No: INV-2024-0042\n"
+        "Description HSN Qty Rate Amount\n"
+        "Steel bolts M8 7318 100 2.50 250.00\n"
+        "Copper wire 1.5mm 8544 3 1,200.00 3,600.00\n"
+        "Sub Total: 3,850.00\n"
+    )
+    items = service._extract_line_items_advanced(text)
+    assert [item['description'] for item in items] == ['Steel bolts M8', 'Copper wire 1.5mm']
+    assert items[1]['hsn_code'] == '8544'
+    assert (items[1]['quantity'], items[1]['rate'], items[1]['amount']) == (3.0, 1200.0, 3600.0)
+
+
+def test_loose_lines(service):
+    text = "Widget A\n8471 Qty: 2 Rate: 100.00\n200.00\nService charge 2 nos 500.00\nPhone: 9876543210\n"
+    items = service._extract_line_items_advanced(text)
+    assert items[0]['description'] == 'Widget A'
+    assert (items[0]['hsn_code'], items[0]['quantity'], items[0]['rate']) == ('8471', 2.0, 100.0)
+    assert items[1]['description'] == 'Service charge 2 nos'
+    assert items[1]['amount'] == 500.0
+    assert len(items) == 2
+
+
+def _word_boxes(rows):
+    """Descriptions in OCR block 1, numeric columns in block 2, as Tesseract reports a two-column table"""
+    words = []
+    for r, (description, *numbers) in enumerate(rows):
+        y = 100 + 30 * r
+        for k, text in enumerate(description.split()):
+            words.append({'text': text, 'left': 50 + 80 * k, 'top': y, 'width': 70, 'height': 20,
+                          'block': 1, 'par': 1, 'line': r + 1})
+        for x, text in zip((400, 500, 650), numbers):
+            if text:
+                words.append({'text': text, 'left': x, 'top': y + 2, 'width': 60, 'height': 18,
+                              'block': 2, 'par': 1, 'line': r + 1})
+    return words
+
+
+def test_word_box_rows(service):
+    words = _word_boxes([
+        ('Description', 'Qty', 'Rate', 'Amount'),
+        ('Widget A', '2', '100.00', '200.00'),
+        ('Gadget B', '1', '1,500.00', '1,500.00'),
+        ('Total', '', '', '1,700.00'),
+    ])
+    assert service._rows_from_words(words)[1] == 'Widget A 2 100.00 200.00'
+    # Block-ordered text splits each row across two lines, so only the word boxes recover the table
+    text = '\n'.join(' '.join(w['text'] for w in words if w['block'] == block) for block in (1, 2))
+    assert not service._extract_line_items_advanced(text)
+    items = service._extract_line_items_advanced(text, words)
+    assert items == [
+        {'description': 'Widget A', 'quantity': 2.0, 'rate': 100.0, 'amount': 200.0},
+        {'description': 'Gadget B', 'quantity': 1.0, 'rate': 1500.0, 'amount': 1500.0},
+    ]
@@ -0,0 +1,63 @@
+"""/metrics sums the OCR metrics snapshots of live processes only"""
+import json
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+from app.config import settings
+from app.services import ocr_metrics
+
+
+def _snapshot(jobs):
+    values = {name: {} for name in ocr_metrics.METRICS}
+    values['ocr_jobs_total']['success'] = jobs
+    return values
+
+
+def _write(directory, name, jobs):
+    with open(os.path.join(directory, name), 'w') as f:
+        json.dump(_snapshot(jobs), f)
+
+
+def _dead_pid():
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proc.wait()
+    return proc.pid
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'ocr_metrics_dir', str(tmp_path))
+    monkeypatch.setattr(ocr_metrics, 'REGISTRY', ocr_metrics.MetricsRegistry())
+    return str(tmp_path)
+
+
+def test_dead_process_snapshot_is_skipped_and_removed(metrics_dir):
+    host = socket.gethostname()
+    live = f"{host}-{os.getppid()}.json"
+    dead = f"{host}-{_dead_pid()}.json"
+    _write(metrics_dir, live, 3)
+    _write(metrics_dir, dead, 5)
+
+    assert ocr_metrics._collect()['ocr_jobs_total'] == {'success': 3}
+    assert sorted(os.listdir(metrics_dir)) == [live]
+
+
+def test_other_hosts_are_kept(metrics_dir):
+    _write(metrics_dir, f"other-container-{_dead_pid()}.json", 4)
+    assert ocr_metrics._collect()['ocr_jobs_total'] == {'success': 4}
+
+
+def test_exiting_process_removes_its_snapshot(metrics_dir):
+    with ocr_metrics.track_job('invoice'):
+        pass
+    own = ocr_metrics._snapshot_name()
+    assert os.listdir(metrics_dir) == [own]
+
+    ocr_metrics.remove_snapshot()
+    assert os.listdir(metrics_dir) == []
+    # Nothing to remove is not an error
+    ocr_metrics.remove_snapshot()
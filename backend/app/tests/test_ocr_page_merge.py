@@ -0,0 +1,88 @@
+"""Merging the page results of a split PDF when some or all page tasks failed"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+fitz = pytest.importorskip("fitz")
+
+from app import tasks
+from app.config import settings
+from app.db import Base
+from app.models import Invoice, InvoiceStatus, User
+from app.services import ocr_cache
+from app.services.ocr_cache import OCRResultCache
+from app.services.ocr_service import AdvancedOCRService
+
+
+def _failed_page(page, error='page not in document'):
+    """What ocr_invoice_page returns when OCR of a page raised"""
+    return {'best_text': '', 'best_confidence': 0.0, 'best_engine': 'none', 'best_words': [],
+            'all_results': [], 'total_engines': 0, 'page': page, 'source': 'image', 'error': error}
+
+
+def _scanned_page(page):
+    return {'best_text': 'Grand Total: 9,735.00', 'best_confidence': 0.8, 'best_engine': 'tesseract_adaptive',
+            'best_words': [], 'all_results': [], 'total_engines': 1, 'page': page, 'source': 'image'}
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "SHARMA TRADERS PVT LTD Invoice No: INV-2024-0042")
+    doc.new_page()
+    doc.new_page()
+    path = tmp_path / 'split.pdf'
+    doc.save(str(path))
+    return str(path)
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'merge.db'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(tasks, 'SessionLocal', factory)
+    db = factory()
+    db.add(User(id=1, email='owner@example.com', hashed_password='x'))
+    db.add(Invoice(id=1, user_id=1, total_amount=0.0, status=InvoiceStatus.PROCESSING))
+    db.commit()
+    db.close()
+    return factory
+
+
+def test_all_pages_failed_marks_invoice_failed(session_factory, pdf_path):
+    result = tasks.merge_invoice_pages.run([_failed_page(2), _failed_page(3)], 1, pdf_path)
+    assert result['status'] == 'failed'
+    assert 'all 2 scanned pages' in result['error']
+
+    db = session_factory()
+    invoice = db.get(Invoice, 1)
+    assert invoice.status == InvoiceStatus.FAILED
+    assert 'page not in document' in invoice.extra_data['error']
+    db.close()
+
+
+def test_failed_pages_are_reported_and_not_cached(tmp_path, monkeypatch, pdf_path):
+    monkeypatch.setattr(settings, 'ocr_cache_enabled', True)
+    monkeypatch.setattr(ocr_cache, '_cache', OCRResultCache(cache_dir=str(tmp_path / 'cache'), max_bytes=0))
+    service = AdvancedOCRService()
+
+    result = service.finish_pdf_pages(pdf_path, [_scanned_page(2), _failed_page(3, 'boom')])
+    assert result['processing_status'] == 'success'
+    assert result['processing_report']['failed_pages'] == [{'page': 3, 'error': 'boom'}]
+    assert 'INV-2024-0042' in result['ocr_results']['text']
+    assert service.cached_result(pdf_path) is None
+
+
+def test_merge_reuses_the_split_plan(monkeypatch, pdf_path):
+    service = AdvancedOCRService()
+    plan = service.plan_pdf_pages(pdf_path)
+    assert plan['scanned_pages'] == [1, 2]
+
+    def no_replanning(source):
+        raise AssertionError('the PDF was planned again')
+
+    monkeypatch.setattr(service, 'plan_pdf_pages', no_replanning)
+    result = service.finish_pdf_pages(pdf_path, [_scanned_page(2), _scanned_page(3)], plan=plan)
+    assert 'failed_pages' not in result['processing_report']
+    assert result['ocr_results']['page_count'] == 3
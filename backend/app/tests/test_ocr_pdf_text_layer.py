@@ -0,0 +1,94 @@
+"""Which PDF pages are read from the text layer and which are rasterized for OCR"""
+import cv2
+import numpy as np
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from app.services import ocr_service
+from app.services.ocr_service import AdvancedOCRService
+
+INVOICE_LINES = [
+    "SHARMA TRADERS PVT LTD",
+    "GSTIN: 27ABCDE1234F1Z5",
+    "Invoice No: INV-2024-0042",
+    "Date: 15/03/2024",
+    "Grand Total: 9,735.00",
+]
+FOOTER = "Scanned with CamScanner - page 1 of 1"
+
+
+def _scanned_png() -> bytes:
+    """A full page of 'scanned' invoice text, as pixels only"""
+    img = np.full((1169, 827), 255, dtype=np.uint8)
+    for i, line in enumerate(INVOICE_LINES):
+        cv2.putText(img, line, (60, 120 + 60 * i), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+    ok, png = cv2.imencode('.png', img)
+    assert ok
+    return png.tobytes()
+
+
+def _text_page(doc):
+    page = doc.new_page(width=595, height=842)
+    for i, line in enumerate(INVOICE_LINES):
+        page.insert_text((50, 80 + 20 * i), line, fontsize=11)
+    return page
+
+
+def _mixed_page(doc, searchable=False):
+    """Full-page scan plus a scanner-app footer; optionally an invisible OCR text layer over the scan"""
+    page = doc.new_page(width=595, height=842)
+    page.insert_image(page.rect, stream=_scanned_png())
+    page.insert_text((50, 830), FOOTER, fontsize=8)
+    if searchable:
+        for i, line in enumerate(INVOICE_LINES):
+            page.insert_text((42, 88 + 42 * i), line, fontsize=20, render_mode=3)
+    return page
+
+
+@pytest.fixture
+def service():
+    return AdvancedOCRService()
+
+
+def test_born_digital_page_uses_text_layer(service):
+    doc = fitz.open()
+    words = service._pdf_text_layer_words(_text_page(doc))
+    assert words is not None
+    assert "INV-2024-0042" in ocr_service._text_from_words(words)
+
+
+def test_scan_with_footer_is_rasterized(service):
+    doc = fitz.open()
+    assert service._pdf_text_layer_words(_mixed_page(doc)) is None
+
+
+def test_searchable_scan_uses_text_layer(service):
+    doc = fitz.open()
+    assert service._pdf_text_layer_words(_mixed_page(doc, searchable=True)) is not None
+
+
+def test_plan_sends_mixed_page_to_ocr(service):
+    doc = fitz.open()
+    _text_page(doc)
+    _mixed_page(doc)
+    plan = service.plan_pdf_pages(doc.tobytes())
+    assert plan['page_count'] == 2
+    assert [p['page'] for p in plan['text_pages']] == [1]
+    assert plan['scanned_pages'] == [1]
+
+
+def test_preview_ocrs_mixed_page(service, monkeypatch):
+    calls = []
+
+    def fake_ocr_variant(index, img, backend='pytesseract'):
+        calls.append(img.shape)
+        return {'text': 'Invoice No: INV-2024-0042', 'confidence': 0.8, 'word_count': 3}
+
+    monkeypatch.setattr(ocr_service, '_ocr_variant', fake_ocr_variant)
+    doc = fitz.open()
+    _mixed_page(doc)
+    preview = service.extract_preview_text(doc.tobytes())
+    assert calls
+    assert preview['best_engine'] == 'tesseract_preview'
+    assert FOOTER not in preview['best_text']
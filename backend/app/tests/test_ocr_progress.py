@@ -0,0 +1,51 @@
+"""OCR job progress as /upload/status reports it: task state, plus finished page tasks for split PDFs"""
+import pytest
+
+from app import tasks
+
+
+class FakeResult:
+    def __init__(self, state, info=None):
+        self.state = state
+        self.info = info
+        self.result = info
+
+    def ready(self):
+        return self.state in ('SUCCESS', 'FAILURE')
+
+
+@pytest.fixture
+def results(monkeypatch):
+    by_id = {}
+    monkeypatch.setattr(tasks.app, 'AsyncResult', lambda task_id: by_id.get(task_id, FakeResult('PENDING')))
+    return by_id
+
+
+def test_unsplit_job_reports_its_step(results):
+    results['ocr_1_a'] = FakeResult('PROGRESS', {'invoice_id': 1, 'step': 'ocr'})
+    assert tasks.invoice_ocr_progress('ocr_1_a') == {'state': 'PROGRESS', 'invoice_id': 1, 'step': 'ocr'}
+
+
+def test_unknown_job_is_pending(results):
+    assert tasks.invoice_ocr_progress('ocr_9_z') == {'state': 'PENDING'}
+
+
+def test_split_job_counts_finished_pages(results):
+    results['ocr_2_b'] = FakeResult('SUCCESS', {'status': 'split', 'invoice_id': 2, 'step': 'ocr_pages', 'pages_total': 3,
+                                                'merge_task_id': 'merge', 'page_task_ids': ['p1', 'p2', 'p3']})
+    results['p1'] = FakeResult('SUCCESS', {'best_text': 'page one'})
+    results['p2'] = FakeResult('SUCCESS', {'best_text': 'page two'})
+    results['p3'] = FakeResult('PROGRESS', {'page': 3})
+    results['merge'] = FakeResult('PENDING')
+
+    progress = tasks.invoice_ocr_progress('ocr_2_b')
+    assert progress['pages_total'] == 3
+    assert progress['pages_done'] == 2
+    assert progress['merge_state'] == 'PENDING'
+    assert 'merge_status' not in progress
+
+
+def test_finished_job_leaves_out_the_ocr_output(results):
+    results['ocr_3_c'] = FakeResult('SUCCESS', {'status': 'success', 'invoice_id': 3, 'ocr_result': {'ocr_results': {}}})
+    progress = tasks.invoice_ocr_progress('ocr_3_c')
+    assert progress == {'state': 'SUCCESS', 'status': 'success', 'invoice_id': 3}
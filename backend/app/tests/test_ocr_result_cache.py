@@ -0,0 +1,54 @@
+"""process_invoice caches real OCR output by content hash, but never empty or fallback results"""
+import pytest
+
+from app.config import settings
+from app.services import ocr_cache
+from app.services.ocr_cache import OCRResultCache
+from app.services.ocr_service import AdvancedOCRService
+
+INVOICE_TEXT = "SHARMA TRADERS PVT LTD\nInvoice No: INV-2024-0042\nDate: 15/03/2024\nGrand Total: 9,735.00\n"
+
+
+def _ocr_output(engine, text):
+    return {'best_text': text, 'best_confidence': 0.9 if text else 0.1, 'best_engine': engine,
+            'best_words': [], 'all_results': [], 'total_engines': 1}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'ocr_cache_enabled', True)
+    monkeypatch.setattr(ocr_cache, '_cache', OCRResultCache(cache_dir=str(tmp_path), max_bytes=0))
+    return ocr_cache._cache
+
+
+def _run_twice(monkeypatch, ocr_output):
+    service = AdvancedOCRService()
+    calls = []
+
+    def fake_extract(source, plan=None):
+        calls.append(source)
+        return dict(ocr_output)
+
+    monkeypatch.setattr(service, 'extract_text_multi_engine', fake_extract)
+    first = service.process_invoice(b'same file bytes')
+    second = service.process_invoice(b'same file bytes')
+    return first, second, calls
+
+
+def test_real_result_is_cached(cache, monkeypatch):
+    first, second, calls = _run_twice(monkeypatch, _ocr_output('tesseract_adaptive', INVOICE_TEXT))
+    assert first['cache_hit'] is False
+    assert second['cache_hit'] is True
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize('engine, text', [
+    ('none', ''),
+    ('tesseract_fallback', INVOICE_TEXT),
+    ('tesseract_adaptive', '   \n'),
+])
+def test_degraded_result_is_not_cached(cache, monkeypatch, engine, text):
+    first, second, calls = _run_twice(monkeypatch, _ocr_output(engine, text))
+    assert first['processing_status'] == 'success'
+    assert second['cache_hit'] is False
+    assert len(calls) == 2
@@ -0,0 +1,84 @@
+"""Re-extraction only refreshes processed invoices and never overwrites a newer OCR result"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.db import Base
+from app.models import Invoice, InvoiceStatus, User
+from app.services import reextraction
+
+INVOICE_TEXT = "SHARMA TRADERS PVT LTD\nInvoice No: INV-2024-0042\nDate: 15/03/2024\nGrand Total: 9,735.00\n"
+PREVIEW_TEXT = "KRISHNA ELECTRICALS\nInvoice No: PREVIEW-1\nTotal: 50.00\n"
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'reextract.db'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(reextraction, 'SessionLocal', factory)
+    # Threads, so the monkeypatched extraction below is what runs
+    monkeypatch.setattr(settings, 'ocr_pool_kind', 'thread')
+    db = factory()
+    db.add(User(id=1, email='owner@example.com', hashed_password='x'))
+    db.commit()
+    db.close()
+    return factory
+
+
+def _add_invoice(factory, status, text, processed_at=None):
+    db = factory()
+    invoice = Invoice(user_id=1, total_amount=0.0, status=status, ocr_text=text, processed_at=processed_at,
+                      extra_data={'ocr_artifact_id': 7, 'ocr_results': {'ocr_results': {'confidence': 0.9}}})
+    db.add(invoice)
+    db.commit()
+    invoice_id = invoice.id
+    db.close()
+    return invoice_id
+
+
+def test_only_processed_invoices_are_reextracted(session_factory):
+    processed = _add_invoice(session_factory, InvoiceStatus.PROCESSED, INVOICE_TEXT, datetime(2024, 3, 16))
+    uploaded = _add_invoice(session_factory, InvoiceStatus.UPLOADED, PREVIEW_TEXT)
+    failed = _add_invoice(session_factory, InvoiceStatus.FAILED, PREVIEW_TEXT)
+
+    stats = reextraction.reextract_invoices(max_workers=1)
+    assert stats['scanned'] == 1
+    assert stats['updated'] == 1
+
+    db = session_factory()
+    assert db.get(Invoice, processed).total_amount == 9735.0
+    assert db.get(Invoice, processed).extra_data['ocr_artifact_id'] == 7
+    for invoice_id in (uploaded, failed):
+        invoice = db.get(Invoice, invoice_id)
+        assert invoice.total_amount == 0.0
+        assert not invoice.invoice_number
+        assert 'extractor_version' not in invoice.extra_data
+    db.close()
+
+
+def test_newer_ocr_result_is_not_overwritten(session_factory, monkeypatch):
+    invoice_id = _add_invoice(session_factory, InvoiceStatus.PROCESSED, INVOICE_TEXT, datetime(2024, 3, 16))
+    newer = {'ocr_artifact_id': 8, 'extractor_version': 'written-by-ocr-task'}
+    original = reextraction._reextract_one
+
+    def ocr_task_finishes_meanwhile(payload):
+        db = session_factory()
+        invoice = db.get(Invoice, invoice_id)
+        invoice.extra_data = newer
+        invoice.processed_at = datetime(2024, 3, 17)
+        db.commit()
+        db.close()
+        return original(payload)
+
+    monkeypatch.setattr(reextraction, '_reextract_one', ocr_task_finishes_meanwhile)
+    stats = reextraction.reextract_invoices(max_workers=1, force=True)
+    assert stats['updated'] == 0
+    assert stats['stale'] == 1
+
+    db = session_factory()
+    assert db.get(Invoice, invoice_id).extra_data == newer
+    db.close()
@@ -0,0 +1 @@
+"""OCR benchmark: synthetic GST invoice corpus and regression harness (see ocr_benchmark.py)"""
@@ -0,0 +1,292 @@
+"""
+Deterministic synthetic corpus of Indian GST invoices for the OCR benchmark.
+
+Every document is generated from a seeded RNG, so the same seed always produces the same
+invoices, the same pixels and the same ground truth. Four kinds cover the OCR paths:
+
+    pdf        rendered PDF with a text layer (no OCR, text-layer extraction only)
+    scan       flatbed-style PNG scan: sensor noise, speckle, slight blur and tilt
+    photo      phone-style JPEG: noticeable skew, uneven lighting, compression artifacts
+    multipage  image-only PDF of 2-3 scanned pages, totals on the last page
+"""
+import os
+import json
+import random
+from datetime import date, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    import fitz  # type: ignore  # PyMuPDF for PDF layout and rendering
+except Exception:
+    fitz = None  # type: ignore
+
+# Bump whenever generated documents or ground truth change; baselines record it
+CORPUS_VERSION = '1'
+KINDS = ('pdf', 'scan', 'photo', 'multipage')
+DEFAULT_SEED = 1234
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 50
+LINE_HEIGHT = 16
+ITEMS_PER_PAGE = 28
+SCAN_DPI = 200
+PHOTO_DPI = 150
+
+STATE_CODES = ('27', '29', '07', '33', '09', '24', '19', '36')
+VENDOR_NAMES = (
+    'SHARMA TRADERS PVT LTD', 'KRISHNA ELECTRICALS', 'SAI BALAJI ENTERPRISES', 'GANESH HARDWARE STORES',
+    'MEHTA TEXTILES PVT LTD', 'ANAND OFFICE SUPPLIES', 'LAKSHMI AGRO INDUSTRIES', 'PATEL PACKAGING CO',
+)
+BUYER_NAMES = (
+    'KAPOOR RETAIL PVT LTD', 'RAO CONSTRUCTIONS', 'IYER AND SONS', 'SINGH LOGISTICS',
+    'DESAI PHARMA DISTRIBUTORS', 'NAIR CATERING SERVICES',
+)
+STREETS = ('MG Road', 'Station Road', 'Nehru Nagar', 'Gandhi Street', 'Industrial Area', 'Civil Lines Colony')
+CITIES = ('Mumbai', 'Pune', 'Bengaluru', 'New Delhi', 'Chennai', 'Ahmedabad', 'Kolkata', 'Hyderabad')
+ITEMS = (
+    ('Steel Rods 12mm', 380.0, 620.0), ('Copper Wire Coil', 900.0, 2400.0), ('LED Panel Light', 450.0, 1300.0),
+    ('A4 Copier Paper Ream', 210.0, 320.0), ('Cotton Fabric Roll', 1500.0, 4200.0), ('PVC Pipe 4 inch', 260.0, 540.0),
+    ('Corrugated Box Large', 18.0, 45.0), ('Office Chair', 2800.0, 7600.0), ('Cement Bag 50kg', 340.0, 420.0),
+    ('Printer Toner Cartridge', 1800.0, 3900.0), ('Hand Gloves Pair', 35.0, 90.0), ('Fertilizer Bag 25kg', 650.0, 1250.0),
+)
+GST_RATES = (5, 12, 18, 28)
+
+# Fields scored by the benchmark: amounts compare to the paisa, the rest as normalized strings
+AMOUNT_FIELDS = ('subtotal', 'cgst_amount', 'sgst_amount', 'igst_amount', 'total_amount')
+TEXT_FIELDS = ('invoice_number', 'date', 'gstin')
+
+
+def _money(value: float) -> str:
+    return f"{value:,.2f}"
+
+
+def _gstin(rng: random.Random, state_code: str) -> str:
+    letters = ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(5))
+    digits = ''.join(rng.choice('0123456789') for _ in range(4))
+    return f"{state_code}{letters}{digits}{rng.choice('ABCDEFGHJKLMNPQRSTUVWXYZ')}{rng.randint(1, 9)}Z{rng.randint(0, 9)}"
+
+
+def make_invoice(rng: random.Random, index: int, item_count: int) -> Dict[str, Any]:
+    """Invoice content plus the ground-truth fields the extractor should find"""
+    vendor_state = rng.choice(STATE_CODES)
+    # Roughly two thirds intra-state (CGST + SGST), the rest inter-state (IGST)
+    buyer_state = vendor_state if rng.random() < 0.66 else rng.choice([s for s in STATE_CODES if s != vendor_state])
+    invoice_date = date(2024, 4, 1) + timedelta(days=rng.randint(0, 364))
+    rate = rng.choice(GST_RATES)
+
+    items = []
+    for _ in range(item_count):
+        description, low, high = rng.choice(ITEMS)
+        quantity = rng.randint(1, 40)
+        unit_price = round(rng.uniform(low, high), 2)
+        items.append({'description': description, 'quantity': quantity, 'rate': unit_price,
+                      'amount': round(quantity * unit_price, 2)})
+    subtotal = round(sum(item['amount'] for item in items), 2)
+
+    fields: Dict[str, Any] = {
+        'invoice_number': f"INV{invoice_date.year % 100:02d}-{rng.randint(1000, 99999)}",
+        'date': invoice_date.isoformat(),
+        'gstin': _gstin(rng, vendor_state),
+        'subtotal': subtotal,
+    }
+    if buyer_state == vendor_state:
+        half = round(subtotal * rate / 200.0, 2)
+        fields.update({'cgst_amount': half, 'sgst_amount': half})
+        tax = 2 * half
+    else:
+        tax = round(subtotal * rate / 100.0, 2)
+        fields['igst_amount'] = tax
+    fields['total_amount'] = round(subtotal + tax, 2)
+
+    return {
+        'index': index,
+        'vendor_name': rng.choice(VENDOR_NAMES),
+        'vendor_address': f"{rng.randint(1, 250)} {rng.choice(STREETS)}, {rng.choice(CITIES)}",
+        'buyer_name': rng.choice(BUYER_NAMES),
+        'buyer_gstin': _gstin(rng, buyer_state),
+        'gst_rate': rate,
+        'invoice_date': invoice_date,
+        'items': items,
+        'fields': fields,
+    }
+
+
+def _header_lines(invoice: Dict[str, Any]) -> List[Tuple[str, bool]]:
+    fields = invoice['fields']
+    return [
+        (invoice['vendor_name'], True),
+        (invoice['vendor_address'], False),
+        (f"GSTIN: {fields['gstin']}", False),
+        ('', False),
+        ('TAX INVOICE', True),
+        (f"Invoice No: {fields['invoice_number']}", False),
+        (f"Date: {invoice['invoice_date'].strftime('%d/%m/%Y')}", False),
+        (f"Bill To: {invoice['buyer_name']}", False),
+        (f"Buyer GSTIN: {invoice['buyer_gstin']}", False),
+        ('', False),
+    ]
+
+
+def _total_lines(invoice: Dict[str, Any]) -> List[Tuple[str, bool]]:
+    fields = invoice['fields']
+    rate = invoice['gst_rate']
+    lines = [('', False), (f"Sub Total: {_money(fields['subtotal'])}", False)]
+    if 'igst_amount' in fields:
+        lines.append((f"IGST @ {rate}%: {_money(fields['igst_amount'])}", False))
+    else:
+        lines.append((f"CGST @ {rate / 2:g}%: {_money(fields['cgst_amount'])}", False))
+        lines.append((f"SGST @ {rate / 2:g}%: {_money(fields['sgst_amount'])}", False))
+    lines.append((f"Grand Total: Rs. {_money(fields['total_amount'])}", True))
+    return lines
+
+
+def _draw_item_table(page: Any, items: List[Dict[str, Any]], first_serial: int, y: float) -> float:
+    columns = ((MARGIN, 'S.No'), (MARGIN + 40, 'Description'), (MARGIN + 260, 'Qty'),
+               (MARGIN + 320, 'Rate'), (MARGIN + 410, 'Amount'))
+    for x, title in columns:
+        page.insert_text((x, y), title, fontname='hebo', fontsize=10)
+    y += LINE_HEIGHT
+    for serial, item in enumerate(items, start=first_serial):
+        values = (str(serial), item['description'], str(item['quantity']), _money(item['rate']), _money(item['amount']))
+        for (x, _title), value in zip(columns, values):
+            page.insert_text((x, y), value, fontname='helv', fontsize=10)
+        y += LINE_HEIGHT
+    return y
+
+
+def _draw_lines(page: Any, lines: List[Tuple[str, bool]], y: float) -> float:
+    for text, bold in lines:
+        if text:
+            page.insert_text((MARGIN, y), text, fontname='hebo' if bold else 'helv', fontsize=12 if bold else 10)
+        y += LINE_HEIGHT
+    return y
+
+
+def render_invoice_pdf(invoice: Dict[str, Any]) -> Any:
+    """Lay the invoice out on as many A4 pages as its items need (header on page 1, totals on the last)"""
+    if fitz is None:
+        raise RuntimeError("PyMuPDF is required to generate the benchmark corpus")
+    items = invoice['items']
+    chunks = [items[i:i + ITEMS_PER_PAGE] for i in range(0, len(items), ITEMS_PER_PAGE)] or [[]]
+    doc = fitz.open()
+    for page_no, chunk in enumerate(chunks):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        y = MARGIN + 10
+        if page_no == 0:
+            y = _draw_lines(page, _header_lines(invoice), y)
+        else:
+            y = _draw_lines(page, [(f"{invoice['vendor_name']} - Invoice No: {invoice['fields']['invoice_number']} (continued)", False), ('', False)], y)
+        y = _draw_item_table(page, chunk, page_no * ITEMS_PER_PAGE + 1, y)
+        if page_no == len(chunks) - 1:
+            _draw_lines(page, _total_lines(invoice), y)
+        page.insert_text((PAGE_WIDTH / 2 - 30, PAGE_HEIGHT - 30), f"Page {page_no + 1} of {len(chunks)}",
+                         fontname='helv', fontsize=8)
+    return doc
+
+
+def _rasterize(page: Any, dpi: int) -> np.ndarray:
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width).copy()
+
+
+def _rotate(gray: np.ndarray, degrees: float) -> np.ndarray:
+    h, w = gray.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), degrees, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR, borderValue=255)
+
+
+def degrade_scan(gray: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Flatbed scan: slight tilt, soft focus, sensor noise and dust speckle"""
+    out = _rotate(gray, float(rng.uniform(-1.0, 1.0)))
+    out = cv2.GaussianBlur(out, (3, 3), 0).astype(np.float32)
+    out += rng.normal(0.0, 10.0, out.shape)
+    speckle = rng.random(out.shape)
+    out[speckle < 0.0015] = 0
+    out[speckle > 0.9985] = 255
+    return np.clip(out, 0, 255).astype(np.uint8)
+
+
+def degrade_photo(gray: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Phone photo: visible skew, light falloff across the page and sensor noise"""
+    angle = float(rng.uniform(3.0, 7.0)) * (1 if rng.random() < 0.5 else -1)
+    out = _rotate(gray, angle).astype(np.float32)
+    h, w = out.shape
+    # Brightest in one corner, falling off linearly towards the opposite one
+    ys, xs = np.mgrid[0:h, 0:w].astype(np.float32)
+    gradient = 1.0 - float(rng.uniform(0.25, 0.4)) * (xs / w + ys / h) / 2.0
+    out = out * gradient + rng.normal(0.0, 6.0, out.shape)
+    return np.clip(out, 0, 255).astype(np.uint8)
+
+
+def _image_pdf(pages: List[np.ndarray], dpi: int) -> Any:
+    doc = fitz.open()
+    for gray in pages:
+        ok, png = cv2.imencode('.png', gray)
+        if not ok:
+            raise RuntimeError("Could not encode page image")
+        page = doc.new_page(width=gray.shape[1] * 72.0 / dpi, height=gray.shape[0] * 72.0 / dpi)
+        page.insert_image(page.rect, stream=png.tobytes())
+    return doc
+
+
+def _save_pdf(doc: Any, path: str) -> None:
+    # No dates or random IDs, so the same seed gives byte-identical files
+    doc.set_metadata({})
+    doc.save(path, garbage=4, deflate=True, no_new_id=True)
+    doc.close()
+
+
+def generate_corpus(out_dir: str, per_kind: int = 5, seed: int = DEFAULT_SEED,
+                    kinds: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+    """Write the corpus and a manifest.json with ground truth into out_dir; returns the manifest"""
+    if fitz is None:
+        raise RuntimeError("PyMuPDF is required to generate the benchmark corpus")
+    kinds = tuple(kinds or KINDS)
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        raise ValueError(f"Unknown corpus kinds: {', '.join(sorted(unknown))}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    documents = []
+    for kind_no, kind in enumerate(KINDS):
+        if kind not in kinds:
+            continue
+        for i in range(per_kind):
+            # Seeded per document, so subsets and larger corpora keep the same documents
+            doc_seed = seed * 1000 + kind_no * 100 + i
+            rng = random.Random(doc_seed)
+            noise = np.random.default_rng(doc_seed)
+            item_count = rng.randint(ITEMS_PER_PAGE + 5, 2 * ITEMS_PER_PAGE + 15) if kind == 'multipage' else rng.randint(3, 12)
+            invoice = make_invoice(rng, i, item_count)
+            doc = render_invoice_pdf(invoice)
+            pages = doc.page_count
+            name = f"{kind}-{i:03d}"
+
+            if kind == 'pdf':
+                filename = f"{name}.pdf"
+                _save_pdf(doc, os.path.join(out_dir, filename))
+            elif kind == 'scan':
+                filename = f"{name}.png"
+                cv2.imwrite(os.path.join(out_dir, filename), degrade_scan(_rasterize(doc[0], SCAN_DPI), noise))
+                doc.close()
+            elif kind == 'photo':
+                filename = f"{name}.jpg"
+                image = degrade_photo(_rasterize(doc[0], PHOTO_DPI), noise)
+                cv2.imwrite(os.path.join(out_dir, filename), image, [cv2.IMWRITE_JPEG_QUALITY, 70])
+                doc.close()
+            else:
+                filename = f"{name}.pdf"
+                scans = [degrade_scan(_rasterize(page, SCAN_DPI), noise) for page in doc]
+                doc.close()
+                _save_pdf(_image_pdf(scans, SCAN_DPI), os.path.join(out_dir, filename))
+
+            documents.append({'id': name, 'kind': kind, 'file': filename, 'pages': pages,
+                              'fields': invoice['fields']})
+
+    manifest = {'corpus_version': CORPUS_VERSION, 'seed': seed, 'per_kind': per_kind, 'documents': documents}
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
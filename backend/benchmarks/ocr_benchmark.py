@@ -0,0 +1,293 @@
+"""
+OCR benchmark and regression check over the synthetic GST invoice corpus.
+
+Runs AdvancedOCRService.process_invoice over every corpus document (result cache disabled) and
+reports throughput, latency percentiles, peak RSS, per-stage time and field-level extraction
+accuracy. The report is compared against a stored baseline; the run fails (exit code 1) when a
+metric regresses beyond the tolerance. Baselines are machine-specific: record one on the machine
+that runs the check.
+
+Usage (from the backend directory):
+    python -m benchmarks.ocr_benchmark                      # compare with benchmarks/baseline.json
+    python -m benchmarks.ocr_benchmark --update-baseline    # record a new baseline from this run
+    python -m benchmarks.ocr_benchmark --per-kind 10 --kinds scan photo --output report.json
+"""
+import os
+import sys
+import math
+import json
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+from time import perf_counter
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None  # type: ignore
+
+from .corpus import AMOUNT_FIELDS, TEXT_FIELDS, DEFAULT_SEED, KINDS, generate_corpus
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_TOLERANCE = 0.15  # relative slack on throughput, latency and memory
+DEFAULT_ACCURACY_TOLERANCE = 0.02  # absolute slack on accuracy fractions
+
+# (dotted report path, 'higher' or 'lower' is better, relative or absolute tolerance)
+CHECKS = (
+    ('throughput.pages_per_sec_per_core', 'higher', 'relative'),
+    ('latency_ms.p50', 'lower', 'relative'),
+    ('latency_ms.p95', 'lower', 'relative'),
+    ('peak_rss_mb', 'lower', 'relative'),
+    ('accuracy.overall', 'higher', 'absolute'),
+)
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(pct / 100.0 * len(ordered))))
+    return round(ordered[rank - 1], 1)
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process or its largest finished child (pool worker, tesseract), in MB"""
+    if resource is None:
+        return None
+    # ru_maxrss is KB on Linux and bytes on macOS
+    scale = 1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak / scale, 1)
+
+
+def _normalize_text(value: Any) -> str:
+    return ''.join(str(value).split()).upper() if value is not None else ''
+
+
+def score_fields(expected: Dict[str, Any], extracted: Dict[str, Any]) -> Dict[str, bool]:
+    """Per-field match of extracted invoice data against ground truth"""
+    scores = {}
+    for field, value in expected.items():
+        found = extracted.get(field)
+        if field in AMOUNT_FIELDS:
+            try:
+                scores[field] = found is not None and abs(float(found) - float(value)) < 0.005
+            except (TypeError, ValueError):
+                scores[field] = False
+        elif field in TEXT_FIELDS:
+            scores[field] = _normalize_text(found) == _normalize_text(value)
+    return scores
+
+
+def _accuracy(scored: List[Dict[str, bool]]) -> Optional[float]:
+    total = sum(len(s) for s in scored)
+    return round(sum(sum(s.values()) for s in scored) / total, 4) if total else None
+
+
+def run_benchmark(manifest: Dict[str, Any], corpus_dir: str, warmup: bool = True) -> Dict[str, Any]:
+    """Process every manifest document and build the benchmark report"""
+    from app.config import settings
+    from app.services.ocr_service import AdvancedOCRService, get_ocr_executor
+
+    # Every run must do the full OCR work; a warm result cache would measure nothing
+    settings.ocr_cache_enabled = False
+    service = AdvancedOCRService()
+    documents = manifest['documents']
+    if warmup and documents:
+        # Pool start-up and lazy model loads should not land on the first measured document
+        service.process_invoice(os.path.join(corpus_dir, documents[0]['file']))
+
+    # Sequential variants keep a document on one core; only the variant pool spreads it over more
+    variant_mode = 'parallel' if service.parallel_variants else 'sequential'
+    cores = (service.max_workers or os.cpu_count() or 1) if service.parallel_variants else 1
+    latencies: Dict[str, List[float]] = {}
+    scored: Dict[str, List[Dict[str, bool]]] = {}
+    stages: Dict[str, float] = {}
+    per_document = []
+    failures = 0
+    pages = 0
+
+    started = perf_counter()
+    for doc in documents:
+        start = perf_counter()
+        result = service.process_invoice(os.path.join(corpus_dir, doc['file']))
+        elapsed_ms = (perf_counter() - start) * 1000.0
+
+        failed = result.get('processing_status') != 'success'
+        failures += failed
+        pages += doc['pages']
+        scores = score_fields(doc['fields'], result.get('invoice_data') or {})
+        latencies.setdefault(doc['kind'], []).append(elapsed_ms)
+        scored.setdefault(doc['kind'], []).append(scores)
+        for stage, entry in (result.get('processing_report', {}).get('timings') or {}).get('stages', {}).items():
+            stages[stage] = stages.get(stage, 0.0) + entry.get('ms', 0.0)
+        per_document.append({
+            'id': doc['id'],
+            'latency_ms': round(elapsed_ms, 1),
+            'failed': failed,
+            'missed_fields': sorted(field for field, ok in scores.items() if not ok)
+        })
+    wall = perf_counter() - started
+    # Pool workers only count towards RUSAGE_CHILDREN once they have exited
+    get_ocr_executor().shutdown(wait=True)
+
+    all_latencies = [ms for values in latencies.values() for ms in values]
+    all_scores = [s for values in scored.values() for s in values]
+    by_field: Dict[str, List[bool]] = {}
+    for s in all_scores:
+        for field, ok in s.items():
+            by_field.setdefault(field, []).append(ok)
+
+    return {
+        'corpus_version': manifest['corpus_version'],
+        'corpus_seed': manifest['seed'],
+        'documents': len(documents),
+        'pages': pages,
+        'failures': failures,
+        'throughput': {
+            'pages_per_sec': round(pages / wall, 3) if wall else None,
+            'pages_per_sec_per_core': round(pages / wall / cores, 4) if wall else None,
+            'cores': cores,
+            'variant_mode': variant_mode
+        },
+        'latency_ms': {
+            'p50': _percentile(all_latencies, 50),
+            'p95': _percentile(all_latencies, 95),
+            'by_kind': {kind: {'p50': _percentile(values, 50), 'p95': _percentile(values, 95)}
+                        for kind, values in latencies.items()}
+        },
+        'peak_rss_mb': _peak_rss_mb(),
+        'accuracy': {
+            'overall': _accuracy(all_scores),
+            'by_kind': {kind: _accuracy(values) for kind, values in scored.items()},
+            'by_field': {field: round(sum(oks) / len(oks), 4) for field, oks in sorted(by_field.items())}
+        },
+        'stages_ms': {stage: round(ms, 1) for stage, ms in sorted(stages.items(), key=lambda e: -e[1])},
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'ocr_backend': service.ocr_backend,
+            'ocr_config_version': service.config_version(),
+            'extractor_version': service.extractor_version()
+        },
+        'per_document': per_document
+    }
+
+
+def _lookup(report: Dict[str, Any], path: str) -> Any:
+    value: Any = report
+    for key in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = DEFAULT_TOLERANCE,
+                        accuracy_tolerance: float = DEFAULT_ACCURACY_TOLERANCE) -> Tuple[List[str], List[str]]:
+    """Return (regressions, warnings) of the report against a baseline report"""
+    regressions: List[str] = []
+    warnings: List[str] = []
+    if report.get('corpus_version') != baseline.get('corpus_version') or report.get('corpus_seed') != baseline.get('corpus_seed') \
+            or report.get('documents') != baseline.get('documents'):
+        regressions.append("baseline was recorded on a different corpus; re-record it with --update-baseline")
+        return regressions, warnings
+
+    mode, base_mode = report.get('throughput', {}).get('variant_mode'), baseline.get('throughput', {}).get('variant_mode')
+    if mode != base_mode:
+        warnings.append(f"variant_mode differs from the baseline ({base_mode} -> {mode}); per-core throughput is not comparable")
+    env, base_env = report.get('environment', {}), baseline.get('environment', {})
+    for key in ('cpu_count', 'platform', 'ocr_backend'):
+        if env.get(key) != base_env.get(key):
+            warnings.append(f"{key} differs from the baseline ({base_env.get(key)} -> {env.get(key)}); timings may not be comparable")
+
+    if report.get('failures', 0) > baseline.get('failures', 0):
+        regressions.append(f"failures: {baseline.get('failures', 0)} -> {report['failures']}")
+
+    checks = list(CHECKS) + [(f"accuracy.by_field.{field}", 'higher', 'absolute')
+                             for field in baseline.get('accuracy', {}).get('by_field', {})]
+    for path, better, mode in checks:
+        current, reference = _lookup(report, path), _lookup(baseline, path)
+        if current is None or reference is None:
+            continue
+        slack = accuracy_tolerance if mode == 'absolute' else abs(reference) * tolerance
+        if (better == 'higher' and current < reference - slack) or (better == 'lower' and current > reference + slack):
+            regressions.append(f"{path}: {reference} -> {current}")
+    return regressions, warnings
+
+
+def _summary(report: Dict[str, Any]) -> str:
+    throughput, latency, accuracy = report['throughput'], report['latency_ms'], report['accuracy']
+    lines = [
+        f"documents {report['documents']}  pages {report['pages']}  failures {report['failures']}",
+        f"throughput {throughput['pages_per_sec']} pages/s, {throughput['pages_per_sec_per_core']} pages/s/core ({throughput['cores']} cores, {throughput['variant_mode']} variants)",
+        f"latency p50 {latency['p50']} ms  p95 {latency['p95']} ms  peak RSS {report['peak_rss_mb']} MB",
+        f"accuracy {accuracy['overall']}  by kind {json.dumps(accuracy['by_kind'])}",
+        f"accuracy by field {json.dumps(accuracy['by_field'])}",
+    ]
+    for kind, values in latency['by_kind'].items():
+        lines.append(f"  {kind:<10} p50 {values['p50']} ms  p95 {values['p95']} ms")
+    return '\n'.join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark OCR over a synthetic GST invoice corpus")
+    parser.add_argument("--per-kind", type=int, default=5, help="documents per corpus kind (default: 5)")
+    parser.add_argument("--kinds", nargs='+', choices=KINDS, default=list(KINDS), help="corpus kinds to include")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="corpus seed")
+    parser.add_argument("--corpus-dir", default=None, help="keep the generated corpus here (default: temporary directory)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline report to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="write this run's report as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="relative slack for throughput, latency and memory")
+    parser.add_argument("--accuracy-tolerance", type=float, default=DEFAULT_ACCURACY_TOLERANCE, help="absolute slack for accuracy")
+    parser.add_argument("--output", default=None, help="also write the full report as JSON here")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix='ocr-bench-')
+    try:
+        manifest = generate_corpus(corpus_dir, per_kind=args.per_kind, seed=args.seed, kinds=tuple(args.kinds))
+        report = run_benchmark(manifest, corpus_dir)
+    finally:
+        if args.corpus_dir is None:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    print(_summary(report))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        report['recorded_at'] = datetime.now().isoformat()
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; record one with --update-baseline")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions, warnings = compare_to_baseline(report, baseline, args.tolerance, args.accuracy_tolerance)
+    for warning in warnings:
+        print(f"WARNING: {warning}")
+    if regressions:
+        print("REGRESSIONS:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""
+Re-run invoice field extraction over stored OCR text, without re-running OCR.
+
+Usage (from the backend directory):
+    python reextract_invoices.py                 # only invoices not yet at the current extractor version
+    python reextract_invoices.py --force         # every invoice with OCR text
+    python reextract_invoices.py --user-id 7 --batch-size 1000 --workers 8
+    python reextract_invoices.py --celery        # queue the app.tasks.reextract_invoices task instead
+"""
+import argparse
+import json
+import logging
+import sys
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Refresh extracted invoice data from stored OCR text")
+    parser.add_argument("--batch-size", type=int, default=None, help="invoices per batch (default: OCR_REEXTRACT_BATCH_SIZE)")
+    parser.add_argument("--force", action="store_true", help="re-extract even invoices already at the current extractor version")
+    parser.add_argument("--user-id", type=int, default=None, help="only this user's invoices")
+    parser.add_argument("--workers", type=int, default=None, help="extraction worker processes (default: OCR_MAX_WORKERS or one per core)")
+    parser.add_argument("--celery", action="store_true", help="queue the Celery task instead of running here")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.celery:
+        from app.tasks import reextract_invoices
+        task = reextract_invoices.delay(batch_size=args.batch_size, force=args.force, user_id=args.user_id)
+        print(f"Queued re-extraction task {task.id}")
+        return 0
+
+    from app.services.reextraction import reextract_invoices
+    stats = reextract_invoices(
+        batch_size=args.batch_size,
+        force=args.force,
+        user_id=args.user_id,
+        max_workers=args.workers
+    )
+    print(json.dumps(stats, indent=2))
+    return 1 if stats.get('failed') else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())